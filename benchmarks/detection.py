@@ -0,0 +1,283 @@
+"""
+Benchmark of face detection pipeline. Runs FaceDetector, HeatmapComputer, get_face_candidates_generator and
+UniqueDetectionsComputer on synthetic images of several resolutions with a stub model, reports per stage wall time,
+windows per second and memory allocations, and compares results against a stored baseline.
+
+No dataset, trained model nor network access is needed. Run with:
+python -m benchmarks.detection [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import shapely.geometry
+
+import face.config
+import face.detection
+
+# Path to file with baseline results
+baseline_path = os.path.join(os.path.dirname(__file__), "detection_baseline.json")
+
+# Resolutions, as (height, width), benchmarks are run at
+resolutions = [(240, 320), (480, 640), (720, 1280)]
+
+
+class StubModel:
+    """
+    Deterministic stand-in for a face prediction model. Score of each crop is its mean intensity, so synthetic
+    images with bright squares on dark background produce confident detections. Model can be configured to spend
+    a fixed amount of time per window, to simulate cost of a real network.
+    """
+
+    def __init__(self, cost_per_window=0):
+        """
+        Constructor
+        :param cost_per_window: time, in seconds, model should spend on each window
+        """
+
+        self.cost_per_window = cost_per_window
+        self.windows_count = 0
+
+    def predict(self, crops, batch_size):
+
+        crops = np.asarray(crops)
+        self.windows_count += len(crops)
+
+        end = time.perf_counter() + self.cost_per_window * len(crops)
+
+        # Busy wait, as sleeping would let benchmark measure scheduler rather than detection code
+        while time.perf_counter() < end:
+            pass
+
+        return np.mean(crops.reshape(len(crops), -1), axis=1).reshape(-1, 1)
+
+
+def get_synthetic_image(shape, seed=0):
+    """
+    Get an image with dark noise background and a few bright squares that play role of faces
+    :param shape: (height, width) tuple
+    :param seed: random seed
+    :return: 3D numpy array with values in [0, 1] range
+    """
+
+    random_state = np.random.RandomState(seed)
+    image = 0.4 * random_state.rand(shape[0], shape[1], 3)
+
+    faces_count = 3
+    face_size = min(shape) // 4
+
+    for _ in range(faces_count):
+
+        y = random_state.randint(0, shape[0] - face_size)
+        x = random_state.randint(0, shape[1] - face_size)
+
+        image[y:y + face_size, x:x + face_size] = 1
+
+    return image
+
+
+def get_synthetic_detections(count, seed=0):
+    """
+    Get a list of face detections clustered around a few centers, as produced by a sliding window search
+    :param count: number of detections
+    :param seed: random seed
+    :return: list of face.detection.FaceDetection instances
+    """
+
+    random_state = np.random.RandomState(seed)
+    centers = random_state.randint(0, 1000, size=(10, 2))
+
+    detections = []
+
+    for index in range(count):
+
+        x, y = centers[index % len(centers)] + random_state.randint(-10, 10, size=2)
+        size = random_state.randint(50, 70)
+
+        bounding_box = shapely.geometry.box(x, y, x + size, y + size)
+        detections.append(face.detection.FaceDetection(bounding_box, random_state.rand()))
+
+    return detections
+
+
+def get_stages(image, model, configuration):
+    """
+    Get benchmarked stages
+    :param image: image stages should work on
+    :param model: model stages should use
+    :param configuration: face search configuration
+    :return: list of (stage name, function) tuples. Functions return number of windows they examined.
+    """
+
+    def run_candidates_generator():
+
+        generator = face.detection.get_face_candidates_generator(
+            image, configuration.crop_size, configuration.stride, configuration.batch_size)
+
+        return sum(len(batch) for batch in generator)
+
+    def run_heatmap_computer():
+
+        model.windows_count = 0
+        face.detection.HeatmapComputer(image, model, configuration).get_heatmap()
+
+        return model.windows_count
+
+    def run_face_detector():
+
+        model.windows_count = 0
+        face.detection.FaceDetector(image, model, configuration).get_faces_detections()
+
+        return model.windows_count
+
+    detections = get_synthetic_detections(count=image.shape[0])
+
+    def run_unique_detections_computer():
+
+        face.detection.UniqueDetectionsComputer.averaging(detections, iou_threshold=0.2)
+        return 0
+
+    return [
+        ("candidates_generator", run_candidates_generator),
+        ("heatmap_computer", run_heatmap_computer),
+        ("face_detector", run_face_detector),
+        ("unique_detections_computer", run_unique_detections_computer)
+    ]
+
+
+def measure_stage(function, repetitions):
+    """
+    Measure wall time, windows examined and memory allocations of a stage
+    :param function: function running the stage
+    :param repetitions: number of times stage should be run, best time is reported
+    :return: dictionary with results
+    """
+
+    durations = []
+    windows_count = 0
+
+    for _ in range(repetitions):
+
+        start = time.perf_counter()
+        windows_count = function()
+        durations.append(time.perf_counter() - start)
+
+    # Allocations are measured in a separate run, as tracing slows down execution considerably
+    tracemalloc.start()
+    function()
+    _, peak_allocated_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    duration = min(durations)
+
+    return {
+        "seconds": duration,
+        "windows": windows_count,
+        "windows_per_second": windows_count / duration if windows_count > 0 else None,
+        "peak_allocated_megabytes": peak_allocated_bytes / 2**20
+    }
+
+
+def run_benchmarks(cost_per_window, repetitions):
+    """
+    Run all benchmarks
+    :param cost_per_window: time, in seconds, stub model spends on each window
+    :param repetitions: number of times each stage should be run
+    :return: {benchmark name: results dictionary} dictionary
+    """
+
+    results = {}
+
+    for resolution in resolutions:
+
+        image = get_synthetic_image(resolution)
+        model = StubModel(cost_per_window)
+
+        for stage_name, function in get_stages(image, model, face.config.face_search_config):
+
+            name = "{}@{}x{}".format(stage_name, resolution[1], resolution[0])
+            results[name] = measure_stage(function, repetitions)
+
+    return results
+
+
+def get_regressions(results, baseline, tolerance):
+    """
+    Compare results against baseline
+    :param results: results of current run
+    :param baseline: baseline results
+    :param tolerance: relative slowdown that's still considered acceptable
+    :return: list of (benchmark name, current seconds, baseline seconds) tuples for regressed benchmarks
+    """
+
+    regressions = []
+
+    for name, result in sorted(results.items()):
+
+        if name in baseline and result["seconds"] > (1 + tolerance) * baseline[name]["seconds"]:
+
+            regressions.append((name, result["seconds"], baseline[name]["seconds"]))
+
+    return regressions
+
+
+def print_results(results, baseline):
+
+    print("{:<45}{:>10}{:>10}{:>14}{:>12}".format("benchmark", "seconds", "baseline", "windows/s", "peak MB"))
+
+    for name, result in sorted(results.items()):
+
+        baseline_seconds = baseline[name]["seconds"] if name in baseline else float("nan")
+        windows_per_second = result["windows_per_second"] if result["windows_per_second"] is not None else 0
+
+        print("{:<45}{:>10.4f}{:>10.4f}{:>14.0f}{:>12.2f}".format(
+            name, result["seconds"], baseline_seconds, windows_per_second, result["peak_allocated_megabytes"]))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Face detection benchmarks")
+    parser.add_argument("--cost-per-window", type=float, default=0, help="stub model cost per window in seconds")
+    parser.add_argument("--repetitions", type=int, default=3, help="number of runs per benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown flagged as regression")
+    parser.add_argument("--update-baseline", action="store_true", help="store results as new baseline")
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.cost_per_window, arguments.repetitions)
+
+    baseline = {}
+
+    if os.path.exists(baseline_path):
+
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+
+    if arguments.update_baseline:
+
+        with open(baseline_path, "w") as file:
+            json.dump(results, file, indent=4, sort_keys=True)
+
+        print("Baseline updated")
+
+    else:
+
+        regressions = get_regressions(results, baseline, arguments.tolerance)
+
+        for name, seconds, baseline_seconds in regressions:
+
+            print("REGRESSION: {} took {:.4f}s, baseline is {:.4f}s".format(name, seconds, baseline_seconds))
+
+        if len(regressions) > 0:
+
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+
+    main()
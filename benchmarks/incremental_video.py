@@ -0,0 +1,83 @@
+"""
+Benchmark of incremental face detection on a synthetic near-static video - a fixed noisy background with a single
+bright square, playing role of a face, moving across it. Reports, for every frame, fraction of windows
+face.video.IncrementalFaceDetector rescored and its time against time of a full FaceDetector search.
+
+Run with:
+python -m benchmarks.incremental_video
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import face.config
+import face.detection
+import face.video
+
+import benchmarks.detection
+
+
+def get_synthetic_frames(shape, frames_count, seed=0):
+    """
+    Get frames of a synthetic video
+    :param shape: (height, width) tuple
+    :param frames_count: number of frames
+    :param seed: random seed
+    :return: generator yielding frames with values in [0, 1] range
+    """
+
+    random_state = np.random.RandomState(seed)
+
+    background = 0.4 * random_state.rand(shape[0], shape[1], 3).astype(np.float32)
+    face_size = min(shape) // 4
+
+    for index in range(frames_count):
+
+        frame = background.copy()
+
+        x = index * 8 % (shape[1] - face_size)
+        y = shape[0] // 2 - face_size // 2
+
+        frame[y:y + face_size, x:x + face_size] = 1
+
+        # Sensor noise, well below change threshold
+        frame += random_state.uniform(-0.01, 0.01, size=frame.shape).astype(np.float32)
+
+        yield frame
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Incremental face detection benchmark")
+    parser.add_argument("--frames", type=int, default=10, help="number of frames")
+    parser.add_argument("--height", type=int, default=480, help="frames height")
+    parser.add_argument("--width", type=int, default=640, help="frames width")
+    arguments = parser.parse_args()
+
+    model = benchmarks.detection.StubModel()
+    configuration = face.config.face_search_config
+
+    incremental_detector = face.video.IncrementalFaceDetector(model, configuration)
+
+    print("{:<8}{:>12}{:>18}{:>14}{:>12}".format("frame", "rescored", "incremental [s]", "full [s]", "speedup"))
+
+    for index, frame in enumerate(get_synthetic_frames((arguments.height, arguments.width), arguments.frames)):
+
+        start = time.perf_counter()
+        results = incremental_detector.get_faces_detections(frame)
+        incremental_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        face.detection.FaceDetector(frame, model, configuration).get_faces_detections()
+        full_seconds = time.perf_counter() - start
+
+        print("{:<8}{:>11.1f}%{:>18.4f}{:>14.4f}{:>11.2f}x".format(
+            index, 100 * results.get_rescored_fraction(), incremental_seconds, full_seconds,
+            full_seconds / incremental_seconds))
+
+
+if __name__ == "__main__":
+
+    main()
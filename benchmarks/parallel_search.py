@@ -0,0 +1,126 @@
+"""
+Benchmark of threaded multi scale search. Runs FaceDetector and HeatmapComputer on synthetic images with pyramid
+levels searched on 1, 4, 8 and 16 threads and reports wall time and speedup over sequential search.
+Thread counts above number of cores are still run, so that oversubscription cost is visible.
+
+Stub model releases the GIL while scoring, as TensorFlow and cv2 do, by multiplying crops with a fixed weights
+matrix. Limit BLAS to a single thread, e.g. with OPENBLAS_NUM_THREADS=1, so that it doesn't compete with detection
+threads. Run with:
+OPENBLAS_NUM_THREADS=1 python -m benchmarks.parallel_search
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import face.config
+import face.detection
+
+import benchmarks.detection
+
+# Numbers of threads benchmarks are run with, None is sequential search on calling thread
+threads_counts = [None, 1, 4, 8, 16]
+
+# Resolutions, as (height, width), benchmarks are run at
+resolutions = [(480, 640), (720, 1280)]
+
+
+class MatrixStubModel:
+    """
+    Stand-in for a face prediction model whose cost is dominated by a matrix multiplication, during which
+    the GIL is released. Score of each crop is its mean intensity, as in benchmarks.detection.StubModel.
+    """
+
+    def __init__(self, input_size, hidden_size=256):
+        """
+        Constructor
+        :param input_size: number of values in a single crop
+        :param hidden_size: size of hidden layer, controls cost of each window
+        """
+
+        self.weights = np.random.RandomState(0).standard_normal((input_size, hidden_size)).astype(np.float32)
+
+    def predict(self, crops, batch_size):
+
+        crops = np.asarray(crops, dtype=np.float32).reshape(len(crops), -1)
+
+        # Result is discarded, multiplication only simulates cost of a real network
+        np.dot(crops, self.weights)
+
+        return np.mean(crops, axis=1).reshape(-1, 1)
+
+
+def measure(function, repetitions):
+
+    durations = []
+
+    for _ in range(repetitions):
+
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+def run_benchmarks(repetitions):
+    """
+    Run all benchmarks
+    :param repetitions: number of times each benchmark should be run, best time is reported
+    :return: list of (benchmark name, threads count, seconds) tuples
+    """
+
+    configuration = face.config.face_search_config
+    model = MatrixStubModel(input_size=int(np.prod(face.config.image_shape)))
+
+    results = []
+
+    for resolution in resolutions:
+
+        image = benchmarks.detection.get_synthetic_image(resolution)
+
+        for threads_count in threads_counts:
+
+            def run_face_detector():
+                face.detection.FaceDetector(
+                    image, model, configuration, threads_count=threads_count).get_faces_detections()
+
+            def run_heatmap_computer():
+                face.detection.HeatmapComputer(image, model, configuration, threads_count=threads_count).get_heatmap()
+
+            for stage_name, function in [("face_detector", run_face_detector),
+                                         ("heatmap_computer", run_heatmap_computer)]:
+
+                name = "{}@{}x{}".format(stage_name, resolution[1], resolution[0])
+                results.append((name, threads_count, measure(function, repetitions)))
+
+    return results
+
+
+def print_results(results):
+
+    print("Cores available: {}".format(os.cpu_count()))
+    print("{:<40}{:>10}{:>10}{:>10}".format("benchmark", "threads", "seconds", "speedup"))
+
+    sequential_seconds = {name: seconds for name, threads_count, seconds in results if threads_count is None}
+
+    for name, threads_count, seconds in results:
+
+        threads = threads_count if threads_count is not None else "sequential"
+        print("{:<40}{:>10}{:>10.4f}{:>9.2f}x".format(name, threads, seconds, sequential_seconds[name] / seconds))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Threaded face search benchmarks")
+    parser.add_argument("--repetitions", type=int, default=3, help="number of runs per benchmark")
+    arguments = parser.parse_args()
+
+    print_results(run_benchmarks(arguments.repetitions))
+
+
+if __name__ == "__main__":
+
+    main()
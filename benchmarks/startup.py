@@ -0,0 +1,150 @@
+"""
+Benchmark of cold start time of scripts and evaluation workers. Each measurement is run in a fresh python process,
+so nothing is cached between measurements. Reports time of importing face modules - which import their heavy
+dependencies lazily - against time of importing them along with dependencies they used to import eagerly,
+and time of building and loading trained model through models registry against time of building VGG16 based model
+with ImageNet weights and loading trained weights into it, as scripts and workers used to. Without a trained model
+file, a weights only model file with random weights is saved to a temporary directory first.
+
+Run with:
+python -m benchmarks.startup [--model-path path/to/model.h5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Face modules and third party modules they import
+modules_dependencies = {
+    "face.detection": ["numpy", "cv2", "shapely.geometry"],
+    "face.processing": ["numpy", "cv2"],
+    "face.evaluation": ["numpy", "tqdm"],
+    "face.data_generators": ["numpy", "cv2", "shapely.geometry"],
+    "face.models": ["keras", "keras.applications"]
+}
+
+
+def measure_code(code, repetitions):
+    """
+    Measure time of running code in a fresh python process
+    :param code: python code
+    :param repetitions: number of runs, best run is reported
+    :return: time in seconds, or None if code failed, e.g. due to missing dependencies
+    """
+
+    durations = []
+
+    for _ in range(repetitions):
+
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        if result.returncode != 0:
+            return None
+
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+def get_measurements(model_path, repetitions):
+    """
+    Get cold start measurements
+    :param model_path: path to trained model, None if model loading shouldn't be measured
+    :param repetitions: number of runs per measurement
+    :return: list of (name, lazy time, eager time) tuples
+    """
+
+    measurements = [("python interpreter", measure_code("pass", repetitions), None)]
+
+    for module, dependencies in sorted(modules_dependencies.items()):
+
+        lazy_code = "import {}".format(module)
+        eager_code = "; ".join(["import {}".format(name) for name in dependencies + [module]])
+
+        measurements.append(
+            ("import " + module, measure_code(lazy_code, repetitions), measure_code(eager_code, repetitions)))
+
+    measurements.extend(get_model_loading_measurements(model_path, repetitions))
+
+    return measurements
+
+
+def get_model_loading_measurements(model_path, repetitions):
+    """
+    Get measurements of loading trained model
+    :param model_path: path to trained model, None if a weights only model file should be created for measurements
+    :param repetitions: number of runs per measurement
+    :return: list of (name, registry time, ImageNet VGG16 time) tuples
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        if model_path is None:
+
+            model_path = os.path.join(directory, "weights.h5")
+
+            save_code = \
+                "import face.models, face.config; " \
+                "face.models.get_pretrained_vgg_model(face.config.image_shape, weights=None)" \
+                ".save_weights({!r})".format(model_path)
+
+            # Keras isn't available
+            if measure_code(save_code, repetitions=1) is None:
+                return [("build model", None, None), ("load model", None, None), ("load model twice", None, None)]
+
+        # Model construction alone, without trained weights
+        build_code = "import face.models, face.config; face.models.get_pretrained_vgg_model(face.config.image_shape{})"
+
+        registry_load = "face.models.get_trained_model({!r})".format(model_path)
+
+        vgg16_load = \
+            "model = face.models.get_pretrained_vgg_model(face.config.image_shape); " \
+            "model.load_weights({!r})".format(model_path)
+
+        def get_code(load_code, loads_count):
+
+            # Model requested more than once in the same process, e.g. by another detector or worker initializer
+            return "import face.models, face.config; " + "; ".join([load_code] * loads_count)
+
+        return [
+            ("build model", measure_code(build_code.format(", weights=None"), repetitions),
+             measure_code(build_code.format(""), repetitions)),
+            ("load model", measure_code(get_code(registry_load, 1), repetitions),
+             measure_code(get_code(vgg16_load, 1), repetitions)),
+            ("load model twice", measure_code(get_code(registry_load, 2), repetitions),
+             measure_code(get_code(vgg16_load, 2), repetitions))
+        ]
+
+
+def print_measurements(measurements):
+
+    def format_time(duration):
+        return "{:.0f}ms".format(1000 * duration) if duration is not None else "n/a"
+
+    # Imports are compared against eager imports, models against building ImageNet VGG16 and loading weights into it
+    print("{:<32}{:>12}{:>12}".format("", "now", "before"))
+
+    for name, lazy_time, eager_time in measurements:
+
+        print("{:<32}{:>12}{:>12}".format(name, format_time(lazy_time), format_time(eager_time)))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Cold start benchmarks")
+    parser.add_argument(
+        "--model-path", default=None,
+        help="path to trained model, a weights only model with random weights is used if not given")
+    parser.add_argument("--repetitions", type=int, default=5, help="number of runs per measurement")
+    arguments = parser.parse_args()
+
+    print_measurements(get_measurements(arguments.model_path, arguments.repetitions))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark of peak memory of tiled face detection. Synthetic images of growing resolution are stored as memory mapped
+uint8 files and searched at native resolution with face.tiling.TiledFaceDetector and a stub model. Peak memory
+allocated during detection should stay flat as resolution grows, since only one tile is processed at a time.
+
+Run with:
+python -m benchmarks.tiled_detection
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import face.config
+import face.tiling
+
+import benchmarks.detection
+
+# Resolutions, as (height, width), benchmarks are run at
+resolutions = [(720, 1280), (1080, 1920), (2160, 3840)]
+
+
+def get_memory_mapped_image(path, shape, seed=0):
+    """
+    Write a synthetic uint8 image to a file, row band by row band, and memory map it
+    :param path: path to file
+    :param shape: (height, width) tuple
+    :param seed: random seed
+    :return: memory mapped array of shape (height, width, 3)
+    """
+
+    image = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(shape[0], shape[1], 3))
+    random_state = np.random.RandomState(seed)
+
+    band_height = 256
+
+    for y in range(0, shape[0], band_height):
+
+        band = image[y:y + band_height]
+        band[:] = random_state.randint(0, 100, size=band.shape, dtype=np.uint8)
+
+    # A few small bright squares play role of faces
+    for _ in range(10):
+
+        y, x = random_state.randint(0, shape[0] - 60), random_state.randint(0, shape[1] - 60)
+        image[y:y + 60, x:x + 60] = 255
+
+    image.flush()
+    return np.load(path, mmap_mode="r")
+
+
+def run_benchmarks(max_face_size, tile_size):
+    """
+    Run all benchmarks
+    :param max_face_size: largest face size searched for
+    :param tile_size: tiles size, None for detector's default
+    :return: generator yielding (resolution, seconds, detections count, peak allocated megabytes) tuples,
+    so that results are reported as soon as each resolution completes
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        for resolution in resolutions:
+
+            image = get_memory_mapped_image(os.path.join(directory, "image.npy"), resolution)
+
+            detector = face.tiling.TiledFaceDetector(
+                image, benchmarks.detection.StubModel(), face.config.face_search_config, max_face_size, tile_size)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+
+            detections = detector.get_faces_detections()
+
+            duration = time.perf_counter() - start
+            _, peak_allocated_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            yield resolution, duration, len(detections), peak_allocated_bytes / 2**20
+
+            del image, detector
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Tiled face detection memory benchmark")
+    parser.add_argument("--max-face-size", type=int, default=100, help="largest face size searched for")
+    parser.add_argument("--tile-size", type=int, default=None, help="tiles size")
+    arguments = parser.parse_args()
+
+    print("{:<16}{:>10}{:>12}{:>12}".format("resolution", "seconds", "detections", "peak MB"))
+
+    for resolution, duration, detections_count, peak_megabytes in run_benchmarks(
+            arguments.max_face_size, arguments.tile_size):
+
+        print("{:<16}{:>10.2f}{:>12}{:>12.1f}".format(
+            "{}x{}".format(resolution[1], resolution[0]), duration, detections_count, peak_megabytes))
+
+
+if __name__ == "__main__":
+
+    main()
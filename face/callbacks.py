@@ -0,0 +1,87 @@
+"""
+Module with keras callbacks
+"""
+
+import time
+
+import keras
+
+
+class InputPipelineStatisticsCallback(keras.callbacks.Callback):
+    """
+    Callback that prints input pipeline throughput and per stage timings at the end of every epoch,
+    along with time keras spent on training steps, so that it's easy to see whether training is input bound.
+    Batches keras prefetches are reported in epoch they were produced in.
+    """
+
+    def __init__(self, statistics):
+        """
+        Constructor
+        :param statistics: face.instrumentation.PipelineStatistics instance data generator records statistics in
+        """
+
+        super().__init__()
+
+        self.statistics = statistics
+
+        self.epoch_start = None
+        self.batch_start = None
+        self.training_steps_duration = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+
+        self.epoch_start = time.perf_counter()
+        self.training_steps_duration = 0
+
+    def on_batch_begin(self, batch, logs=None):
+
+        self.batch_start = time.perf_counter()
+
+    def on_batch_end(self, batch, logs=None):
+
+        self.training_steps_duration += time.perf_counter() - self.batch_start
+
+    def on_epoch_end(self, epoch, logs=None):
+
+        epoch_duration = time.perf_counter() - self.epoch_start
+
+        # Data generator keeps recording statistics from its own thread, so they are collected in a single step
+        statistics = self.statistics.collect()
+
+        print("\nEpoch {} took {:.1f}s, {:.1f}s of which were training steps".format(
+            epoch, epoch_duration, self.training_steps_duration))
+
+        print("Input pipeline throughput: {:.1f} images/s, {:.2f} batches/s".format(
+            statistics.images_count / epoch_duration, statistics.batches_count / epoch_duration))
+
+        print(statistics.get_report())
+
+
+class BatchesCheckpointCallback(keras.callbacks.Callback):
+    """
+    Callback that checkpoints training every given number of batches. Batches are counted as keras trains on them,
+    rather than as data generator outputs them, so checkpoint doesn't cover batches keras prefetched but didn't
+    train on yet.
+    """
+
+    def __init__(self, save_checkpoint, period):
+        """
+        Constructor
+        :param save_checkpoint: function called with number of batches trained on since training started
+        :param period: number of batches between checkpoints
+        """
+
+        super().__init__()
+
+        self.save_checkpoint = save_checkpoint
+        self.period = period
+
+        self.batches_count = 0
+
+    def on_batch_end(self, batch, logs=None):
+
+        self.batches_count += 1
+
+        if self.batches_count % self.period == 0:
+
+            self.save_checkpoint(self.batches_count)
@@ -54,13 +54,17 @@ min_face_to_image_ratio = 0.1
 # Ratio by which image should be scaled down on each successive move on image pyramid
 image_rescaling_ratio = 0.8
 
+# Maximum size of a face, in pixels, we want to search for. If None, pyramid levels are searched down to crop size.
+max_face_size = None
+
 
 class FaceSearchConfiguration(SingleScaleFaceSearchConfiguration):
     """
     A simple class that bundles together common multi scale face search parameters
     """
 
-    def __init__(self, crop_size, stride, batch_size, min_face_size, min_face_to_image_ratio, image_rescaling_ratio):
+    def __init__(self, crop_size, stride, batch_size, min_face_size, min_face_to_image_ratio, image_rescaling_ratio,
+                 max_face_size=None):
         """
         Constructor
         :param crop_size: size of crops used to search for faces
@@ -74,6 +78,8 @@ class FaceSearchConfiguration(SingleScaleFaceSearchConfiguration):
          as smallest region used to search for faces.
         :param image_rescaling_ratio: ratio by which image should be scaled down on each
         successive move on image pyramid
+        :param max_face_size: maximum size of a face, in pixels, we want to search for. Pyramid levels that would
+        only search for larger faces are skipped. If None, levels are searched down to crop size.
         """
 
         super().__init__(crop_size, stride, batch_size)
@@ -81,13 +87,40 @@ class FaceSearchConfiguration(SingleScaleFaceSearchConfiguration):
         self.min_face_size = min_face_size
         self.min_face_to_image_ratio = min_face_to_image_ratio
         self.image_rescaling_ratio = image_rescaling_ratio
+        self.max_face_size = max_face_size
 
 
 # Default multi scale face search configuration
 face_search_config = FaceSearchConfiguration(
     crop_size=crop_size, stride=stride, batch_size=batch_size,
     min_face_size=min_face_size, min_face_to_image_ratio=min_face_to_image_ratio,
-    image_rescaling_ratio=image_rescaling_ratio)
+    image_rescaling_ratio=image_rescaling_ratio, max_face_size=max_face_size)
+
+# Expected ratio of face size to smaller image dimension. Used to prioritize likely face sizes when detection
+# has to be completed within a deadline
+expected_face_to_image_ratio = 0.4
+
+# Score above which a window is considered to contain a face
+detection_score_threshold = 0.9
+
+# Minimum score of a detection confirmed by early exit search, which stops once requested number of faces
+# is confirmed
+detection_confirmation_score = 0.99
+
+# IOU above which two detections are considered to represent the same face and are merged together
+detections_merging_iou_threshold = 0.2
 
 # Path to model file
 model_path = "../../data/faces/models/model.h5"
+
+# Path to small model distilled from model at model_path
+student_model_path = "../../data/faces/models/student_model.h5"
+
+# Path to model obtained by pruning model at model_path
+pruned_model_path = "../../data/faces/models/pruned_model.h5"
+
+# Path to calibrated windows pre-filter thresholds
+prefilter_path = "../../data/faces/models/prefilter.json"
+
+# Fraction of training face crops windows pre-filter calibration should let through
+prefilter_recall = 0.995
@@ -2,21 +2,47 @@
 Module with data generators and related functionality
 """
 
+import json
+import os
 import random
 
 import face.utilities
 import face.geometry
 import face.processing
+import face.instrumentation
+import face.manifest
 
 
-def get_batches_generator(paths_file, bounding_boxes_file, batch_size, crop_size):
+def get_paths_and_bounding_boxes_map(paths_file, bounding_boxes_file):
+    """
+    Get image paths and bounding boxes map of a dataset
+    :param paths_file: path to file with image paths, or face.manifest.DatasetManifest instance
+    :param bounding_boxes_file: path to file with bounding boxes of faces in each image, ignored if paths_file is
+    a manifest
+    :return: tuple (list of paths, {image file name: shapely.geometry.Polygon} dictionary)
+    """
+
+    if isinstance(paths_file, face.manifest.DatasetManifest):
+
+        return paths_file.get_paths(), paths_file.get_bounding_boxes_map()
+
+    paths = [path.strip() for path in face.utilities.get_file_lines(paths_file)]
+    return paths, face.geometry.get_bounding_boxes_map(bounding_boxes_file)
+
+
+def get_batches_generator(
+        paths_file, bounding_boxes_file, batch_size, crop_size,
+        statistics=face.instrumentation.null_pipeline_statistics):
     """
     Returns a generator that produces batches of face and non-face image crops, along with labels.
     A single image is cut into four random crops, with one containing face and remaining 3 without it.
-    :param paths_file: path to file with image paths
-    :param bounding_boxes_file: path to file with bounding boxes of faces in each image
+    :param paths_file: path to file with image paths, or face.manifest.DatasetManifest instance
+    :param bounding_boxes_file: path to file with bounding boxes of faces in each image, None if paths_file is
+    a manifest
     :param batch_size: size of a single batch to be outputted by generator
     :param crop_size: size image crops should have
+    :param statistics: face.instrumentation.PipelineStatistics instance pipeline statistics should be recorded in,
+    by default no statistics are recorded
     :return: batches generator
     """
 
@@ -26,16 +52,18 @@ def get_batches_generator(paths_file, bounding_boxes_file, batch_size, crop_size
 
     images_per_batch = batch_size // 4
 
-    paths = [path.strip() for path in face.utilities.get_file_lines(paths_file)]
+    paths, bounding_boxes_map = get_paths_and_bounding_boxes_map(paths_file, bounding_boxes_file)
     random.shuffle(paths)
 
-    bounding_boxes_map = face.geometry.get_bounding_boxes_map(bounding_boxes_file)
-
     index = 0
 
     while True:
 
-        batch = face.processing.get_data_batch(paths, bounding_boxes_map, index, batch_size, crop_size)
+        with statistics.timer("batch"):
+            batch = face.processing.get_data_batch(
+                paths, bounding_boxes_map, index, batch_size, crop_size, statistics)
+
+        statistics.add_batch()
         yield(batch)
 
         if index + images_per_batch < len(paths):
@@ -47,3 +75,204 @@ def get_batches_generator(paths_file, bounding_boxes_file, batch_size, crop_size
             index = 0
             random.shuffle(paths)
 
+
+class ShardedBatchesGenerator:
+    """
+    Batches generator for data parallel training. Paths are reshuffled every epoch with a permutation that is
+    identical across all workers and each worker reads only its own shard of the permutation, so that together
+    workers walk the dataset exactly once per epoch.
+    Generator position can be saved to and restored from a file, so that a restarted worker resumes mid-epoch.
+    When batches are consumed by keras, which prefetches them, position should be computed with get_advanced_state().
+    """
+
+    def __init__(self, paths_file, bounding_boxes_file, batch_size, crop_size, rank, world_size, seed=0,
+                 state_path=None, statistics=face.instrumentation.null_pipeline_statistics):
+        """
+        Constructor
+        :param paths_file: path to file with image paths, or face.manifest.DatasetManifest instance
+        :param bounding_boxes_file: path to file with bounding boxes of faces in each image, None if paths_file is
+        a manifest
+        :param batch_size: size of a single batch to be outputted by generator
+        :param crop_size: size image crops should have
+        :param rank: index of worker using the generator, in range [0, world_size)
+        :param world_size: total number of workers
+        :param seed: seed of per epoch permutations, must be the same for all workers
+        :param state_path: optional path to a file generator position is saved to after every batch.
+        If file already exists, generator resumes from position saved in it.
+        :param statistics: face.instrumentation.PipelineStatistics instance pipeline statistics should be recorded in
+        """
+
+        if batch_size % 4 != 0:
+
+            raise ValueError("Batch size must be divisible by 4!")
+
+        if not 0 <= rank < world_size:
+
+            raise ValueError("Rank ({}) must be in range [0, {})".format(rank, world_size))
+
+        self.paths, self.bounding_boxes_map = get_paths_and_bounding_boxes_map(paths_file, bounding_boxes_file)
+
+        if len(self.paths) < world_size:
+
+            raise ValueError("Can't split {} paths among {} workers".format(len(self.paths), world_size))
+
+        self.batch_size = batch_size
+        self.crop_size = crop_size
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = seed
+        self.state_path = state_path
+        self.statistics = statistics
+
+        self.epoch = 0
+        self.index = 0
+
+        if state_path is not None and os.path.exists(state_path):
+
+            self.load_state(state_path)
+
+        self.shard_paths = self.get_shard_paths(self.epoch)
+
+    def get_shard_size(self):
+        """
+        Get number of images in worker's shard. All workers have shards of the same size.
+        :return: integer
+        """
+
+        return len(self.paths) // self.world_size
+
+    def get_shard_paths(self, epoch):
+        """
+        Get paths worker should read in a given epoch
+        :param epoch: epoch number
+        :return: list of paths
+        """
+
+        paths = list(self.paths)
+        random.Random(self.seed + epoch).shuffle(paths)
+
+        shard_size = self.get_shard_size()
+        return paths[self.rank * shard_size:(self.rank + 1) * shard_size]
+
+    def get_batches_per_epoch(self):
+        """
+        Get number of batches generator outputs before moving to next epoch
+        :return: integer
+        """
+
+        images_per_batch = self.batch_size // 4
+        return (self.get_shard_size() + images_per_batch - 1) // images_per_batch
+
+    def get_advanced_state(self, state, batches_count):
+        """
+        Get position generator would have after outputting a number of batches, starting from a given position.
+        Since keras prefetches batches ahead of training, generator's own position is usually ahead of batches
+        trained on. Position matching trained weights can instead be computed from number of batches keras consumed.
+        :param state: dictionary obtained from get_state()
+        :param batches_count: number of batches outputted
+        :return: dictionary
+        """
+
+        images_per_batch = self.batch_size // 4
+        batches_per_epoch = self.get_batches_per_epoch()
+
+        total_batches_count = (state["index"] // images_per_batch) + batches_count
+
+        advanced_state = dict(state)
+        advanced_state["epoch"] = state["epoch"] + (total_batches_count // batches_per_epoch)
+        advanced_state["index"] = (total_batches_count % batches_per_epoch) * images_per_batch
+
+        return advanced_state
+
+    def get_remaining_batches_count(self):
+        """
+        Get number of batches generator outputs before its current epoch ends
+        :return: integer
+        """
+
+        return self.get_batches_per_epoch() - (self.index // (self.batch_size // 4))
+
+    def get_state(self):
+        """
+        Get generator position
+        :return: dictionary
+        """
+
+        return {
+            "rank": self.rank, "world_size": self.world_size, "seed": self.seed,
+            "epoch": self.epoch, "index": self.index
+        }
+
+    def set_state(self, state):
+        """
+        Restore generator position
+        :param state: dictionary obtained from get_state()
+        """
+
+        for key in ["rank", "world_size", "seed"]:
+
+            if state[key] != getattr(self, key):
+
+                raise ValueError("Saved state has {} {}, but generator has {}".format(
+                    key, state[key], getattr(self, key)))
+
+        self.epoch = state["epoch"]
+        self.index = state["index"]
+
+        self.shard_paths = self.get_shard_paths(self.epoch)
+
+    def save_state(self, path):
+        """
+        Save generator position to a file. File is replaced atomically, so a worker killed while saving
+        leaves previous position intact.
+        :param path: path to file
+        """
+
+        temporary_path = path + ".tmp"
+
+        with open(temporary_path, "w") as file:
+
+            json.dump(self.get_state(), file)
+
+        os.replace(temporary_path, path)
+
+    def load_state(self, path):
+        """
+        Load generator position from a file
+        :param path: path to file
+        """
+
+        with open(path) as file:
+
+            self.set_state(json.load(file))
+
+    def __iter__(self):
+
+        return self
+
+    def __next__(self):
+
+        with self.statistics.timer("batch"):
+            batch = face.processing.get_data_batch(
+                self.shard_paths, self.bounding_boxes_map, self.index, self.batch_size, self.crop_size,
+                self.statistics)
+
+        self.statistics.add_batch()
+
+        images_per_batch = self.batch_size // 4
+
+        if self.index + images_per_batch < len(self.shard_paths):
+
+            self.index += images_per_batch
+
+        else:
+
+            self.epoch += 1
+            self.index = 0
+            self.shard_paths = self.get_shard_paths(self.epoch)
+
+        if self.state_path is not None:
+
+            self.save_state(self.state_path)
+
+        return batch
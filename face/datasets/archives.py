@@ -0,0 +1,411 @@
+"""
+Code for downloading multi-part archives and extracting them while download is still in progress
+"""
+
+import bisect
+import io
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import face.download
+
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+
+class MultiPartFile(io.RawIOBase):
+    """
+    Read-only, seekable file object presenting consecutive parts of a split archive as a single file.
+    Reads from a part block until that part is marked as available, so file can be read while later parts are
+    still being downloaded. Once consumed parts deletion is enabled, parts that forward reads went past are deleted,
+    limiting disk usage to parts that weren't read yet.
+    """
+
+    def __init__(self, paths, sizes, timeout=None):
+        """
+        Constructor
+        :param paths: paths of archive parts, in order
+        :param sizes: sizes of archive parts, in bytes
+        :param timeout: max number of seconds to wait for a part to become available, None for no limit
+        """
+
+        super().__init__()
+
+        self.paths = paths
+        self.sizes = sizes
+        self.timeout = timeout
+
+        # Offsets at which each part starts, plus total size at the end
+        self.offsets = [0]
+
+        for size in sizes:
+            self.offsets.append(self.offsets[-1] + size)
+
+        self.available_events = [threading.Event() for _ in paths]
+        self.available_parts = [False] * len(paths)
+        self.deleted_parts = [False] * len(paths)
+
+        self.position = 0
+        self.delete_consumed_parts = False
+
+        # Position of first read after consumed parts deletion was enabled
+        self.consumed_start = None
+
+    def set_part_available(self, index):
+        """
+        Mark part as fully written to disk
+        :param index: index of the part
+        """
+
+        self.available_parts[index] = True
+        self.available_events[index].set()
+
+    def abort(self):
+        """
+        Stop waiting for parts - reads from parts that weren't marked as available fail instead of blocking
+        """
+
+        for event in self.available_events:
+            event.set()
+
+    def enable_consumed_parts_deletion(self):
+        """
+        Start deleting parts as soon as reads go past their end. Only parts read through from position of first read
+        after this call are deleted, since readers of 7z archives leave read position at archive's end after parsing
+        its headers. Should only be enabled once reader is known to read forward, e.g. after archive headers were
+        parsed.
+        """
+
+        self.delete_consumed_parts = True
+
+    def readable(self):
+
+        return True
+
+    def seekable(self):
+
+        return True
+
+    def tell(self):
+
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.offsets[-1] + offset
+        else:
+            raise ValueError("Invalid whence ({})".format(whence))
+
+        return self.position
+
+    def readinto(self, buffer):
+
+        buffer = memoryview(buffer)
+        total_bytes_read = 0
+
+        # Fill whole buffer, even if it spans several parts, since archive readers don't always handle short reads
+        while total_bytes_read < len(buffer) and self.position < self.offsets[-1]:
+
+            total_bytes_read += self._read_from_part(buffer[total_bytes_read:])
+
+        return total_bytes_read
+
+    def _read_from_part(self, buffer):
+
+        index = bisect.bisect_right(self.offsets, self.position) - 1
+
+        if self.deleted_parts[index]:
+            raise IOError("Part {} was already consumed and deleted".format(self.paths[index]))
+
+        if not self.available_events[index].wait(self.timeout):
+            raise TimeoutError("Part {} didn't become available in time".format(self.paths[index]))
+
+        if not self.available_parts[index]:
+            raise IOError("Part {} won't become available, its download failed".format(self.paths[index]))
+
+        if self.delete_consumed_parts and self.consumed_start is None:
+            self.consumed_start = self.position
+
+        bytes_to_read = min(len(buffer), self.offsets[index + 1] - self.position)
+
+        with open(self.paths[index], mode="rb") as file:
+
+            file.seek(self.position - self.offsets[index])
+            bytes_read = file.readinto(buffer[:bytes_to_read])
+
+        if bytes_read == 0:
+            raise IOError("Part {} is shorter than expected".format(self.paths[index]))
+
+        self.position += bytes_read
+        self._delete_consumed_parts()
+
+        return bytes_read
+
+    def _delete_consumed_parts(self):
+
+        if not self.delete_consumed_parts:
+            return
+
+        for index, path in enumerate(self.paths):
+
+            is_consumed = self.consumed_start < self.offsets[index + 1] <= self.position
+
+            if is_consumed and not self.deleted_parts[index]:
+
+                os.remove(path)
+                self.deleted_parts[index] = True
+
+
+class DiskUsageMonitor:
+    """
+    Samples disk usage of a filesystem in a background thread and keeps track of its peak. Usage of whole
+    filesystem directory lies on is measured, since walking a directory with many extracted files on every sample
+    would be too slow, so other processes writing to same filesystem affect reported usage.
+    """
+
+    def __init__(self, directory, interval=1):
+        """
+        Constructor
+        :param directory: directory on filesystem to monitor, usage of whole filesystem is measured
+        :param interval: number of seconds between samples
+        """
+
+        self.directory = directory
+        self.interval = interval
+
+        self.initial_usage = shutil.disk_usage(directory).used
+        self.peak_usage = self.initial_usage
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._monitor, daemon=True)
+
+    def __enter__(self):
+
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.stop_event.set()
+        self.thread.join()
+
+        self.sample()
+
+    def sample(self):
+        """
+        Sample disk usage
+        """
+
+        self.peak_usage = max(self.peak_usage, shutil.disk_usage(self.directory).used)
+
+    def get_peak_additional_usage(self):
+        """
+        Get peak disk usage, relative to usage when monitor was created
+        :return: number of bytes
+        """
+
+        return self.peak_usage - self.initial_usage
+
+    def _monitor(self):
+
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+
+class PipelinedArchiveExtractor:
+    """
+    Downloads parts of a multi-part 7z archive and extracts it, deleting parts as soon as they were consumed.
+    7z archives keep their headers at the end, so last part is downloaded first and remaining parts are downloaded
+    in order. With py7zr installed extraction streams through the parts while later ones are still downloading.
+    Otherwise 7z command line tool is used once all parts are downloaded.
+    """
+
+    def __init__(self, urls, paths, output_directory, checksums=None, download_manager=None, verbose=True):
+        """
+        Constructor
+        :param urls: urls of archive parts, in order
+        :param paths: paths to download archive parts to
+        :param output_directory: directory to extract archive to
+        :param checksums: optional list of expected sha256 hex digests of archive parts, with None entries for parts
+        that shouldn't be verified. Parts are only extracted once they were verified.
+        :param download_manager: face.download.DownloadManager instance, a default one is used if None
+        :param verbose: whether to output progress and report
+        """
+
+        self.urls = urls
+        self.paths = paths
+        self.checksums = checksums if checksums is not None else [None] * len(urls)
+        self.output_directory = output_directory
+        self.download_manager = download_manager if download_manager is not None else face.download.DownloadManager()
+        self.verbose = verbose
+
+        # Filled in by extract()
+        self.duration = None
+        self.peak_additional_disk_usage = None
+
+        # sha256 hex digests of archive parts, in order of parts, filled in once parts are downloaded
+        self.digests = None
+
+    def extract(self):
+        """
+        Download and extract archive
+        """
+
+        start = time.perf_counter()
+
+        with DiskUsageMonitor(self.output_directory) as disk_usage_monitor:
+
+            if py7zr is not None:
+
+                self._extract_while_downloading(disk_usage_monitor)
+
+            else:
+
+                if self.verbose:
+                    print("py7zr isn't installed, so archive will be extracted with 7z tool only after all its parts "
+                          "are downloaded, and parts will be kept on disk until then. Install py7zr to extract "
+                          "archive while it's downloading.")
+
+                self._extract_after_downloading(disk_usage_monitor)
+
+        self.duration = time.perf_counter() - start
+        self.peak_additional_disk_usage = disk_usage_monitor.get_peak_additional_usage()
+
+        if self.verbose:
+            print(self.get_report())
+
+    def get_report(self):
+        """
+        Get report of wall time and peak disk usage of last extraction
+        :return: str
+        """
+
+        message = "Downloaded and extracted {} archive parts in {:.1f}s, peak additional usage of filesystem " \
+            "was {:.2f} GB"
+
+        return message.format(len(self.paths), self.duration, self.peak_additional_disk_usage / 2**30)
+
+    def get_download_order(self):
+        """
+        Get order in which archive parts are downloaded - last part, which holds archive headers, first,
+        then remaining parts in order they are read during extraction
+        :return: list of parts indices
+        """
+
+        return [len(self.paths) - 1] + list(range(len(self.paths) - 1))
+
+    def _extract_while_downloading(self, disk_usage_monitor):
+
+        order = self.get_download_order()
+
+        # Created once download manager reports parts sizes, which it gets from HEAD requests it makes anyway
+        multi_part_files = []
+        sizes_known_event = threading.Event()
+
+        def on_sizes_known(sizes):
+
+            if None in sizes:
+                raise IOError("Server didn't report sizes of all archive parts, they can't be read while downloading")
+
+            parts_sizes = [None] * len(order)
+
+            for index, size in zip(order, sizes):
+                parts_sizes[index] = size
+
+            multi_part_files.append(MultiPartFile(self.paths, parts_sizes))
+            sizes_known_event.set()
+
+        def on_part_downloaded(index):
+
+            multi_part_files[0].set_part_available(order[index])
+            disk_usage_monitor.sample()
+
+        download_errors = []
+
+        # Set when extraction fails, so that remaining parts aren't downloaded for nothing
+        stop_event = threading.Event()
+
+        def download():
+
+            try:
+                digests = self.download_manager.download(
+                    [self.urls[index] for index in order], [self.paths[index] for index in order],
+                    checksums=[self.checksums[index] for index in order], verbose=self.verbose,
+                    file_callback=on_part_downloaded, sizes_callback=on_sizes_known, stop_event=stop_event)
+
+                self.digests = [None] * len(order)
+
+                for index, digest in zip(order, digests):
+                    self.digests[index] = digest
+
+            except Exception as error:
+                download_errors.append(error)
+
+                # Unblock extraction, so that it fails on parts that weren't verified instead of waiting forever
+                if len(multi_part_files) > 0:
+                    multi_part_files[0].abort()
+
+                sizes_known_event.set()
+
+        download_thread = threading.Thread(target=download)
+        download_thread.start()
+
+        try:
+
+            sizes_known_event.wait()
+
+            # Without parts sizes download failed before any part was downloaded, its error is raised below
+            if len(multi_part_files) > 0:
+
+                with py7zr.SevenZipFile(multi_part_files[0], mode="r") as archive:
+
+                    # Headers were parsed, from now on archive is read forward
+                    multi_part_files[0].enable_consumed_parts_deletion()
+                    archive.extractall(path=self.output_directory)
+
+        except BaseException:
+
+            stop_event.set()
+            raise
+
+        finally:
+
+            download_thread.join()
+
+        if len(download_errors) > 0:
+            raise download_errors[0]
+
+        self._remove_parts()
+
+    def _extract_after_downloading(self, disk_usage_monitor):
+
+        self.digests = self.download_manager.download(
+            self.urls, self.paths, checksums=self.checksums, verbose=self.verbose)
+        disk_usage_monitor.sample()
+
+        subprocess.check_call(["7z", "x", "-y", self.paths[0], "-o" + self.output_directory])
+        disk_usage_monitor.sample()
+
+        self._remove_parts()
+
+    def _remove_parts(self):
+
+        for path in self.paths:
+
+            if os.path.exists(path):
+                os.remove(path)
+
+            progress_path = face.download.DownloadProgress.get_progress_path(path)
+
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
@@ -4,51 +4,56 @@ Code for working with Celeb+ dataset
 
 import os
 import shutil
-import subprocess
 import glob
+import functools
 
+import face.datasets.archives
+import face.datasets.stages
 import face.download
+import face.manifest
 import face.utilities
 import face.geometry
 
 
+# Expected sha256 hex digests of Celeb+ files, keyed by file name. Corrupted or truncated downloads of listed files
+# are downloaded again instead of being passed on to extraction. Digests have to be recorded from a download
+# verified against the dataset's published files, e.g. with scripts/download_data.py --record-checksums,
+# files that aren't listed aren't verified.
+celeb_checksums = {}
+
+
 class DatasetBuilder:
     """
     Class for downloading Celeb+ data and preparing datasets from it.
+    Building is split into stages - downloading, extracting, indexing and splitting into datasets - that record
+    what they produced, so rebuilding only runs stages whose outputs are missing or whose parameters changed.
     """
 
-    def __init__(self, data_directory):
+    def __init__(self, data_directory, datasets_splits=None, checksums=None):
+        """
+        Constructor
+        :param data_directory: directory in which data is stored
+        :param datasets_splits: dictionary mapping dataset directory names to splits of image paths into training,
+        validation and test sets. Each split is a list of four indices, with None denoting number of all images.
+        Defaults to large, medium and small datasets.
+        :param checksums: dictionary mapping names of downloaded files to their expected sha256 hex digests,
+        defaults to celeb_checksums. Files without a digest aren't verified.
+        """
 
         self.data_directory = data_directory
         self.bounding_boxes_path = os.path.join(self.data_directory, "all_bounding_boxes.txt")
+        self.images_manifest_path = os.path.join(self.data_directory, "all_images.manifest")
 
-    def build_datasets(self):
-
-        shutil.rmtree(self.data_directory, ignore_errors=True)
-        os.makedirs(self.data_directory, exist_ok=True)
+        # Top level directory of image archives
+        self.images_directory = os.path.join(self.data_directory, "img_celeba")
 
-        self._get_images()
-        self._get_bounding_boxes()
-
-        image_paths = self._get_image_paths(self.data_directory)
-        bounding_boxes_map = self._get_bounding_boxes_map(self.bounding_boxes_path)
-
-        datasets_dirs = ["large_dataset", "medium_dataset", "small_dataset"]
-
-        large_dataset_split = [0, 180000, 190000, len(image_paths)]
-        medium_dataset_split = [0, 10000, 20000, 30000]
-        small_dataset_split = [0, 1000, 2000, 3000]
-
-        splits = [large_dataset_split, medium_dataset_split, small_dataset_split]
-
-        for dataset_dir, splits in zip(datasets_dirs, splits):
-
-            directory = os.path.join(self.data_directory, dataset_dir)
-            DataSubsetBuilder(directory, image_paths, bounding_boxes_map, splits).build()
-
-    def _get_images(self):
+        self.datasets_splits = datasets_splits if datasets_splits is not None else {
+            "large_dataset": [0, 180000, 190000, None],
+            "medium_dataset": [0, 10000, 20000, 30000],
+            "small_dataset": [0, 1000, 2000, 3000]
+        }
 
-        image_archives_urls = [
+        self.image_archives_urls = [
             "https://www.dropbox.com/sh/8oqt9vytwxb3s4r/AABQwEE5YX5jTFGXjo0f9glIa/Img/img_celeba.7z/img_celeba.7z.001?dl=1",
             "https://www.dropbox.com/sh/8oqt9vytwxb3s4r/AADxKopMA7g_Ka2o7X7B8jiHa/Img/img_celeba.7z/img_celeba.7z.002?dl=1",
             "https://www.dropbox.com/sh/8oqt9vytwxb3s4r/AABSqeGALxGo1sXZ-ZizRFa5a/Img/img_celeba.7z/img_celeba.7z.003?dl=1",
@@ -65,26 +70,104 @@ class DatasetBuilder:
             "https://www.dropbox.com/sh/8oqt9vytwxb3s4r/AADuEM2h2qG_L0UbUTViRH5Da/Img/img_celeba.7z/img_celeba.7z.014?dl=1"
         ]
 
-        filenames = [os.path.basename(url).split("?")[0] for url in image_archives_urls]
-        paths = [os.path.join(self.data_directory, filename) for filename in filenames]
+        self.bounding_boxes_url = \
+            "https://www.dropbox.com/sh/8oqt9vytwxb3s4r/AACL5lLyHMAHvFA8W17JDahma/Anno/list_bbox_celeba.txt?dl=1"
+
+        self.checksums = checksums if checksums is not None else celeb_checksums
+
+        filenames = [os.path.basename(url).split("?")[0] for url in self.image_archives_urls]
+        self.image_archives_paths = [os.path.join(self.data_directory, filename) for filename in filenames]
+        self.image_archives_checksums = [self.checksums.get(filename) for filename in filenames]
+
+        # sha256 hex digests of files downloaded by build_datasets(), keyed by file name
+        self.downloaded_checksums = {}
+
+    def build_datasets(self):
+        """
+        Build datasets, skipping stages that are up to date
+        :return: names of stages that were run
+        """
+
+        os.makedirs(self.data_directory, exist_ok=True)
+
+        runner = face.datasets.stages.StagesRunner(os.path.join(self.data_directory, "build_stages.json"))
+
+        for stage in self.get_stages():
+            runner.run(stage)
+
+        return runner.executed_stages_names
+
+    def get_stages(self):
+        """
+        Get final stages of the build, one for each dataset
+        :return: list of face.datasets.stages.Stage instances
+        """
+
+        images_stage = face.datasets.stages.Stage(
+            "download_and_extract_images", self._get_images, parameters=self.image_archives_urls)
+
+        download_bounding_boxes_stage = face.datasets.stages.Stage(
+            "download_bounding_boxes", self._get_bounding_boxes, parameters=self.bounding_boxes_url)
+
+        index_stage = face.datasets.stages.Stage(
+            "index", self._index_images, parameters={"output_format": "manifest"},
+            dependencies=[images_stage, download_bounding_boxes_stage])
+
+        return [
+            face.datasets.stages.Stage(
+                "split_" + dataset_directory,
+                functools.partial(self._build_dataset, dataset_directory, splits),
+                parameters={"splits": splits, "output_format": "manifest"}, dependencies=[index_stage])
+            for dataset_directory, splits in sorted(self.datasets_splits.items())]
 
-        # Download image archives
-        for url, path in zip(image_archives_urls, paths):
+    def _get_images(self):
 
-            face.download.Downloader(url, path).download()
+        # Download image archives and extract them, overlapping extraction with download where possible
+        extractor = face.datasets.archives.PipelinedArchiveExtractor(
+            self.image_archives_urls, self.image_archives_paths, self.data_directory,
+            checksums=self.image_archives_checksums)
 
-        # Extract images
-        subprocess.call(["7z", "x", paths[0], "-o" + self.data_directory])
+        extractor.extract()
 
-        # Delete image archives
-        for path in paths:
+        for path, digest in zip(self.image_archives_paths, extractor.digests):
+            self.downloaded_checksums[os.path.basename(path)] = digest
 
-            os.remove(path)
+        return [self.images_directory]
 
     def _get_bounding_boxes(self):
 
-        url = "https://www.dropbox.com/sh/8oqt9vytwxb3s4r/AACL5lLyHMAHvFA8W17JDahma/Anno/list_bbox_celeba.txt?dl=1"
-        face.download.Downloader(url, self.bounding_boxes_path).download()
+        filename = os.path.basename(self.bounding_boxes_url).split("?")[0]
+
+        digests = face.download.DownloadManager().download(
+            [self.bounding_boxes_url], [self.bounding_boxes_path], checksums=[self.checksums.get(filename)])
+
+        self.downloaded_checksums[filename] = digests[0]
+        return [self.bounding_boxes_path]
+
+    def _index_images(self):
+
+        # Sort paths, so that datasets splits are reproducible
+        image_paths = sorted(self._get_image_paths(self.data_directory))
+        bounding_boxes_map = self._get_bounding_boxes_map(self.bounding_boxes_path)
+
+        bounds = [bounding_boxes_map[os.path.basename(path)].bounds for path in image_paths]
+        image_sizes = [face.utilities.get_image_size(path) for path in image_paths]
+
+        manifest = face.manifest.DatasetManifest.from_lists(
+            image_paths, bounds, image_sizes, ["unassigned"] * len(image_paths))
+
+        manifest.save(self.images_manifest_path)
+        return [self.images_manifest_path]
+
+    def _build_dataset(self, dataset_directory, splits):
+
+        manifest = face.manifest.DatasetManifest.load(self.images_manifest_path)
+        splits = [split if split is not None else len(manifest) for split in splits]
+
+        directory = os.path.join(self.data_directory, dataset_directory)
+        DataSubsetBuilder(directory, manifest, splits).build()
+
+        return [directory]
 
     def _get_image_paths(self, data_directory):
 
@@ -103,7 +186,7 @@ class DatasetBuilder:
 
             filename = tokens[0]
 
-            integer_tokens = [round(token) for token in tokens[1:]]
+            integer_tokens = [round(float(token)) for token in tokens[1:]]
             bounding_box = face.geometry.get_bounding_box(*integer_tokens)
 
             bounding_boxes_map[filename] = bounding_box
@@ -116,11 +199,10 @@ class DataSubsetBuilder:
     A helper class for DatasetBuilder
     """
 
-    def __init__(self, directory, image_paths, bounding_boxes_map, splits):
+    def __init__(self, directory, manifest, splits):
 
         self.data_directory = directory
-        self.image_paths = image_paths
-        self.bounding_boxes_map = bounding_boxes_map
+        self.manifest = manifest
         self.splits = splits
 
     def build(self):
@@ -128,56 +210,10 @@ class DataSubsetBuilder:
         shutil.rmtree(self.data_directory, ignore_errors=True)
         os.makedirs(self.data_directory, exist_ok=True)
 
-        training_image_paths = self.image_paths[self.splits[0]:self.splits[1]]
-        validation_image_paths = self.image_paths[self.splits[1]:self.splits[2]]
-        test_image_paths = self.image_paths[self.splits[2]:self.splits[3]]
-
-        splitted_image_paths = [training_image_paths, validation_image_paths, test_image_paths]
-
-        prefixes = ["training_", "validation_", "test_"]
-
-        images_list_file_names = [prefix + "image_paths.txt" for prefix in prefixes]
-        images_list_file_paths = [os.path.join(self.data_directory, filename)
-                                  for filename in images_list_file_names]
-
-        # Create files with image paths
-        for image_list_path, image_paths in zip(images_list_file_paths, splitted_image_paths):
-            self._create_paths_file(image_list_path, image_paths)
-
-        bounding_boxes_list_file_names = [prefix + "bounding_boxes_list.txt" for prefix in prefixes]
-        bounding_boxes_list_file_paths = [os.path.join(self.data_directory, filename)
-                                          for filename in bounding_boxes_list_file_names]
-
-        # Create files with bounding boxes lists
-        for bounding_box_list_path, image_paths in zip(bounding_boxes_list_file_paths, splitted_image_paths):
-            self._create_bounding_boxes_file(bounding_box_list_path, image_paths, self.bounding_boxes_map)
-
-    def _create_paths_file(self, file_path, image_paths):
-
-        paths = [path + "\n" for path in image_paths]
-
-        with open(file_path, "w") as file:
-
-            file.writelines(paths)
-
-    def _create_bounding_boxes_file(self, file_path, image_paths, bounding_boxes_map):
-
-        image_paths = [os.path.basename(path) for path in image_paths]
-
-        header = str(len(image_paths)) + "\nimage_id x_1 y_1 width height\n"
-
-        with open(file_path, "w") as file:
-
-            file.write(header)
-
-            for image_path in image_paths:
-
-                bounds = [round(value) for value in bounding_boxes_map[image_path].bounds]
+        splits_names = []
 
-                x = bounds[0]
-                y = bounds[1]
-                width = bounds[2] - bounds[0]
-                height = bounds[3] - bounds[1]
+        for name, start, end in zip(["training", "validation", "test"], self.splits[:-1], self.splits[1:]):
+            splits_names.extend([name] * (end - start))
 
-                line = "{}\t{} {} {} {}\n".format(image_path, x, y, width, height)
-                file.write(line)
+        manifest = self.manifest[self.splits[0]:self.splits[-1]].with_splits(splits_names)
+        manifest.save(os.path.join(self.data_directory, "dataset.manifest"))
@@ -0,0 +1,119 @@
+"""
+Code for building datasets in stages that record what they produced, so that stages that are up to date can be skipped
+"""
+
+import hashlib
+import json
+import os
+
+
+class Stage:
+    """
+    A single step of building a dataset. Stage is described by a function that performs it and returns paths
+    of files or directories it produced, parameters it depends on and stages whose outputs it consumes.
+    """
+
+    def __init__(self, name, function, parameters=None, dependencies=()):
+        """
+        Constructor
+        :param name: name of the stage, must be unique among stages of a build
+        :param function: function performing the stage, must return list of paths it produced
+        :param parameters: json-serializable parameters of the stage. Changing them makes stage out of date
+        :param dependencies: list of stages this stage depends on
+        """
+
+        self.name = name
+        self.function = function
+        self.parameters = parameters
+        self.dependencies = list(dependencies)
+
+
+class StagesRunner:
+    """
+    Runs stages, skipping ones that are up to date. Stage is up to date if it completed before with same parameters
+    and dependencies and all its outputs still exist. Stage that recorded no outputs is never up to date, as there
+    is nothing to check its results still exist by. Records of completed stages are kept in a json file.
+    """
+
+    def __init__(self, records_path):
+        """
+        Constructor
+        :param records_path: path to json file with records of completed stages
+        """
+
+        self.records_path = records_path
+        self.records = self._load_records()
+
+        # Names of stages run, in order they were run, useful for reporting
+        self.executed_stages_names = []
+
+    def get_fingerprint(self, stage):
+        """
+        Get fingerprint of a stage, which changes whenever stage's parameters or fingerprint of any
+        of its dependencies change
+        :param stage: Stage instance
+        :return: hex string
+        """
+
+        description = {
+            "name": stage.name,
+            "parameters": stage.parameters,
+            "dependencies": [self.get_fingerprint(dependency) for dependency in stage.dependencies]
+        }
+
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def is_up_to_date(self, stage):
+        """
+        Check whether stage is up to date
+        :param stage: Stage instance
+        :return: bool
+        """
+
+        record = self.records.get(stage.name)
+
+        return record is not None and record["fingerprint"] == self.get_fingerprint(stage) and \
+            len(record["outputs"]) > 0 and all([os.path.exists(path) for path in record["outputs"]])
+
+    def run(self, stage):
+        """
+        Run stage, unless it is up to date. Dependencies of the stage are run first, if they aren't up to date.
+        Dependencies of a stage that is up to date aren't checked, so e.g. downloaded archives can be deleted once
+        they are extracted.
+        :param stage: Stage instance
+        :return: list of outputs of the stage
+        """
+
+        if not self.is_up_to_date(stage):
+
+            for dependency in stage.dependencies:
+                self.run(dependency)
+
+            # Remove record first, so that a stage interrupted midway isn't considered completed
+            self.records.pop(stage.name, None)
+            self._save_records()
+
+            outputs = stage.function()
+            self.executed_stages_names.append(stage.name)
+
+            self.records[stage.name] = {"fingerprint": self.get_fingerprint(stage), "outputs": list(outputs)}
+            self._save_records()
+
+        return self.records[stage.name]["outputs"]
+
+    def _load_records(self):
+
+        if not os.path.exists(self.records_path):
+            return {}
+
+        with open(self.records_path) as file:
+            return json.load(file)
+
+    def _save_records(self):
+
+        temporary_path = self.records_path + ".tmp"
+
+        with open(temporary_path, "w") as file:
+            json.dump(self.records, file, indent=4, sort_keys=True)
+
+        os.replace(temporary_path, self.records_path)
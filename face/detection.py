@@ -2,13 +2,30 @@
 Module with high level functionality for face detection
 """
 
-import shapely.geometry
-import numpy as np
-import cv2
+import concurrent.futures
+import contextlib
+import math
+import threading
+import time
 
+import face.lazy
 import face.utilities
 import face.geometry
 import face.processing
+import face.config
+import face.planning
+import face.tracing
+
+
+shapely = face.lazy.LazyModule("shapely", ["shapely.geometry"])
+np = face.lazy.LazyModule("numpy")
+cv2 = face.lazy.LazyModule("cv2")
+keras = face.lazy.LazyModule("keras")
+
+
+# Data type of images searched and crops passed to models, same as default Keras float type, so that models
+# don't have to convert inputs
+inference_dtype = "float32"
 
 
 class FaceCandidate:
@@ -125,71 +142,339 @@ def get_face_candidates_generator(image, crop_size, stride, batch_size):
         return
 
 
-class SingleScaleHeatmapComputer:
+def get_scores_grid(image, model, configuration, trace=None, prefilter=None):
     """
-    Class for computing face presence heatmap given an image, prediction model and scanning parameters.
-    Heatmap is computing only at a single scale.
+    Compute face prediction scores of all crops taken from image by get_face_candidates_generator. Windows are
+    scored in same order and batches as get_face_candidates_generator yields them, but crops are copied straight
+    into reusable batch buffers instead of being wrapped in FaceCandidate instances.
+    :param image: image to search
+    :param model: face prediction model
+    :param configuration: SingleScaleFaceSearchConfiguration instance
+    :param trace: optional face.tracing.PyramidLevelTrace instance batches statistics are recorded in
+    :param prefilter: optional face.prefilter.WindowsPrefilter instance. Windows it rejects aren't passed to model
+    and get score 0.
+    :return: 2D numpy array of scores. Element at (row, column) is score of crop with top left corner at
+    (column * stride, row * stride)
+    """
+
+    if prefilter is not None:
+
+        mask = prefilter.get_mask(image, configuration.crop_size, configuration.stride)
+
+        if trace is not None:
+            trace.rejected_count += int(mask.size - np.count_nonzero(mask))
+
+    else:
+
+        rows_count = max(0, (image.shape[0] - configuration.crop_size) // configuration.stride + 1)
+        columns_count = max(0, (image.shape[1] - configuration.crop_size) // configuration.stride + 1)
+
+        mask = np.ones(shape=(rows_count, columns_count), dtype=bool)
+
+    scores = np.zeros(shape=mask.shape, dtype=np.float32)
+
+    # Row major order, same as get_face_candidates_generator
+    rows, columns = np.nonzero(mask)
+
+    windows_scores_generator = get_windows_scores_generator(image, model, configuration, rows, columns)
+
+    while True:
+
+        # Tracing shouldn't cost anything when it's disabled
+        if trace is not None:
+            start = time.perf_counter()
+
+        batch = next(windows_scores_generator, None)
+
+        if batch is None:
+            break
+
+        index, batch_scores = batch
+        scores[rows[index:index + len(batch_scores)], columns[index:index + len(batch_scores)]] = batch_scores
+
+        if trace is not None:
+            trace.add_batch(len(batch_scores), time.perf_counter() - start)
+
+    return scores
+
+
+def get_levels_scores_grids(images, model, configuration, threads_count, traces=None, prefilter=None):
+    """
+    Compute scores grids of multiple pyramid levels on a pool of threads. Levels are split into bands of whole
+    windows rows, so that large levels are spread over several threads and small levels share a thread.
+    Bands are merged in order, so results don't depend on how threads were scheduled. Model must be safe to call
+    from multiple threads, Keras models are prepared for that with get_model_threads_context.
+    :param images: list of pyramid levels images
+    :param model: face prediction model
+    :param configuration: SingleScaleFaceSearchConfiguration instance
+    :param threads_count: number of threads
+    :param traces: optional list of face.tracing.PyramidLevelTrace instances, one per level, statistics are
+    recorded in
+    :param prefilter: optional face.prefilter.WindowsPrefilter instance windows are filtered with before scoring
+    :return: list of 2D numpy arrays of scores, one per level, as returned by get_scores_grid
+    """
+
+    crop_size = configuration.crop_size
+    stride = configuration.stride
+
+    shapes = [(max(0, (image.shape[0] - crop_size) // stride + 1), max(0, (image.shape[1] - crop_size) // stride + 1))
+              for image in images]
+
+    # A few bands per thread let threads that finished early pick up remaining work
+    bands_per_thread = 4
+    windows_count = sum(rows_count * columns_count for rows_count, columns_count in shapes)
+    max_band_windows = max(1, math.ceil(windows_count / (bands_per_thread * threads_count)))
+
+    bands = []
+
+    for level_index, (rows_count, columns_count) in enumerate(shapes):
+
+        band_rows_count = max(1, max_band_windows // max(1, columns_count))
+
+        for start in range(0, rows_count, band_rows_count):
+            bands.append((level_index, start, min(rows_count, start + band_rows_count)))
+
+    model_context = get_model_threads_context(model)
+
+    def get_band_scores(band):
+
+        with model_context():
+
+            return get_band_scores_in_model_context(band)
+
+    def get_band_scores_in_model_context(band):
+
+        level_index, start, end = band
+        image = images[level_index]
+
+        trace = None
+
+        if traces is not None:
+            trace = face.tracing.PyramidLevelTrace(
+                traces[level_index].detector, traces[level_index].scale, image.shape, configuration.batch_size)
+
+        band_image = image[start * stride:(end - 1) * stride + crop_size]
+        scores = get_scores_grid(band_image, model, configuration, trace, prefilter)
+
+        if trace is not None:
+            trace.end = time.perf_counter()
+
+        return scores, trace
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads_count) as executor:
+
+        bands_results = list(executor.map(get_band_scores, bands))
+
+    levels_bands_scores = [[] for _ in images]
+
+    for (level_index, _, _), (scores, trace) in zip(bands, bands_results):
+
+        levels_bands_scores[level_index].append(scores)
+
+        if trace is not None:
+            traces[level_index].add_trace(trace)
+
+    return [np.concatenate(bands_scores) if len(bands_scores) > 0 else np.zeros(shape, dtype=np.float32)
+            for bands_scores, shape in zip(levels_bands_scores, shapes)]
+
+
+def get_model_threads_context(model):
+    """
+    Prepare model for being called from threads other than the one it was built in. With TensorFlow backend Keras
+    models live in a TensorFlow graph that's only default in thread that built them and their predict function is
+    built lazily, on first call, so predict function is built upfront and calls from other threads must run
+    within model's graph. Other models, including Keras models with other backends or Keras versions that don't
+    expose these internals, are called as they are.
+    :param model: face prediction model
+    :return: function returning a context manager each thread should call model in
+    """
+
+    # Checking classes' modules, rather than isinstance, avoids importing keras for models that don't need it
+    is_keras_model = any([cls.__module__.split(".")[0] == "keras" for cls in model.__class__.__mro__])
+
+    if not is_keras_model or getattr(keras.backend, "backend", lambda: None)() != "tensorflow":
+
+        return contextlib.nullcontext
+
+    # Private predict function and session only exist in graph based Keras versions
+    if not hasattr(model, "_make_predict_function") or not hasattr(keras.backend, "get_session"):
+
+        return contextlib.nullcontext
+
+    model._make_predict_function()
+    return keras.backend.get_session().graph.as_default
+
+
+def get_windows_scores_generator(image, model, configuration, rows, columns):
     """
+    Returns a generator that scores windows at given scores grid positions, one batch at a time.
+    Window at (row, column) has top left corner at (column * stride, row * stride). Crops are copied into a batch
+    buffer from batch_buffers_pool, so model always gets inference_dtype input.
+    :param image: image to search
+    :param model: face prediction model
+    :param configuration: SingleScaleFaceSearchConfiguration instance
+    :param rows: array of windows rows
+    :param columns: array of windows columns
+    :return: generator yielding (index of first window in batch, scores of windows in batch) tuples
+    """
+
+    crop_size = configuration.crop_size
+    stride = configuration.stride
+
+    if len(rows) == 0:
+        return
+
+    buffer = batch_buffers_pool.get_buffer(configuration.batch_size, (crop_size, crop_size) + image.shape[2:])
 
-    def __init__(self, image, model, configuration):
+    for start in range(0, len(rows), configuration.batch_size):
+
+        end = start + configuration.batch_size
+        batch = buffer[:len(rows[start:end])]
+
+        for index, (row, column) in enumerate(zip(rows[start:end], columns[start:end])):
+            batch[index] = image[row * stride:row * stride + crop_size, column * stride:column * stride + crop_size]
+
+        yield start, np.ravel(model.predict(batch, batch_size=configuration.batch_size))
+
+
+class BatchBuffersPool:
+    """
+    Pool of preallocated arrays crops batches are assembled in before being passed to a model. Each thread gets its
+    own buffers, which are reused for every batch of same shape, so that scoring windows doesn't allocate a new
+    batch array for every batch.
+    """
+
+    def __init__(self):
         """
         Constructor
-        :param image: image to compute heatmap for
-        :param model: face prediction model
-        :param configuration: FaceSearchConfiguration instance
         """
 
-        self.image = image
-        self.model = model
-        self.configuration = configuration
+        self.local = threading.local()
 
-    def get_heatmap(self):
+    def get_buffer(self, batch_size, crop_shape):
         """
-        Returns heatmap
-        :return: 2D numpy array of same size as image used to construct class HeatmapComputer instance
+        Get buffer for a batch of crops. Buffer is reused by later calls from same thread, so its contents are only
+        valid until then.
+        :param batch_size: batch size
+        :param crop_shape: shape of a single crop
+        :return: numpy array of shape (batch_size,) + crop_shape and inference_dtype
         """
 
-        heatmap = np.zeros(shape=self.image.shape[:2], dtype=np.float32)
+        if not hasattr(self.local, "buffers"):
+            self.local.buffers = {}
 
-        face_candidates_generator = get_face_candidates_generator(
-            self.image, self.configuration.crop_size, self.configuration.stride, self.configuration.batch_size)
+        shape = (batch_size,) + tuple(crop_shape)
 
-        for candidates_batch in face_candidates_generator:
+        if shape not in self.local.buffers:
+            self.local.buffers[shape] = np.zeros(shape=shape, dtype=inference_dtype)
 
-            scores = self._get_candidate_scores(candidates_batch)
+        return self.local.buffers[shape]
 
-            for face_candidate, score in zip(candidates_batch, scores):
 
-                x_start, y_start, x_end, y_end = [round(value) for value in face_candidate.focus_coordinates.bounds]
-                heatmap[y_start:y_end, x_start:x_end] = score
+# Pool of batch buffers used by windows scoring functions
+batch_buffers_pool = BatchBuffersPool()
 
-        return heatmap
 
-    def _get_candidate_scores(self, face_candidates):
+def get_candidate_scores(face_candidates, model, batch_size):
+    """
+    Get model scores for a list of face candidates
+    :param face_candidates: list of FaceCandidate instances
+    :param model: face prediction model
+    :param batch_size: batch size used by model
+    :return: scores model returned
+    """
 
-        face_crops = [candidate.cropped_image for candidate in face_candidates]
-        scores = self.model.predict(np.array(face_crops), batch_size=self.configuration.batch_size)
+    face_crops = [candidate.cropped_image for candidate in face_candidates]
+    return model.predict(np.array(face_crops), batch_size=batch_size)
 
-        return scores
 
+class ScoresGrid:
+    """
+    Raw scores of all windows examined by a sliding window search over a single pyramid level, along with
+    information needed to map windows back to coordinates of searched image.
+    """
 
-class HeatmapComputer:
+    def __init__(self, scores, scale, crop_size, stride, offset=(0, 0)):
+        """
+        Constructor
+        :param scores: 2D numpy array of scores, as returned by get_scores_grid
+        :param scale: scale of pyramid level w.r.t. searched image
+        :param crop_size: size of windows
+        :param stride: stride between windows
+        :param offset: (x, y) coordinates of top left corner of first window, in pyramid level coordinates
+        """
+
+        self.scores = scores
+        self.scale = scale
+        self.crop_size = crop_size
+        self.stride = stride
+        self.offset = offset
+
+    def get_windows_bounds(self, rows, columns):
+        """
+        Get bounds of windows at given grid positions, in pyramid level coordinates
+        :param rows: array of grid rows
+        :param columns: array of grid columns
+        :return: bounds array of shape (n, 4)
+        """
+
+        x = self.offset[0] + np.asarray(columns) * self.stride
+        y = self.offset[1] + np.asarray(rows) * self.stride
+
+        return np.stack([x, y, x + self.crop_size, y + self.crop_size], axis=-1).astype(np.float64)
+
+    def get_heatmap(self, shape):
+        """
+        Paint scores onto a heatmap. Each window's score is painted over its focus region - central stride x stride
+        part of the window - and where focus regions overlap, later windows overwrite earlier ones.
+        :param shape: shape of pyramid level image
+        :return: 2D numpy array of given shape
+        """
+
+        heatmap = np.zeros(shape=shape[:2], dtype=np.float32)
+
+        rows_count, columns_count = self.scores.shape
+
+        if rows_count == 0 or columns_count == 0:
+
+            return heatmap
+
+        focus_offset = (self.crop_size - self.stride) // 2
+        focus_size = self.crop_size - 2 * focus_offset
+
+        x_start = self.offset[0] + focus_offset
+        y_start = self.offset[1] + focus_offset
+
+        x_end = x_start + (columns_count - 1) * self.stride + focus_size
+        y_end = y_start + (rows_count - 1) * self.stride + focus_size
+
+        # Each pixel takes score of last window whose focus region covers it
+        rows = np.minimum(np.arange(y_end - y_start) // self.stride, rows_count - 1)
+        columns = np.minimum(np.arange(x_end - x_start) // self.stride, columns_count - 1)
+
+        heatmap[y_start:y_end, x_start:x_end] = self.scores[rows[:, np.newaxis], columns[np.newaxis, :]]
+        return heatmap
+
+
+class SingleScaleHeatmapComputer:
     """
     Class for computing face presence heatmap given an image, prediction model and scanning parameters.
-    Heatmap is computed at multiple scales as per configuration parameter.
+    Heatmap is computing only at a single scale.
     """
 
-    def __init__(self, image, model, configuration):
+    def __init__(self, image, model, configuration, prefilter=None):
         """
         Constructor
         :param image: image to compute heatmap for
         :param model: face prediction model
-        :param configuration: MultiScaleFaceSearchConfiguration instance
+        :param configuration: FaceSearchConfiguration instance
+        :param prefilter: optional face.prefilter.WindowsPrefilter instance windows are filtered with before scoring
         """
 
         self.image = image
         self.model = model
         self.configuration = configuration
+        self.prefilter = prefilter
 
     def get_heatmap(self):
         """
@@ -197,31 +482,56 @@ class HeatmapComputer:
         :return: 2D numpy array of same size as image used to construct class HeatmapComputer instance
         """
 
-        heatmap = np.zeros(shape=self.image.shape[:2], dtype=np.float32)
+        return self.get_scores_grid().get_heatmap(self.image.shape)
 
-        image = self._get_largest_scale_image()
-
-        while min(image.shape[:2]) > self.configuration.crop_size:
+    def get_scores_grid(self, trace=None):
+        """
+        Get raw scores grid heatmap is computed from
+        :param trace: optional face.tracing.PyramidLevelTrace instance statistics are recorded in
+        :return: ScoresGrid instance
+        """
 
-            image = face.processing.get_scaled_image(image, self.configuration.image_rescaling_ratio)
+        scores = get_scores_grid(self.image, self.model, self.configuration, trace, self.prefilter)
+        return ScoresGrid(scores, scale=1, crop_size=self.configuration.crop_size, stride=self.configuration.stride)
 
-            single_scale_heatmap = SingleScaleHeatmapComputer(image, self.model, self.configuration).get_heatmap()
-            rescaled_single_scale_heatmap = cv2.resize(single_scale_heatmap, (heatmap.shape[1], heatmap.shape[0]))
 
-            heatmap = np.maximum(heatmap, rescaled_single_scale_heatmap)
+class HeatmapComputer:
+    """
+    Class for computing face presence heatmap given an image, prediction model and scanning parameters.
+    Heatmap is computed at multiple scales as per configuration parameter. It's a thin wrapper around
+    FaceDetector.scan, so heatmap is painted from the same pyramid levels detections are computed from.
+    """
 
-        return heatmap
+    def __init__(self, image, model, configuration, tracer=None, prefilter=None, threads_count=None):
+        """
+        Constructor
+        :param image: image to compute heatmap for
+        :param model: face prediction model
+        :param configuration: MultiScaleFaceSearchConfiguration instance
+        :param tracer: optional face.tracing.DetectionTracer instance
+        :param prefilter: optional face.prefilter.WindowsPrefilter instance windows are filtered with before scoring
+        :param threads_count: number of threads pyramid levels are searched on, see get_levels_scores_grids.
+        If None, levels are searched one after another on calling thread.
+        """
 
-    def _get_largest_scale_image(self):
+        self.image = image
+        self.model = model
+        self.configuration = configuration
+        self.tracer = tracer
+        self.prefilter = prefilter
+        self.threads_count = threads_count
 
-        # Get smallest size at which we want to search for a face in the image
-        smallest_face_size = face.processing.get_smallest_expected_face_size(
-            image_shape=self.image.shape, min_face_size=self.configuration.min_face_size,
-            min_face_to_image_ratio=self.configuration.min_face_to_image_ratio)
+    def get_heatmap(self):
+        """
+        Returns heatmap
+        :return: 2D numpy array of same size as image used to construct class HeatmapComputer instance
+        """
 
-        scale = self.configuration.crop_size / smallest_face_size
+        detector = FaceDetector(
+            self.image, self.model, self.configuration, tracer=self.tracer, prefilter=self.prefilter,
+            threads_count=self.threads_count)
 
-        return face.processing.get_scaled_image(self.image, scale)
+        return detector.scan().get_heatmap()
 
 
 class UniqueDetectionsComputer:
@@ -240,28 +550,29 @@ class UniqueDetectionsComputer:
         """
 
         unique_detections = []
+        unique_bounds = np.zeros(shape=(len(face_detections), 4))
 
         for detection in face_detections:
 
-            unique_id = 0
-            similar_detection_found = False
+            bounds = face.geometry.get_bounds_array(detection.bounding_box)
 
-            while unique_id < len(unique_detections) and similar_detection_found is False:
+            ious = face.geometry.get_intersections_over_unions(bounds, unique_bounds[:len(unique_detections)])
+            similar_ids = np.flatnonzero(ious > iou_threshold)
 
-                unique_detection = unique_detections[unique_id]
-
-                if face.geometry.get_intersection_over_union(
-                        detection.bounding_box, unique_detection.bounding_box) > iou_threshold:
+            # Detection is compared against first similar unique detection only
+            if len(similar_ids) > 0:
 
-                    unique_detections[unique_id] = unique_detection \
-                        if unique_detection.score > detection.score else detection
+                unique_id = similar_ids[0]
+                unique_detection = unique_detections[unique_id]
 
-                    similar_detection_found = True
+                if unique_detection.score <= detection.score:
 
-                unique_id += 1
+                    unique_detections[unique_id] = detection
+                    unique_bounds[unique_id] = bounds
 
-            if similar_detection_found is False:
+            else:
 
+                unique_bounds[len(unique_detections)] = bounds
                 unique_detections.append(detection)
 
         return unique_detections
@@ -279,36 +590,29 @@ class UniqueDetectionsComputer:
 
         groups_list = []
 
-        # First get groups of similar detections
-        for detection in face_detections:
-
-            group_found = False
-
-            group_id = 0
-
-            while group_id < len(groups_list) and group_found is False:
-
-                current_group = groups_list[group_id]
-                member_id = 0
+        # Bounds of all detections already assigned to groups and ids of groups they were assigned to
+        members_bounds = np.zeros(shape=(len(face_detections), 4))
+        members_groups_ids = np.zeros(shape=len(face_detections), dtype=np.int64)
 
-                while member_id < len(current_group) and group_found is False:
+        # First get groups of similar detections
+        for index, detection in enumerate(face_detections):
 
-                    group_member = current_group[member_id]
+            bounds = face.geometry.get_bounds_array(detection.bounding_box)
+            ious = face.geometry.get_intersections_over_unions(bounds, members_bounds[:index])
 
-                    if face.geometry.get_intersection_over_union(
-                            detection.bounding_box, group_member.bounding_box) > iou_threshold:
+            similar_groups_ids = members_groups_ids[:index][ious > iou_threshold]
 
-                        current_group.append(detection)
-                        group_found = True
+            # Detection joins the earliest created group that has any member similar to it
+            group_id = np.min(similar_groups_ids) if len(similar_groups_ids) > 0 else len(groups_list)
 
-                    member_id += 1
+            if group_id == len(groups_list):
 
-                group_id += 1
+                groups_list.append([])
 
-            if group_found is False:
+            groups_list[group_id].append(detection)
 
-                group = [detection]
-                groups_list.append(group)
+            members_bounds[index] = bounds
+            members_groups_ids[index] = group_id
 
         unique_detections = []
 
@@ -328,61 +632,262 @@ class UniqueDetectionsComputer:
         return unique_detections
 
 
-class SingleScaleFaceDetector:
+class DetectionsPostProcessor:
     """
-    Class for detecting faces in images at a single scale. Given an image, prediction model and scanning parameters,
-    returns a list of FaceDetection instances.
+    Class for turning raw scores grids into unique face detections. Since it works only on scores grids, it can be
+    rerun with different parameters on stored grids without running prediction model again.
     """
 
-    def __init__(self, image, model, configuration):
+    def __init__(self, score_threshold=face.config.detection_score_threshold,
+                 iou_threshold=face.config.detections_merging_iou_threshold):
         """
         Constructor
-        :param image: image to search
-        :param model: face detection model
-        :param configuration: FaceSearchConfiguration instance
+        :param score_threshold: score above which a window is considered to contain a face
+        :param iou_threshold: IOU above which detections are merged together
         """
 
-        self.image = image
-        self.model = model
-        self.configuration = configuration
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
 
-    def get_face_detections(self):
+    def get_single_scale_detections(self, scores_grid):
         """
-        Get face detections found in image instance was constructed with. Search is performed at a single scale.
-        :return: a list of FaceDetection instances
+        Get unique detections from a single scores grid
+        :param scores_grid: ScoresGrid instance
+        :return: list of FaceDetection instances, in pyramid level coordinates
         """
 
-        face_detections = []
+        rows, columns = np.nonzero(scores_grid.scores > self.score_threshold)
+        windows_bounds = scores_grid.get_windows_bounds(rows, columns)
 
-        face_candidates_generator = get_face_candidates_generator(
-            self.image, self.configuration.crop_size, self.configuration.stride, self.configuration.batch_size)
+        face_detections = [
+            FaceDetection(shapely.geometry.box(*bounds), float(score))
+            for bounds, score in zip(windows_bounds, scores_grid.scores[rows, columns])]
 
-        for candidates_batch in face_candidates_generator:
+        return UniqueDetectionsComputer.averaging(face_detections, self.iou_threshold)
 
-            scores = self._get_candidate_scores(candidates_batch)
-            face_detections.extend(self._get_positive_detections(candidates_batch, scores))
+    def get_detections(self, scores_grids, input_image_scale=1, traces=None):
+        """
+        Get unique detections from scores grids of all pyramid levels
+        :param scores_grids: list of ScoresGrid instances
+        :param input_image_scale: scale searched image was obtained with from input image
+        :param traces: optional list of face.tracing.PyramidLevelTrace instances, one per scores grid,
+        post-processing statistics are recorded in
+        :return: list of FaceDetection instances, in input image coordinates
+        """
 
-        return UniqueDetectionsComputer.averaging(face_detections, iou_threshold=0.2)
+        detections = []
 
-    def _get_candidate_scores(self, face_candidates):
+        for index, scores_grid in enumerate(scores_grids):
 
-        face_crops = [candidate.cropped_image for candidate in face_candidates]
-        scores = self.model.predict(np.array(face_crops), batch_size=self.configuration.batch_size)
+            if traces is None:
 
-        return scores
+                single_scale_detections = self.get_single_scale_detections(scores_grid)
 
-    def _get_positive_detections(self, face_candidates, scores):
+            else:
 
-        face_detections = []
+                trace = traces[index]
+                trace.post_processing_start = time.perf_counter()
 
-        for candidate, score in zip(face_candidates, scores):
+                single_scale_detections = self.get_single_scale_detections(scores_grid)
 
-            if score > 0.9:
+                trace.post_processing_duration = time.perf_counter() - trace.post_processing_start
+                trace.positives_count = int(np.count_nonzero(scores_grid.scores > self.score_threshold))
 
-                detection = FaceDetection(candidate.crop_coordinates, score)
-                face_detections.append(detection)
+            detections.extend([detection.get_scaled(1 / scores_grid.scale) for detection in single_scale_detections])
 
-        return face_detections
+        # Get unique detections and scale them as necessary, since input image might have been scaled
+        unique_detections = UniqueDetectionsComputer.averaging(detections, self.iou_threshold)
+        return [detection.get_scaled(1 / input_image_scale) for detection in unique_detections]
+
+
+def save_scores_grids(path, scores_grids, input_image_scale):
+    """
+    Save scores grids to a compressed archive
+    :param path: path to archive
+    :param scores_grids: list of ScoresGrid instances
+    :param input_image_scale: scale searched image was obtained with from input image
+    """
+
+    arrays = {"scores_{}".format(index): scores_grid.scores for index, scores_grid in enumerate(scores_grids)}
+
+    np.savez_compressed(
+        path,
+        scales=np.array([scores_grid.scale for scores_grid in scores_grids]),
+        offsets=np.array([scores_grid.offset for scores_grid in scores_grids]).reshape(-1, 2),
+        crop_sizes=np.array([scores_grid.crop_size for scores_grid in scores_grids]),
+        strides=np.array([scores_grid.stride for scores_grid in scores_grids]),
+        input_image_scale=input_image_scale,
+        **arrays)
+
+
+def load_scores_grids(path):
+    """
+    Load scores grids saved with save_scores_grids
+    :param path: path to archive
+    :return: tuple (list of ScoresGrid instances, input image scale)
+    """
+
+    with np.load(path) as data:
+
+        scores_grids = [
+            ScoresGrid(data["scores_{}".format(index)], scale, int(crop_size), int(stride), tuple(offset))
+            for index, (scale, offset, crop_size, stride) in enumerate(
+                zip(data["scales"], data["offsets"], data["crop_sizes"], data["strides"]))]
+
+        return scores_grids, float(data["input_image_scale"])
+
+
+def get_multi_scale_heatmap(scores_grids, searched_image_shape, heatmap_shape):
+    """
+    Paint scores grids of all pyramid levels onto a single heatmap. Each level is painted as in
+    ScoresGrid.get_heatmap, resized to heatmap shape, and heatmap takes maximum over levels.
+    :param scores_grids: list of ScoresGrid instances, with scales relative to searched image
+    :param searched_image_shape: shape of image pyramid levels were computed from
+    :param heatmap_shape: shape of returned heatmap, e.g. input image shape if searched image was scaled input image
+    :return: 2D numpy array of heatmap shape
+    """
+
+    heatmap = np.zeros(shape=heatmap_shape[:2], dtype=np.float32)
+
+    for scores_grid in scores_grids:
+
+        # Level shapes are computed same as in face.processing.get_scaled_image
+        level_shape = [round(scores_grid.scale * size) for size in searched_image_shape[:2]]
+
+        # Unscored windows of partially searched levels have NaN scores
+        level_heatmap = np.nan_to_num(scores_grid.get_heatmap(level_shape))
+
+        heatmap = np.maximum(heatmap, cv2.resize(level_heatmap, (heatmap.shape[1], heatmap.shape[0])))
+
+    return heatmap
+
+
+class ScanResults:
+    """
+    Raw scores grids of a multi scale search, from which both detections and heatmap can be computed without
+    running prediction model again
+    """
+
+    def __init__(self, scores_grids, searched_image_shape, input_image_shape, input_image_scale, post_processor):
+        """
+        Constructor
+        :param scores_grids: list of ScoresGrid instances, with scales relative to searched image
+        :param searched_image_shape: shape of searched image
+        :param input_image_shape: shape of input image
+        :param input_image_scale: scale searched image was obtained with from input image
+        :param post_processor: DetectionsPostProcessor instance used to compute detections
+        """
+
+        self.scores_grids = scores_grids
+        self.searched_image_shape = searched_image_shape
+        self.input_image_shape = input_image_shape
+        self.input_image_scale = input_image_scale
+        self.post_processor = post_processor
+
+    def get_detections(self):
+        """
+        Get face detections
+        :return: list of FaceDetection instances, in input image coordinates
+        """
+
+        return self.post_processor.get_detections(self.scores_grids, self.input_image_scale)
+
+    def get_heatmap(self):
+        """
+        Get face presence heatmap
+        :return: 2D numpy array of same size as input image
+        """
+
+        return get_multi_scale_heatmap(self.scores_grids, self.searched_image_shape, self.input_image_shape)
+
+
+class AnytimeDetections:
+    """
+    A simple class representing results of a detection that had to complete within a deadline
+    """
+
+    def __init__(self, detections, skipped_scales, partially_searched_scales):
+        """
+        Constructor
+        :param detections: list of FaceDetection instances found before deadline
+        :param skipped_scales: scales of pyramid levels that weren't searched at all
+        :param partially_searched_scales: scales of pyramid levels that were searched only partially
+        """
+
+        self.detections = detections
+        self.skipped_scales = skipped_scales
+        self.partially_searched_scales = partially_searched_scales
+
+    @property
+    def is_partial(self):
+        """
+        Whether search was cut short by deadline
+        :return: boolean
+        """
+
+        return len(self.skipped_scales) > 0 or len(self.partially_searched_scales) > 0
+
+
+class EarlyExitDetections:
+    """
+    A simple class representing results of a detection that could stop once enough faces were found
+    """
+
+    def __init__(self, detections, scored_windows_count, total_windows_count):
+        """
+        Constructor
+        :param detections: list of FaceDetection instances
+        :param scored_windows_count: number of windows that were scored
+        :param total_windows_count: number of windows full search would score
+        """
+
+        self.detections = detections
+        self.scored_windows_count = scored_windows_count
+        self.total_windows_count = total_windows_count
+
+    @property
+    def saved_windows_count(self):
+        """
+        Number of windows early exit saved from being scored
+        :return: integer
+        """
+
+        return self.total_windows_count - self.scored_windows_count
+
+
+class SingleScaleFaceDetector:
+    """
+    Class for detecting faces in images at a single scale. Given an image, prediction model and scanning parameters,
+    returns a list of FaceDetection instances.
+    """
+
+    def __init__(self, image, model, configuration, post_processor=None, prefilter=None):
+        """
+        Constructor
+        :param image: image to search
+        :param model: face detection model
+        :param configuration: FaceSearchConfiguration instance
+        :param post_processor: DetectionsPostProcessor instance, if None, one with default parameters is used
+        :param prefilter: optional face.prefilter.WindowsPrefilter instance windows are filtered with before scoring
+        """
+
+        self.image = image
+        self.model = model
+        self.configuration = configuration
+        self.post_processor = post_processor if post_processor is not None else DetectionsPostProcessor()
+        self.prefilter = prefilter
+
+    def get_face_detections(self):
+        """
+        Get face detections found in image instance was constructed with. Search is performed at a single scale.
+        :return: a list of FaceDetection instances
+        """
+
+        scores_grid = ScoresGrid(
+            get_scores_grid(self.image, self.model, self.configuration, prefilter=self.prefilter), scale=1,
+            crop_size=self.configuration.crop_size, stride=self.configuration.stride)
+
+        return self.post_processor.get_single_scale_detections(scores_grid)
 
 
 class FaceDetector:
@@ -391,52 +896,436 @@ class FaceDetector:
      as per configuration parameters.
     """
 
-    def __init__(self, image, model, configuration):
+    def __init__(
+            self, image, model, configuration, post_processor=None, tracer=None, prefilter=None, threads_count=None):
         """
         Constructor
         :param image: image to search
         :param model: face detection model
         :param configuration: MultiScaleFaceSearchConfiguration instance
+        :param post_processor: DetectionsPostProcessor instance, if None, one with default parameters is used
+        :param tracer: optional face.tracing.DetectionTracer instance
+        :param prefilter: optional face.prefilter.WindowsPrefilter instance windows are filtered with before scoring.
+        Rejected windows get score 0.
+        :param threads_count: number of threads pyramid levels are searched on, see get_levels_scores_grids.
+        If None, levels are searched one after another on calling thread.
         """
 
-        # Scale image down if it is too large
+        # Scale image down if it is too large. Image is converted to inference type once, so that pyramid levels
+        # and crops don't need converting.
         self.input_image_scale = 1 if min(image.shape[:2]) < 500 else 500 / min(image.shape[:2])
-        self.image = face.processing.get_scaled_image(image, self.input_image_scale)
+        self.image = face.processing.get_scaled_image(
+            np.asarray(image, dtype=inference_dtype), self.input_image_scale)
+        self.input_image_shape = image.shape
 
         self.model = model
         self.configuration = configuration
+        self.post_processor = post_processor if post_processor is not None else DetectionsPostProcessor()
+        self.tracer = tracer
+        self.prefilter = prefilter
+        self.threads_count = threads_count
 
     def get_faces_detections(self):
         """
-        Get face detections found in image instance was constructed with. Search is performed at a single scale.
+        Get face detections found in image instance was constructed with. Search is performed at multiple scales.
         :return: a list of FaceDetection instances
         """
 
-        current_scale = self._get_largest_scale()
-        image = face.processing.get_scaled_image(self.image, current_scale)
+        if self.tracer is None:
 
-        detections = []
+            return self.post_processor.get_detections(self.get_scores_grids(), self.input_image_scale)
+
+        start = time.perf_counter()
+
+        traces = []
+        scores_grids = self.get_scores_grids(traces)
+
+        detections = self.post_processor.get_detections(scores_grids, self.input_image_scale, traces)
 
-        while min(image.shape[:2]) > self.configuration.crop_size:
+        for trace in traces:
+            self.tracer.on_pyramid_level(trace)
 
-            current_scale_detections = SingleScaleFaceDetector(
-                image, self.model, self.configuration).get_face_detections()
+        self.tracer.on_detection("FaceDetector", start, time.perf_counter() - start)
+
+        return detections
+
+    def scan(self):
+        """
+        Search all pyramid levels once and return raw results detections and heatmap can both be computed from,
+        so that getting both costs no more model predictions than getting detections alone
+        :return: ScanResults instance
+        """
+
+        start = time.perf_counter() if self.tracer is not None else None
+
+        traces = [] if self.tracer is not None else None
+        scores_grids = self.get_scores_grids(traces)
+
+        if self.tracer is not None:
+
+            for trace in traces:
+                self.tracer.on_pyramid_level(trace)
+
+            self.tracer.on_detection("FaceDetector.scan", start, time.perf_counter() - start)
+
+        return ScanResults(
+            scores_grids, self.image.shape, self.input_image_shape, self.input_image_scale, self.post_processor)
+
+    def get_scores_grids(self, traces=None):
+        """
+        Get raw scores grids of all pyramid levels searched. Grids scales are relative to image stored in
+        instance, which is input image scaled by input_image_scale.
+        :param traces: optional list a face.tracing.PyramidLevelTrace instance is appended to for every level
+        :return: list of ScoresGrid instances
+        """
 
-            rescaled_detections = [detection.get_scaled(1 / current_scale) for detection in current_scale_detections]
-            detections.extend(rescaled_detections)
+        if self.threads_count is not None:
+
+            return self._get_scores_grids_in_parallel(traces)
+
+        scores_grids = []
+
+        for current_scale in self.get_scales():
 
-            current_scale *= self.configuration.image_rescaling_ratio
             image = face.processing.get_scaled_image(self.image, current_scale)
 
-        # Get unique detections and scale them as necessary, since input image might have been scaled
-        unique_detections = UniqueDetectionsComputer.averaging(detections, iou_threshold=0.2)
-        return [detection.get_scaled(1 / self.input_image_scale) for detection in unique_detections]
+            trace = None
+
+            if traces is not None:
+
+                trace = face.tracing.PyramidLevelTrace(
+                    "FaceDetector", current_scale, image.shape, self.configuration.batch_size)
+
+                traces.append(trace)
+
+            scores = get_scores_grid(image, self.model, self.configuration, trace, self.prefilter)
+            scores_grids.append(
+                ScoresGrid(scores, current_scale, self.configuration.crop_size, self.configuration.stride))
+
+            if trace is not None:
+                trace.end = time.perf_counter()
+
+        return scores_grids
+
+    def _get_scores_grids_in_parallel(self, traces):
+
+        scales = self.get_scales()
+        images = [face.processing.get_scaled_image(self.image, scale) for scale in scales]
+
+        levels_traces = None
+
+        if traces is not None:
+
+            levels_traces = [face.tracing.PyramidLevelTrace(
+                "FaceDetector", scale, image.shape, self.configuration.batch_size)
+                for scale, image in zip(scales, images)]
+
+            traces.extend(levels_traces)
+
+        levels_scores = get_levels_scores_grids(
+            images, self.model, self.configuration, self.threads_count, levels_traces, self.prefilter)
+
+        return [ScoresGrid(scores, scale, self.configuration.crop_size, self.configuration.stride)
+                for scores, scale in zip(levels_scores, scales)]
+
+    def get_scales(self):
+        """
+        Get scales of all pyramid levels searched, from largest to smallest. Scales are relative to image stored in
+        instance.
+        :return: list of floats
+        """
+
+        return self.get_pyramid_plan().get_scales()
+
+    def get_pyramid_plan(self):
+        """
+        Get plan of pyramid searched, with shapes and windows counts of all levels and estimated search cost
+        :return: face.planning.PyramidPlan instance
+        """
+
+        return face.planning.get_pyramid_plan(self.image.shape, self.configuration)
+
+    def get_faces_detections_within_deadline(
+            self, time_budget, previous_detections=None,
+            expected_face_to_image_ratio=face.config.expected_face_to_image_ratio):
+        """
+        Get face detections, returning best detections found so far if time budget runs out.
+        Levels and windows are searched in order of expected value, as described in PrioritizedSearch.
+        Deadline is checked before every batch, and a batch isn't started if longest batch so far wouldn't
+        complete before deadline.
+        If time budget suffices to search all levels, detections are the same as returned by get_faces_detections.
+        :param time_budget: time, in seconds, detection should complete in
+        :param previous_detections: optional list of FaceDetection instances, e.g. from previous video frame,
+        in input image coordinates
+        :param expected_face_to_image_ratio: expected ratio of face size to smaller image dimension
+        :return: AnytimeDetections instance
+        """
+
+        search = PrioritizedSearch(self, previous_detections, expected_face_to_image_ratio)
+        search.run(deadline=time.perf_counter() + time_budget)
+
+        detections = self.post_processor.get_detections(search.get_scores_grids(), self.input_image_scale)
+        return AnytimeDetections(detections, search.skipped_scales, search.partially_searched_scales)
+
+    def get_faces_detections_with_early_exit(
+            self, max_faces, confirmation_score=face.config.detection_confirmation_score, previous_detections=None,
+            expected_face_to_image_ratio=face.config.expected_face_to_image_ratio):
+        """
+        Get up to max_faces face detections, stopping search as soon as max_faces confirmed detections are found.
+        Levels and windows are searched in the same order as in get_faces_detections_within_deadline.
+
+        A detection is confirmed when it's output by post-processing of windows scored so far, has score not lower
+        than confirmation_score and doesn't overlap any other higher scored confirmed detection. Returned detections
+        are always exactly post-processing output of all windows that were scored, limited to max_faces highest
+        scored ones - early exit never returns a detection merge step wouldn't produce from scored windows.
+        Skipped windows could only have shifted averaged detections or added new ones, and since confirmed
+        detections don't overlap, no skipped window could have merged two of them together.
+        Since each confirmed detection contains a window with score not lower than confirmation_score, separated
+        such windows are tracked as batches are scored, and full post-processing of all scored windows is only run
+        to check for confirmed detections when their number grows to at least max_faces.
+        :param max_faces: number of faces to search for
+        :param confirmation_score: minimum score of a confirmed detection
+        :param previous_detections: optional list of FaceDetection instances, e.g. from previous video frame,
+        in input image coordinates
+        :param expected_face_to_image_ratio: expected ratio of face size to smaller image dimension
+        :return: EarlyExitDetections instance
+        """
+
+        search = PrioritizedSearch(self, previous_detections, expected_face_to_image_ratio)
+
+        # Separated windows with confirmation score found so far, in input image coordinates
+        confirmed_windows = []
+
+        def is_search_complete(scores_grid, rows, columns):
+
+            scores = scores_grid.scores[rows, columns]
+            is_confirmed = scores >= confirmation_score
+
+            # Confirmed detections can only change once a window with high enough score is found
+            if not np.any(is_confirmed):
+
+                return False
+
+            windows_bounds = scores_grid.get_windows_bounds(rows[is_confirmed], columns[is_confirmed]) / \
+                (scores_grid.scale * self.input_image_scale)
+
+            windows = [FaceDetection(shapely.geometry.box(*bounds), float(score))
+                       for bounds, score in zip(windows_bounds, scores[is_confirmed])]
+
+            separated_windows = get_separated_detections(confirmed_windows + windows, confirmation_score)
+            has_grown = len(separated_windows) > len(confirmed_windows)
+
+            confirmed_windows[:] = separated_windows
+
+            if not has_grown or len(confirmed_windows) < max_faces:
+
+                return False
+
+            detections = self.post_processor.get_detections(search.get_scores_grids(), self.input_image_scale)
+            return len(get_separated_detections(detections, confirmation_score)) >= max_faces
+
+        search.run(stop_condition=is_search_complete)
+
+        detections = self.post_processor.get_detections(search.get_scores_grids(), self.input_image_scale)
+        detections = sorted(detections, key=lambda detection: detection.score, reverse=True)[:max_faces]
+
+        return EarlyExitDetections(detections, search.scored_windows_count, search.get_total_windows_count())
+
+
+def get_separated_detections(detections, min_score):
+    """
+    Get detections with score not lower than min_score that don't overlap any higher scored such detection
+    :param detections: list of FaceDetection instances
+    :param min_score: minimum score
+    :return: list of FaceDetection instances, ordered by decreasing score
+    """
+
+    candidates = sorted(
+        [detection for detection in detections if detection.score >= min_score],
+        key=lambda detection: detection.score, reverse=True)
+
+    separated_detections = []
+    separated_bounds = np.zeros(shape=(len(candidates), 4))
+
+    for detection in candidates:
+
+        bounds = face.geometry.get_bounds_array(detection.bounding_box)
+        ious = face.geometry.get_intersections_over_unions(bounds, separated_bounds[:len(separated_detections)])
+
+        if not np.any(ious > 0):
+
+            separated_bounds[len(separated_detections)] = bounds
+            separated_detections.append(detection)
+
+    return separated_detections
+
+
+class PrioritizedSearch:
+    """
+    Helper class for FaceDetector that searches pyramid levels in order of expected value and can stop before
+    all windows are scored. Levels are searched in order of how close face size they search for is to expected
+    face size - median size of previous detections if these are given, or expected_face_to_image_ratio of smaller
+    image dimension otherwise. Within each level windows overlapping previous detections are scored first.
+    """
+
+    def __init__(self, detector, previous_detections, expected_face_to_image_ratio):
+        """
+        Constructor
+        :param detector: FaceDetector instance
+        :param previous_detections: list of FaceDetection instances in input image coordinates, or None
+        :param expected_face_to_image_ratio: expected ratio of face size to smaller image dimension
+        """
+
+        self.detector = detector
+        self.configuration = detector.configuration
+
+        previous_detections = previous_detections if previous_detections is not None else []
+
+        # Bounds of previous detections in coordinates of detector's image
+        self.previous_bounds = detector.input_image_scale * face.geometry.get_bounds_array(
+            [detection.bounding_box for detection in previous_detections])
+
+        self.expected_face_to_image_ratio = expected_face_to_image_ratio
+
+        self.plan = detector.get_pyramid_plan()
+        self.scales = self.plan.get_scales()
+        self.scores_grids = [None] * len(self.scales)
+
+        self.skipped_scales = []
+        self.partially_searched_scales = []
+        self.scored_windows_count = 0
+
+    def run(self, deadline=None, stop_condition=None):
+        """
+        Run search
+        :param deadline: optional time, as returned by time.perf_counter(), search should finish by.
+        Deadline is checked before every batch, and a batch isn't started if longest batch so far wouldn't
+        complete before deadline.
+        :param stop_condition: optional function called with ScoresGrid instance of level and arrays of rows and
+        columns of windows of each batch after it's scored, search stops once it returns True
+        """
+
+        longest_batch_duration = 0
+        is_stopped = False
+
+        for level_index in self.get_levels_search_order():
+
+            scale = self.scales[level_index]
+
+            if is_stopped or (deadline is not None and time.perf_counter() + longest_batch_duration > deadline):
+
+                self.skipped_scales.append(scale)
+                continue
+
+            image = face.processing.get_scaled_image(self.detector.image, scale)
+
+            # Windows that weren't scored have NaN scores, which never pass detection threshold
+            scores_grid = ScoresGrid(
+                np.full(self.plan.levels[level_index].grid_shape, np.nan, dtype=np.float32), scale,
+                self.configuration.crop_size, self.configuration.stride)
+
+            self.scores_grids[level_index] = scores_grid
+
+            rows, columns = self.get_windows_search_order(scores_grid)
+
+            if self.detector.prefilter is not None:
+
+                # Rejected windows count as scored with score 0, so they don't make level look partially searched
+                mask = self.detector.prefilter.get_mask(image, self.configuration.crop_size, self.configuration.stride)
+                scores_grid.scores[~mask] = 0
+
+                is_accepted = mask[rows, columns]
+                rows, columns = rows[is_accepted], columns[is_accepted]
+
+            windows_scores_generator = get_windows_scores_generator(
+                image, self.detector.model, self.configuration, rows, columns)
+
+            level_scored_windows_count = 0
+
+            while level_scored_windows_count < len(rows) and not is_stopped:
+
+                if deadline is not None and time.perf_counter() + longest_batch_duration > deadline:
+
+                    is_stopped = True
+                    break
+
+                batch_start_time = time.perf_counter()
+                start, scores = next(windows_scores_generator)
+                longest_batch_duration = max(longest_batch_duration, time.perf_counter() - batch_start_time)
+
+                scores_grid.scores[rows[start:start + len(scores)], columns[start:start + len(scores)]] = scores
+                level_scored_windows_count += len(scores)
+
+                is_stopped = stop_condition is not None and stop_condition(
+                    scores_grid, rows[start:start + len(scores)], columns[start:start + len(scores)])
+
+            self.scored_windows_count += level_scored_windows_count
+
+            if level_scored_windows_count == 0 and len(rows) > 0:
+
+                self.scores_grids[level_index] = None
+                self.skipped_scales.append(scale)
+
+            elif level_scored_windows_count < len(rows):
+
+                self.partially_searched_scales.append(scale)
+
+    def get_scores_grids(self):
+        """
+        Get scores grids of levels that were at least partially searched, in pyramid order, so that
+        post-processing them gives the same results as FaceDetector.get_faces_detections when nothing was skipped
+        :return: list of ScoresGrid instances
+        """
+
+        return [scores_grid for scores_grid in self.scores_grids if scores_grid is not None]
+
+    def get_total_windows_count(self):
+        """
+        Get number of windows full search would score
+        :return: integer
+        """
+
+        return self.plan.get_windows_count()
+
+    def get_levels_search_order(self):
+        """
+        Get indices of levels in order they should be searched
+        :return: list of integers
+        """
+
+        if len(self.previous_bounds) > 0:
+
+            expected_face_size = np.median(np.sqrt(face.geometry.get_areas(self.previous_bounds)))
+
+        else:
+
+            expected_face_size = self.expected_face_to_image_ratio * min(self.detector.image.shape[:2])
+
+        # Level at given scale searches for faces of size crop_size / scale
+        faces_sizes = np.array([level.face_size for level in self.plan.levels])
+        distances = np.abs(np.log(faces_sizes / max(expected_face_size, 1)))
+
+        return list(np.argsort(distances, kind="stable"))
+
+    def get_windows_search_order(self, scores_grid):
+        """
+        Get grid positions of windows of a level in order they should be scored
+        :param scores_grid: ScoresGrid instance of the level
+        :return: tuple (rows, columns) of arrays
+        """
+
+        rows, columns = np.indices(scores_grid.scores.shape)
+        rows = rows.ravel()
+        columns = columns.ravel()
+
+        if len(self.previous_bounds) == 0:
+
+            return rows, columns
 
-    def _get_largest_scale(self):
+        ious = face.geometry.get_pairwise_intersections_over_unions(
+            scores_grid.get_windows_bounds(rows, columns), scores_grid.scale * self.previous_bounds)
 
-        # Get smallest size at which we want to search for a face in the image
-        smallest_face_size = face.processing.get_smallest_expected_face_size(
-            image_shape=self.image.shape, min_face_size=self.configuration.min_face_size,
-            min_face_to_image_ratio=self.configuration.min_face_to_image_ratio)
+        # Windows overlapping previous detections go first, otherwise row-major order is kept
+        order = np.argsort(~np.any(ious > 0, axis=1), kind="stable")
 
-        return self.configuration.crop_size / smallest_face_size
+        return rows[order], columns[order]
@@ -0,0 +1,156 @@
+"""
+Module with teacher-student distillation functionality. Teacher model scores are computed once over crops produced
+by data generators and cached on disk, so that a small student model can be trained to mimic teacher without
+running teacher at every training step.
+"""
+
+import json
+import os
+import random
+
+import face.lazy
+
+
+np = face.lazy.LazyModule("numpy")
+tqdm = face.lazy.LazyModule("tqdm")
+
+
+def get_softened_scores(scores, temperature):
+    """
+    Soften sigmoid scores by dividing their logits by a temperature
+    :param scores: numpy array of scores in (0, 1) range
+    :param temperature: temperature, 1 leaves scores unchanged, larger values push scores towards 0.5
+    :return: numpy array of softened scores
+    """
+
+    clipped_scores = np.clip(scores, 1e-7, 1 - 1e-7)
+    logits = np.log(clipped_scores / (1 - clipped_scores))
+
+    return 1 / (1 + np.exp(-logits / temperature))
+
+
+class TeacherScoresCache:
+    """
+    Image crops, their ground truth labels and teacher model scores, stored in a directory as .npy files that
+    are memory mapped on load. Crops are stored as uint8 to keep cache four times smaller than float crops.
+    """
+
+    def __init__(self, directory):
+        """
+        Constructor, loads existing cache
+        :param directory: directory cache is stored in
+        """
+
+        self.directory = directory
+
+        with open(os.path.join(directory, "metadata.json")) as file:
+            self.metadata = json.load(file)
+
+        self.images = np.load(os.path.join(directory, "images.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(directory, "labels.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(directory, "teacher_scores.npy"), mmap_mode="r")
+
+    @staticmethod
+    def exists(directory):
+        """
+        Check if a complete cache exists in a directory
+        :param directory: directory to check
+        :return: bool
+        """
+
+        # Metadata is written last, so its presence means cache is complete
+        return os.path.exists(os.path.join(directory, "metadata.json"))
+
+    @staticmethod
+    def build(directory, teacher, data_generator, batches_count, batch_size, verbose=True):
+        """
+        Build cache by running teacher over crops from a data generator
+        :param directory: directory to store cache in
+        :param teacher: teacher model
+        :param data_generator: generator yielding (images, labels) batches, e.g. from face.data_generators
+        :param batches_count: number of batches to cache
+        :param batch_size: size of batches generator yields and teacher predicts on
+        :param verbose: whether to output progress
+        :return: TeacherScoresCache instance
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        images_array = labels_array = scores_array = None
+
+        for batch_index in tqdm.tqdm(range(batches_count), disable=not verbose):
+
+            images, labels = next(data_generator)
+            images = np.asarray(images)
+
+            if images_array is None:
+
+                samples_count = batches_count * len(images)
+
+                images_array = np.lib.format.open_memmap(
+                    os.path.join(directory, "images.npy"), mode="w+", dtype=np.uint8,
+                    shape=(samples_count,) + images.shape[1:])
+
+                labels_array = np.lib.format.open_memmap(
+                    os.path.join(directory, "labels.npy"), mode="w+", dtype=np.float32, shape=(samples_count,))
+
+                scores_array = np.lib.format.open_memmap(
+                    os.path.join(directory, "teacher_scores.npy"), mode="w+", dtype=np.float32, shape=(samples_count,))
+
+            start = batch_index * len(images)
+            end = start + len(images)
+
+            images_array[start:end] = np.round(images * 255).astype(np.uint8)
+            labels_array[start:end] = np.ravel(labels)
+            scores_array[start:end] = np.ravel(teacher.predict(images, batch_size=batch_size))
+
+        for array in [images_array, labels_array, scores_array]:
+            array.flush()
+
+        with open(os.path.join(directory, "metadata.json"), "w") as file:
+            json.dump({"samples_count": len(labels_array), "batches_count": batches_count}, file)
+
+        return TeacherScoresCache(directory)
+
+    def __len__(self):
+
+        return len(self.labels)
+
+    def get_targets(self, indices, teacher_weight, temperature):
+        """
+        Get student training targets - a mix of softened teacher scores and ground truth labels
+        :param indices: indices of samples
+        :param teacher_weight: weight of teacher scores in targets, ground truth labels get the remaining weight
+        :param temperature: temperature teacher scores are softened with
+        :return: numpy array of targets
+        """
+
+        teacher_scores = get_softened_scores(self.scores[indices], temperature)
+        return teacher_weight * teacher_scores + (1 - teacher_weight) * self.labels[indices]
+
+    def get_batches_generator(self, batch_size, teacher_weight=0.7, temperature=1, seed=None):
+        """
+        Get generator of student training batches. Samples are reshuffled every epoch.
+        :param batch_size: size of a single batch
+        :param teacher_weight: weight of teacher scores in targets, ground truth labels get the remaining weight
+        :param temperature: temperature teacher scores are softened with
+        :param seed: optional seed of shuffling
+        :return: generator yielding (images, targets) batches
+        """
+
+        random_generator = random.Random(seed)
+        indices = list(range(len(self)))
+
+        while True:
+
+            random_generator.shuffle(indices)
+
+            for start in range(0, len(indices) - batch_size + 1, batch_size):
+
+                # Sorted indices make memory mapped reads more sequential
+                batch_indices = np.sort(indices[start:start + batch_size])
+
+                images = self.images[batch_indices].astype(np.float32) / 255
+                targets = self.get_targets(batch_indices, teacher_weight, temperature)
+
+                yield images, targets.reshape(-1, 1)
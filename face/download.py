@@ -2,26 +2,92 @@
 Module with utilities for downloading data
 """
 
+import concurrent.futures
+import hashlib
+import http.client
+import json
+import math
+import os
+import threading
 import urllib.request
 import urllib.error
 
-import tqdm
+import face.lazy
 
 
-def get_url_asset_size(url, **kwargs):
+tqdm = face.lazy.LazyModule("tqdm")
+
+
+# Default size of buffer used when reading downloaded data
+default_buffer_size = 2**20
+
+
+class ChecksumMismatchError(Exception):
     """
-    Get size of asset under a url
+    Exception for downloaded files whose checksum doesn't match expected one
+    """
+    pass
+
+
+class DownloadStoppedError(Exception):
+    """
+    Exception for downloads stopped on request before they completed
+    """
+    pass
+
+
+def get_file_sha256(path, start=0, hash_object=None, buffer_size=default_buffer_size):
+    """
+    Compute sha256 checksum of a file
+    :param path: path to file
+    :param start: offset from which to read the file
+    :param hash_object: hash to update, new sha256 hash is used if None
+    :param buffer_size: number of bytes read at a time
+    :return: hash object
+    """
+
+    hash_object = hash_object if hash_object is not None else hashlib.sha256()
+
+    with open(path, mode="rb") as file:
+
+        file.seek(start)
+        data = file.read(buffer_size)
+
+        while len(data) != 0:
+
+            hash_object.update(data)
+            data = file.read(buffer_size)
+
+    return hash_object
+
+
+def get_url_asset_headers(url, **kwargs):
+    """
+    Get headers of asset under a url, using a HEAD request, so that asset itself isn't downloaded
     :param url: url to look for
-    :param urlopen: function used to open url, defaults to urllib.request.urlopen
-    :return: asset size in bytes
+    :param url_opener: function used to open url, defaults to urllib.request.urlopen
+    :param url_request: function used to create requests, defaults to urllib.request.Request
+    :return: headers mapping
     """
 
     url_opener = kwargs["url_opener"] if "url_opener" in kwargs else urllib.request.urlopen
+    url_request = kwargs["url_request"] if "url_request" in kwargs else urllib.request.Request
 
-    with url_opener(url) as url_connection:
+    with url_opener(url_request(url=url, method="HEAD")) as url_connection:
 
-        metadata = url_connection.info()
-        return int(metadata["Content-Length"])
+        return url_connection.info()
+
+
+def get_url_asset_size(url, **kwargs):
+    """
+    Get size of asset under a url
+    :param url: url to look for
+    :param url_opener: function used to open url, defaults to urllib.request.urlopen
+    :param url_request: function used to create requests, defaults to urllib.request.Request
+    :return: asset size in bytes
+    """
+
+    return int(get_url_asset_headers(url, **kwargs)["Content-Length"])
 
 
 class Downloader:
@@ -29,12 +95,13 @@ class Downloader:
     A simple class supports downloading large files with retries.
     """
 
-    def __init__(self, url, path, max_retries=5, **kwargs):
+    def __init__(self, url, path, max_retries=5, buffer_size=default_buffer_size, **kwargs):
         """
         Constructor
         :param url: url to download from
         :param path: path to save downloaded file to
         :param max_retries: max number of retries should download fail
+        :param buffer_size: number of bytes read from connection at a time
         """
 
         self.url = url
@@ -51,7 +118,7 @@ class Downloader:
 
         self.total_bytes_count = get_url_asset_size(self.url, **kwargs)
 
-        self.bytes_per_read = 8192
+        self.bytes_per_read = buffer_size
 
     def download(self, verbose=True):
         """
@@ -65,7 +132,7 @@ class Downloader:
         try:
 
             request = self._get_request()
-            flags = "wb" if self.downloaded_bytes_count is 0 else "ab"
+            flags = "wb" if self.downloaded_bytes_count == 0 else "ab"
 
             with self.url_opener(request) as url_connection, self.file_opener(self.path, mode=flags) as file, \
                     tqdm.tqdm(total=self.total_bytes_count, disable=not verbose) as progress_bar:
@@ -114,3 +181,491 @@ class Downloader:
                 print("Download failed despite retrying {} times, raising error".format(self.reties_count))
 
             raise error
+
+
+class RangeDownloader:
+    """
+    A helper class for DownloadManager that downloads a range of bytes of a url into corresponding range of a file,
+    with retries. File must already exist.
+    """
+
+    def __init__(self, url, path, start, end, progress_callback, max_retries, buffer_size, position=None,
+                 stop_event=None, **kwargs):
+        """
+        Constructor
+        :param url: url to download from
+        :param path: path to save downloaded data to
+        :param start: index of first byte of the range
+        :param end: index one past last byte of the range, or None if range extends to end of an asset of
+        unknown size
+        :param progress_callback: function called with file offset and data after each write. By the time it's
+        called data is flushed to the file
+        :param max_retries: max number of retries should download fail
+        :param buffer_size: number of bytes read from connection at a time
+        :param position: index of first byte that still needs downloading, defaults to start of the range
+        :param stop_event: optional threading.Event, download raises DownloadStoppedError once it's set
+        """
+
+        self.url = url
+        self.path = path
+        self.start = start
+        self.end = end
+        self.progress_callback = progress_callback
+        self.max_retries = max_retries
+        self.buffer_size = buffer_size
+
+        self.url_opener = kwargs["url_opener"] if "url_opener" in kwargs else urllib.request.urlopen
+        self.url_request = kwargs["url_request"] if "url_request" in kwargs else urllib.request.Request
+
+        self.stop_event = stop_event
+
+        self.retries_count = 0
+        self.position = position if position is not None else start
+
+    def download(self):
+        """
+        Download the range
+        """
+
+        while self.end is None or self.position < self.end:
+
+            try:
+
+                self._download_remaining_bytes()
+                return
+
+            except (TimeoutError, ConnectionError, urllib.error.URLError, http.client.HTTPException) as error:
+
+                if self.retries_count >= self.max_retries:
+
+                    raise error
+
+                self.retries_count += 1
+
+    def _raise_if_stopped(self):
+
+        if self.stop_event is not None and self.stop_event.is_set():
+
+            raise DownloadStoppedError("Download of {} was stopped".format(self.url))
+
+    def _download_remaining_bytes(self):
+
+        # Ranges that didn't start yet shouldn't open connections at all
+        self._raise_if_stopped()
+
+        headers = {}
+
+        if self.end is None:
+
+            if self.position > 0:
+                headers["Range"] = "bytes={}-".format(self.position)
+
+        else:
+
+            headers["Range"] = "bytes={}-{}".format(self.position, self.end - 1)
+
+        request = self.url_request(url=self.url, headers=headers)
+
+        with self.url_opener(request) as url_connection, open(self.path, mode="r+b") as file:
+
+            # A server that ignores Range header would send whole asset from its start
+            if self.position > 0 and getattr(url_connection, "status", 206) != 206:
+
+                raise urllib.error.URLError("Server doesn't support range requests for {}".format(self.url))
+
+            file.seek(self.position)
+
+            while self.end is None or self.position < self.end:
+
+                self._raise_if_stopped()
+
+                bytes_to_read = \
+                    self.buffer_size if self.end is None else min(self.buffer_size, self.end - self.position)
+                data = url_connection.read(bytes_to_read)
+
+                if len(data) == 0:
+
+                    break
+
+                file.write(data)
+
+                # Data must reach the file before progress is reported, as reported progress is persisted
+                file.flush()
+
+                self.progress_callback(self.position, data)
+                self.position += len(data)
+
+        if self.end is not None and self.position < self.end:
+
+            raise urllib.error.ContentTooShortError(
+                message="Connection closed before end of range {}-{}".format(self.start, self.end), content=None)
+
+
+class DownloadProgress:
+    """
+    Progress of a download, persisted in a sidecar file next to downloaded file, so that download can be resumed
+    after the process downloading it is killed and complete downloads can be recognized without downloading them again
+    """
+
+    def __init__(self, path, url, size, ranges):
+        """
+        Constructor
+        :param path: path of downloaded file
+        :param url: url file is downloaded from
+        :param size: size of the file, None if unknown
+        :param ranges: list of [start, position, end] lists describing download progress of each range of the file
+        """
+
+        self.path = path
+        self.url = url
+        self.size = size
+        self.ranges = ranges
+        self.sha256 = None
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_progress_path(path):
+        """
+        Get path of sidecar progress file for a downloaded file
+        :param path: path of downloaded file
+        :return: path
+        """
+
+        return path + ".progress"
+
+    @staticmethod
+    def load(path):
+        """
+        Load progress of download of a file
+        :param path: path of downloaded file
+        :return: DownloadProgress instance, or None if there is no readable progress file
+        """
+
+        try:
+
+            with open(DownloadProgress.get_progress_path(path)) as file:
+                state = json.load(file)
+
+        except (OSError, ValueError):
+
+            return None
+
+        progress = DownloadProgress(path, state["url"], state["size"], state["ranges"])
+        progress.sha256 = state["sha256"]
+        return progress
+
+    def save(self):
+        """
+        Save progress, atomically replacing previously saved progress
+        """
+
+        state = {"url": self.url, "size": self.size, "ranges": self.ranges, "sha256": self.sha256}
+
+        temporary_path = self.get_progress_path(self.path) + ".tmp"
+
+        with open(temporary_path, mode="w") as file:
+            json.dump(state, file)
+
+        os.replace(temporary_path, self.get_progress_path(self.path))
+
+    def set_range_position(self, index, position):
+        """
+        Record position up to which range was downloaded and save progress
+        :param index: index of the range
+        :param position: index of first byte of the range that still needs downloading
+        """
+
+        with self.lock:
+
+            self.ranges[index][1] = position
+            self.save()
+
+    def is_complete(self):
+        """
+        Check whether download was completed and its checksum recorded, and file on disk has expected size
+        :return: bool
+        """
+
+        return self.sha256 is not None and os.path.isfile(self.path) and \
+            (self.size is None or os.path.getsize(self.path) == self.size)
+
+    def is_intact(self):
+        """
+        Check whether file on disk still has checksum recorded when its download completed, so that files
+        corrupted on disk after download aren't mistaken for complete ones
+        :return: bool
+        """
+
+        return self.sha256 is not None and get_file_sha256(self.path).hexdigest() == self.sha256
+
+    def can_be_resumed(self, url, size):
+        """
+        Check whether this progress can be used to resume download of given url
+        :param url: url to download
+        :param size: size of asset under url
+        :return: bool
+        """
+
+        return self.url == url and self.size is not None and self.size == size and \
+            os.path.isfile(self.path) and os.path.getsize(self.path) == size
+
+    def remove(self):
+        """
+        Remove progress file
+        """
+
+        if os.path.exists(self.get_progress_path(self.path)):
+            os.remove(self.get_progress_path(self.path))
+
+
+class StreamingHasher:
+    """
+    Computes checksum of a file while its ranges are being downloaded. Data written at the end of already hashed
+    prefix of the file is hashed immediately, rest of the file is read back from disk when download completes.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+        :param path: path of downloaded file
+        """
+
+        self.path = path
+        self.hash = hashlib.sha256()
+        self.position = 0
+
+        self.lock = threading.Lock()
+
+    def update(self, offset, data):
+        """
+        Hash data, if it directly follows already hashed part of the file
+        :param offset: offset in file at which data was written
+        :param data: data
+        """
+
+        with self.lock:
+
+            if offset == self.position:
+
+                self.hash.update(data)
+                self.position += len(data)
+
+    def get_hexdigest(self):
+        """
+        Get checksum of complete file
+        :return: hex string
+        """
+
+        with self.lock:
+
+            get_file_sha256(self.path, start=self.position, hash_object=self.hash)
+            self.position = os.path.getsize(self.path)
+
+            return self.hash.hexdigest()
+
+
+class DownloadManager:
+    """
+    Class for downloading many files at once. Large files are split into byte ranges downloaded over concurrent
+    connections, sizes are obtained with HEAD requests and progress of all downloads is shown on a single
+    progress bar. Progress of each download is saved in a sidecar file, so interrupted downloads are resumed
+    and complete ones are skipped.
+    """
+
+    def __init__(self, max_connections=8, connections_per_file=4, min_range_size=16 * 2**20,
+                 buffer_size=default_buffer_size, max_retries=5, **kwargs):
+        """
+        Constructor
+        :param max_connections: max number of connections open at any time
+        :param connections_per_file: max number of byte ranges a single file is split into
+        :param min_range_size: files are split only into ranges at least this large
+        :param buffer_size: number of bytes read from connection at a time
+        :param max_retries: max number of retries of each range should download fail
+        """
+
+        self.max_connections = max_connections
+        self.connections_per_file = connections_per_file
+        self.min_range_size = min_range_size
+        self.buffer_size = buffer_size
+        self.max_retries = max_retries
+
+        self.kwargs = kwargs
+
+    def download(self, urls, paths, checksums=None, verbose=True, file_callback=None, sizes_callback=None,
+                 stop_event=None):
+        """
+        Download urls to paths. Files whose previous download completed and, if checksums are provided,
+        matched expected checksums are skipped, provided their data on disk still has checksum recorded when their
+        download completed. Checksums of downloaded files are recorded in their progress files.
+        :param urls: list of urls
+        :param paths: list of paths, one for each url
+        :param checksums: optional list of expected sha256 hex digests, one for each url, with None entries
+        for files that shouldn't be verified
+        :param verbose: whether to output progress
+        :param file_callback: optional function called with index of each file as soon as that file is downloaded
+        and verified, or found to be complete already. Lets callers start using files before all downloads complete.
+        :param sizes_callback: optional function called with list of sizes of all files, in bytes, with None for
+        sizes server didn't report, once they're known and before file_callback is called for any file
+        :param stop_event: optional threading.Event. Once it's set, downloads in progress stop after their current
+        read and DownloadStoppedError is raised. Progress is saved, so stopped downloads can be resumed later.
+        :return: list of sha256 hex digests of downloaded files
+        """
+
+        checksums = checksums if checksums is not None else [None] * len(urls)
+        digests = [None] * len(urls)
+
+        complete_indices = []
+        pending_indices = []
+
+        for index, (url, path, checksum) in enumerate(zip(urls, paths, checksums)):
+
+            progress = DownloadProgress.load(path)
+
+            if progress is not None and progress.url == url and progress.is_complete() and \
+                    checksum in [None, progress.sha256] and progress.is_intact():
+
+                digests[index] = progress.sha256
+                complete_indices.append(index)
+
+            else:
+
+                pending_indices.append(index)
+
+        with concurrent.futures.ThreadPoolExecutor(self.max_connections) as executor:
+
+            headers = list(executor.map(
+                lambda index: get_url_asset_headers(urls[index], **self.kwargs), pending_indices))
+
+            sizes = [int(header["Content-Length"]) if header.get("Content-Length") is not None else None
+                     for header in headers]
+
+            if sizes_callback is not None:
+
+                all_sizes = [os.path.getsize(paths[index]) if index in complete_indices else None
+                             for index in range(len(urls))]
+
+                for index, size in zip(pending_indices, sizes):
+                    all_sizes[index] = size
+
+                sizes_callback(all_sizes)
+
+            if file_callback is not None:
+
+                for index in complete_indices:
+                    file_callback(index)
+
+            files_progress = [
+                self._get_download_progress(urls[index], paths[index], size, header)
+                for index, size, header in zip(pending_indices, sizes, headers)]
+
+            total_size = sum(sizes) if None not in sizes else None
+            progress_lock = threading.Lock()
+
+            with tqdm.tqdm(total=total_size, unit="B", unit_scale=True, disable=not verbose) as progress_bar:
+
+                def update_progress_bar(bytes_count):
+
+                    with progress_lock:
+                        progress_bar.update(bytes_count)
+
+                files_futures = []
+
+                # Ranges are submitted file by file, so files complete roughly in order they were requested
+                for progress in files_progress:
+
+                    update_progress_bar(sum(position - start for start, position, _ in progress.ranges))
+
+                    hasher = StreamingHasher(progress.path)
+
+                    range_downloaders = [
+                        self._get_range_downloader(progress, range_index, hasher, update_progress_bar, stop_event)
+                        for range_index in range(len(progress.ranges))]
+
+                    futures = [executor.submit(range_downloader.download) for range_downloader in range_downloaders]
+                    files_futures.append((hasher, futures))
+
+                for index, progress, (hasher, futures) in zip(pending_indices, files_progress, files_futures):
+
+                    for future in futures:
+
+                        future.result()
+
+                    digests[index] = self._verify(progress, hasher, checksums[index])
+
+                    if file_callback is not None:
+                        file_callback(index)
+
+        return digests
+
+    def _get_download_progress(self, url, path, size, header):
+
+        progress = DownloadProgress.load(path)
+
+        # Resuming requires server to serve ranges of the asset
+        if progress is not None and progress.can_be_resumed(url, size) and progress.sha256 is None and \
+                header.get("Accept-Ranges") == "bytes":
+
+            return progress
+
+        directory = os.path.dirname(path)
+
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        # Create file of full size upfront, so that ranges can be written in any order
+        with open(path, mode="wb") as file:
+
+            if size is not None:
+                file.truncate(size)
+
+        if size is None or header.get("Accept-Ranges") != "bytes":
+
+            ranges = [[0, 0, size]]
+
+        else:
+
+            ranges_count = max(1, min(self.connections_per_file, math.ceil(size / self.min_range_size)))
+            boundaries = [round(index * size / ranges_count) for index in range(ranges_count + 1)]
+
+            ranges = [[start, start, end] for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+        progress = DownloadProgress(path, url, size, ranges)
+        progress.save()
+
+        return progress
+
+    def _get_range_downloader(self, progress, range_index, hasher, update_progress_bar, stop_event):
+
+        start, position, end = progress.ranges[range_index]
+
+        def progress_callback(offset, data):
+
+            hasher.update(offset, data)
+
+            # Downloads of unknown size can't be resumed, so there is no point persisting their progress
+            if progress.size is not None:
+                progress.set_range_position(range_index, offset + len(data))
+
+            update_progress_bar(len(data))
+
+        return RangeDownloader(
+            progress.url, progress.path, start, end, progress_callback, self.max_retries, self.buffer_size,
+            position=position, stop_event=stop_event, **self.kwargs)
+
+    def _verify(self, progress, hasher, checksum):
+
+        digest = hasher.get_hexdigest()
+
+        if checksum is not None and checksum != digest:
+
+            os.remove(progress.path)
+            progress.remove()
+
+            raise ChecksumMismatchError("Checksum of {} is {}, but {} was expected".format(
+                progress.path, digest, checksum))
+
+        progress.sha256 = digest
+        progress.save()
+
+        return digest
@@ -0,0 +1,421 @@
+"""
+Module with utilities for evaluating face detection over large image sets - running evaluation in parallel,
+journaling per image results, so that interrupted evaluations can be resumed, and computing detection metrics
+over stored detections with vectorized matching
+"""
+
+import json
+import multiprocessing
+import os
+import time
+
+import face.lazy
+import face.geometry
+
+
+np = face.lazy.LazyModule("numpy")
+tqdm = face.lazy.LazyModule("tqdm")
+
+
+class EvaluationJournal:
+    """
+    Append only file with per image evaluation results. Each record is a dictionary stored as a single line of JSON.
+    Records are flushed as soon as they are appended, so a killed evaluation loses at most the record
+    that was being written, and such partially written record is ignored when journal is read.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+        :param path: path to journal file
+        """
+
+        self.path = path
+        self.file = None
+
+    def get_records(self):
+        """
+        Read all complete records from journal
+        :return: list of dictionaries
+        """
+
+        if not os.path.exists(self.path):
+
+            return []
+
+        records = []
+
+        with open(self.path) as file:
+
+            for line in file:
+
+                # Only last line can be incomplete, if evaluation was killed while writing it
+                if line.endswith("\n"):
+
+                    records.append(json.loads(line))
+
+        return records
+
+    def append(self, record):
+        """
+        Append a record to journal
+        :param record: dictionary
+        """
+
+        if self.file is None:
+
+            self._open_for_appending()
+
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        """
+        Close journal file
+        """
+
+        if self.file is not None:
+
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def _open_for_appending(self):
+
+        directory = os.path.dirname(self.path)
+
+        if directory != "":
+
+            os.makedirs(directory, exist_ok=True)
+
+        # Drop a partially written last record, so that new records start on a new line
+        if os.path.exists(self.path):
+
+            with open(self.path, mode="r+b") as file:
+
+                content = file.read()
+                file.truncate(content.rfind(b"\n") + 1)
+
+        self.file = open(self.path, mode="a")
+
+
+class ParallelEvaluationRunner:
+    """
+    Runs an evaluation function over a list of items using a pool of worker processes, journaling every result.
+    Items whose results are already in journal are not evaluated again.
+    """
+
+    def __init__(self, evaluation_function, workers_count, initializer=None, initializer_arguments=()):
+        """
+        Constructor
+        :param evaluation_function: function that takes a single item and returns a record dictionary.
+        Records must contain "path" key identifying the item. Function must be picklable, i.e. defined at
+        module level.
+        :param workers_count: number of worker processes. If 1, evaluation is run in current process.
+        :param initializer: optional function called once in each worker before any evaluations, e.g. to load a model
+        :param initializer_arguments: arguments for initializer
+        """
+
+        self.evaluation_function = evaluation_function
+        self.workers_count = workers_count
+        self.initializer = initializer
+        self.initializer_arguments = initializer_arguments
+
+    def run(self, items, item_key, journal, verbose=True):
+        """
+        Evaluate all items not yet in journal
+        :param items: list of items to evaluate
+        :param item_key: function mapping an item to value of "path" key of its record
+        :param journal: EvaluationJournal instance
+        :param verbose: whether to output progress and summary
+        :return: tuple (records, throughput), where records contains records of all items, including ones read from
+        journal, and throughput is number of items evaluated per second in this run
+        """
+
+        records = journal.get_records()
+        evaluated_keys = set(record["path"] for record in records)
+
+        remaining_items = [item for item in items if item_key(item) not in evaluated_keys]
+
+        if verbose and len(records) > 0:
+
+            print("Resuming evaluation, {} items already evaluated".format(len(records)))
+
+        start = time.perf_counter()
+
+        with tqdm.tqdm(total=len(remaining_items), disable=not verbose) as progress_bar:
+
+            for record in self._get_records_generator(remaining_items):
+
+                journal.append(record)
+                records.append(record)
+
+                progress_bar.update(1)
+
+        duration = time.perf_counter() - start
+        throughput = len(remaining_items) / duration if duration > 0 else 0
+
+        return records, throughput
+
+    def _get_records_generator(self, items):
+
+        if self.workers_count == 1:
+
+            if self.initializer is not None:
+
+                self.initializer(*self.initializer_arguments)
+
+            for item in items:
+
+                yield self.evaluation_function(item)
+
+        else:
+
+            # Spawn rather than fork, as keras backends don't survive forking
+            context = multiprocessing.get_context("spawn")
+
+            with context.Pool(self.workers_count, self.initializer, self.initializer_arguments) as pool:
+
+                for record in pool.imap_unordered(self.evaluation_function, items, chunksize=4):
+
+                    yield record
+
+
+# Default IOU thresholds detections are evaluated at
+default_iou_thresholds = (0.5, 0.75)
+
+# Default bins of faces sizes, defined as square root of face bounding box area, metrics are broken down into
+default_size_bins = (0, 64, 128, 256, float("inf"))
+
+
+class DetectionsData:
+    """
+    Detections and ground truth bounding boxes of a set of images in array form
+    """
+
+    def __init__(self, detections_bounds, detections_scores, detections_images_ids,
+                 ground_truth_bounds, ground_truth_images_ids):
+        """
+        Constructor
+        :param detections_bounds: bounds array of shape (n, 4)
+        :param detections_scores: array of shape (n,) of detections scores
+        :param detections_images_ids: integer array of shape (n,) of ids of images detections were found in
+        :param ground_truth_bounds: bounds array of shape (m, 4)
+        :param ground_truth_images_ids: integer array of shape (m,) of ids of images ground truth boxes belong to
+        """
+
+        self.detections_bounds = np.asarray(detections_bounds, dtype=np.float64).reshape(-1, 4)
+        self.detections_scores = np.asarray(detections_scores, dtype=np.float64)
+        self.detections_images_ids = np.asarray(detections_images_ids, dtype=np.int64)
+
+        self.ground_truth_bounds = np.asarray(ground_truth_bounds, dtype=np.float64).reshape(-1, 4)
+        self.ground_truth_images_ids = np.asarray(ground_truth_images_ids, dtype=np.int64)
+
+    @staticmethod
+    def from_records(records):
+        """
+        Create DetectionsData from evaluation journal records. Records marked as skipped are ignored.
+        :param records: list of records with "detections" and "ground_truth" keys
+        :return: DetectionsData instance
+        """
+
+        records = [record for record in records if not record.get("skipped", False)]
+
+        detections = [np.zeros(shape=(0, 5))] + \
+            [np.array(record["detections"], dtype=np.float64).reshape(-1, 5) for record in records]
+
+        detections_images_ids = [np.zeros(shape=0)] + \
+            [np.full(len(image_detections), index) for index, image_detections in enumerate(detections[1:])]
+
+        detections = np.concatenate(detections)
+
+        return DetectionsData(
+            detections_bounds=detections[:, :4], detections_scores=detections[:, 4],
+            detections_images_ids=np.concatenate(detections_images_ids),
+            ground_truth_bounds=[record["ground_truth"] for record in records],
+            ground_truth_images_ids=np.arange(len(records)))
+
+
+def _get_ranks_within_groups(sorted_groups_ids):
+
+    # Given sorted groups ids, return position of each element within its group
+    indices = np.arange(len(sorted_groups_ids))
+    groups_starts = np.searchsorted(sorted_groups_ids, sorted_groups_ids, side="left")
+
+    return indices - groups_starts
+
+
+def get_matches(detections_data, iou_threshold):
+    """
+    Greedily match detections to ground truth boxes. Within each image detections are processed in order of
+    decreasing score and each is matched to unmatched ground truth box it has highest IOU with, provided
+    that IOU is at least iou_threshold. Matching is vectorized across images, with one pass per detection rank,
+    so its cost depends on number of detections per image rather than number of images.
+    :param detections_data: DetectionsData instance
+    :param iou_threshold: minimum IOU for a match
+    :return: integer array of shape (n,) with index of ground truth box each detection is matched to, or -1
+    """
+
+    data = detections_data
+
+    # Map images ids to a dense range
+    images_ids, dense_ids = np.unique(
+        np.concatenate([data.ground_truth_images_ids, data.detections_images_ids]), return_inverse=True)
+
+    ground_truth_dense_ids = dense_ids[:len(data.ground_truth_images_ids)]
+    detections_dense_ids = dense_ids[len(data.ground_truth_images_ids):]
+
+    matches = np.full(len(data.detections_scores), -1, dtype=np.int64)
+
+    if len(data.ground_truth_bounds) == 0 or len(data.detections_scores) == 0:
+
+        return matches
+
+    # Table of ground truth boxes indices, one row per image, padded with -1
+    ground_truth_order = np.argsort(ground_truth_dense_ids, kind="stable")
+    ground_truth_slots = _get_ranks_within_groups(ground_truth_dense_ids[ground_truth_order])
+
+    ground_truth_table = np.full((len(images_ids), np.max(ground_truth_slots) + 1), -1, dtype=np.int64)
+    ground_truth_table[ground_truth_dense_ids[ground_truth_order], ground_truth_slots] = ground_truth_order
+
+    is_ground_truth_taken = ground_truth_table == -1
+
+    # Order detections by image and decreasing score
+    detections_order = np.lexsort((-data.detections_scores, detections_dense_ids))
+    detections_ranks = _get_ranks_within_groups(detections_dense_ids[detections_order])
+
+    padded_ground_truth_bounds = np.concatenate([data.ground_truth_bounds, np.zeros(shape=(1, 4))])
+
+    for rank in range(np.max(detections_ranks) + 1):
+
+        detections_indices = detections_order[detections_ranks == rank]
+        images = detections_dense_ids[detections_indices]
+
+        candidates = ground_truth_table[images]
+
+        ious = face.geometry.get_intersections_over_unions(
+            data.detections_bounds[detections_indices][:, np.newaxis, :], padded_ground_truth_bounds[candidates])
+
+        ious[is_ground_truth_taken[images]] = -1
+
+        best_slots = np.argmax(ious, axis=1)
+        best_ious = ious[np.arange(len(images)), best_slots]
+
+        is_matched = best_ious >= iou_threshold
+
+        matches[detections_indices[is_matched]] = candidates[is_matched, best_slots[is_matched]]
+        is_ground_truth_taken[images[is_matched], best_slots[is_matched]] = True
+
+    return matches
+
+
+def get_precision_recall_curve(scores, is_true_positive, ground_truth_count):
+    """
+    Compute precision recall curve
+    :param scores: array of detections scores
+    :param is_true_positive: boolean array marking true positive detections
+    :param ground_truth_count: number of ground truth boxes
+    :return: tuple (precisions, recalls, thresholds) of arrays, with i-th elements describing detections with
+    score not lower than i-th threshold
+    """
+
+    order = np.argsort(-np.asarray(scores), kind="stable")
+
+    true_positives = np.cumsum(np.asarray(is_true_positive, dtype=np.int64)[order])
+    false_positives = np.arange(1, len(order) + 1) - true_positives
+
+    precisions = true_positives / np.maximum(true_positives + false_positives, 1)
+    recalls = true_positives / max(ground_truth_count, 1)
+
+    return precisions, recalls, np.asarray(scores)[order]
+
+
+def get_average_precision(precisions, recalls):
+    """
+    Compute average precision as area under interpolated precision recall curve
+    :param precisions: precisions array, as returned by get_precision_recall_curve
+    :param recalls: recalls array, as returned by get_precision_recall_curve
+    :return: float
+    """
+
+    if len(precisions) == 0:
+
+        return 0.0
+
+    # Interpolated precision at each recall is maximum precision at that or higher recall
+    interpolated_precisions = np.maximum.accumulate(precisions[::-1])[::-1]
+    recalls_increases = np.diff(np.concatenate([[0], recalls]))
+
+    return float(np.sum(interpolated_precisions * recalls_increases))
+
+
+def get_detections_metrics(detections_data, iou_thresholds=default_iou_thresholds, size_bins=default_size_bins):
+    """
+    Compute average precision and recall at several IOU thresholds, overall and broken down by face size.
+    For face size bins, detections matched to faces outside of the bin, and unmatched detections
+    of size outside of the bin, are ignored.
+    :param detections_data: DetectionsData instance
+    :param iou_thresholds: IOU thresholds detections are evaluated at
+    :param size_bins: edges of face size bins, size being square root of bounding box area
+    :return: list of dictionaries with keys "size_range", "faces_count" and, for each IOU threshold t,
+    "ap@t" and "recall@t". First element describes all faces, remaining ones faces size bins.
+    """
+
+    data = detections_data
+
+    ground_truth_sizes = np.sqrt(face.geometry.get_areas(data.ground_truth_bounds))
+    detections_sizes = np.sqrt(face.geometry.get_areas(data.detections_bounds))
+
+    size_ranges = [(0, np.inf)] + list(zip(size_bins[:-1], size_bins[1:]))
+    metrics = [{"size_range": size_range} for size_range in size_ranges]
+
+    for iou_threshold in iou_thresholds:
+
+        matches = get_matches(data, iou_threshold)
+        is_matched = matches >= 0
+
+        matched_sizes = np.where(is_matched, ground_truth_sizes[np.maximum(matches, 0)], detections_sizes)
+
+        for size_range, size_metrics in zip(size_ranges, metrics):
+
+            is_ground_truth_in_range = (ground_truth_sizes >= size_range[0]) & (ground_truth_sizes < size_range[1])
+            is_detection_in_range = (matched_sizes >= size_range[0]) & (matched_sizes < size_range[1])
+
+            ground_truth_count = int(np.sum(is_ground_truth_in_range))
+
+            precisions, recalls, _ = get_precision_recall_curve(
+                data.detections_scores[is_detection_in_range], is_matched[is_detection_in_range], ground_truth_count)
+
+            size_metrics["faces_count"] = ground_truth_count
+            size_metrics["ap@{}".format(iou_threshold)] = get_average_precision(precisions, recalls)
+            size_metrics["recall@{}".format(iou_threshold)] = float(recalls[-1]) if len(recalls) > 0 else 0.0
+
+    return metrics
+
+
+def get_detections_metrics_report(metrics):
+    """
+    Format detections metrics as a table
+    :param metrics: metrics, as returned by get_detections_metrics
+    :return: string
+    """
+
+    columns = [key for key in metrics[0].keys() if key.startswith("ap@") or key.startswith("recall@")]
+
+    lines = ["{:>16}{:>10}".format("face size", "faces") + "".join("{:>12}".format(column) for column in columns)]
+
+    for size_metrics in metrics:
+
+        size_range = "{:.0f}-{:.0f}".format(*size_metrics["size_range"])
+
+        lines.append("{:>16}{:>10}".format(size_range, size_metrics["faces_count"]) +
+                     "".join("{:>12.4f}".format(size_metrics[column]) for column in columns))
+
+    return "\n".join(lines)
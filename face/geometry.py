@@ -1,10 +1,18 @@
 """
-Module with geometry related functions, mostly relating to bounding boxes processing
+Module with geometry related functions, mostly relating to bounding boxes processing.
+
+Besides shapely based bounding boxes, module provides a set of functions working on bounds arrays - plain numpy
+arrays of shape (..., 4), where last dimension holds (x_min, y_min, x_max, y_max) coordinates, same as
+shapely.geometry.Polygon.bounds. Bounds arrays can represent a single box or many boxes at once, and all bounds
+arrays functions are vectorized over leading dimensions, so they should be preferred in any performance critical code.
 """
 
-import shapely.geometry
-import shapely.affinity
-import cv2
+import face.lazy
+
+
+shapely = face.lazy.LazyModule("shapely", ["shapely.geometry"])
+np = face.lazy.LazyModule("numpy")
+cv2 = face.lazy.LazyModule("cv2")
 
 
 def get_bounding_box(left, top, width, height):
@@ -57,10 +65,7 @@ def get_intersection_over_union(first_polygon, second_polygon):
     :return: float
     """
 
-    intersection_polygon = first_polygon.intersection(second_polygon)
-    union_polygon = first_polygon.union(second_polygon)
-
-    return intersection_polygon.area / union_polygon.area
+    return float(get_intersections_over_unions(get_bounds_array(first_polygon), get_bounds_array(second_polygon)))
 
 
 def get_scale(bounding_box, target_size):
@@ -88,7 +93,7 @@ def get_scaled_bounding_box(bounding_box, scale):
     :return: rescaled bounding box
     """
 
-    return shapely.affinity.affine_transform(bounding_box, [scale, 0, 0, scale, 0, 0])
+    return shapely.geometry.box(*get_scaled_bounds(get_bounds_array(bounding_box), scale))
 
 
 def flip_bounding_box_about_vertical_axis(bounding_box, image_shape):
@@ -99,8 +104,7 @@ def flip_bounding_box_about_vertical_axis(bounding_box, image_shape):
     :return: flipped bounding box
     """
 
-    bounds = bounding_box.bounds
-    return shapely.geometry.box(image_shape[1] - bounds[0], bounds[1], image_shape[1] - bounds[2], bounds[3])
+    return shapely.geometry.box(*get_flipped_bounds(get_bounds_array(bounding_box), image_shape))
 
 
 def draw_bounding_box(image, bounding_box, color, thickness):
@@ -114,3 +118,144 @@ def draw_bounding_box(image, bounding_box, color, thickness):
 
     bounds = [round(value) for value in bounding_box.bounds]
     cv2.rectangle(image, (bounds[0], bounds[1]), (bounds[2], bounds[3]), color=color, thickness=thickness)
+
+
+def get_bounds_array(bounding_boxes):
+    """
+    Given a bounding box or a list of bounding boxes, return their bounds array
+    :param bounding_boxes: shapely.geometry.Polygon instance or a list of such instances
+    :return: numpy array of shape (4,) for a single bounding box, or (n, 4) for a list of bounding boxes
+    """
+
+    if isinstance(bounding_boxes, shapely.geometry.Polygon):
+
+        return np.array(bounding_boxes.bounds, dtype=np.float64)
+
+    return np.array([bounding_box.bounds for bounding_box in bounding_boxes], dtype=np.float64).reshape(-1, 4)
+
+
+def get_bounding_boxes(bounds):
+    """
+    Given a bounds array, return corresponding bounding boxes
+    :param bounds: bounds array of shape (4,) or (n, 4)
+    :return: shapely.geometry.Polygon instance for a single box, or a list of such instances for many boxes
+    """
+
+    bounds = np.asarray(bounds)
+
+    if bounds.ndim == 1:
+
+        return shapely.geometry.box(*bounds)
+
+    return [shapely.geometry.box(*single_bounds) for single_bounds in bounds]
+
+
+def get_areas(bounds):
+    """
+    Compute areas of boxes in bounds array. Boxes with flipped coordinates have zero area.
+    :param bounds: bounds array of shape (..., 4)
+    :return: numpy array of shape (...)
+    """
+
+    bounds = np.asarray(bounds, dtype=np.float64)
+
+    widths = np.abs(bounds[..., 2] - bounds[..., 0])
+    heights = np.abs(bounds[..., 3] - bounds[..., 1])
+
+    return widths * heights
+
+
+def get_normalized_bounds(bounds):
+    """
+    Make sure boxes in bounds array have their minimum coordinates before maximum coordinates
+    :param bounds: bounds array of shape (..., 4)
+    :return: bounds array of shape (..., 4)
+    """
+
+    bounds = np.asarray(bounds, dtype=np.float64)
+
+    return np.stack([
+        np.minimum(bounds[..., 0], bounds[..., 2]),
+        np.minimum(bounds[..., 1], bounds[..., 3]),
+        np.maximum(bounds[..., 0], bounds[..., 2]),
+        np.maximum(bounds[..., 1], bounds[..., 3])], axis=-1)
+
+
+def get_intersections_over_unions(first_bounds, second_bounds):
+    """
+    Compute intersections over unions of boxes in two bounds arrays. Arrays are broadcasted against each other,
+    so this function can be used to compute one-to-one, one-to-many and elementwise IOUs.
+    Boxes with empty union have IOU of 0.
+    :param first_bounds: bounds array of shape (..., 4)
+    :param second_bounds: bounds array of shape (..., 4)
+    :return: numpy array of broadcasted leading shape of both inputs
+    """
+
+    first_bounds = get_normalized_bounds(first_bounds)
+    second_bounds = get_normalized_bounds(second_bounds)
+
+    intersection_widths = np.minimum(first_bounds[..., 2], second_bounds[..., 2]) - \
+        np.maximum(first_bounds[..., 0], second_bounds[..., 0])
+
+    intersection_heights = np.minimum(first_bounds[..., 3], second_bounds[..., 3]) - \
+        np.maximum(first_bounds[..., 1], second_bounds[..., 1])
+
+    intersections = np.maximum(intersection_widths, 0) * np.maximum(intersection_heights, 0)
+    unions = get_areas(first_bounds) + get_areas(second_bounds) - intersections
+
+    # Avoid dividing by zero for degenerate boxes, their IOU is defined to be 0
+    safe_unions = np.where(unions > 0, unions, 1)
+    return np.where(unions > 0, intersections / safe_unions, 0)
+
+
+def get_pairwise_intersections_over_unions(first_bounds, second_bounds):
+    """
+    Compute intersections over unions between all pairs of boxes from two bounds arrays
+    :param first_bounds: bounds array of shape (n, 4)
+    :param second_bounds: bounds array of shape (m, 4)
+    :return: numpy array of shape (n, m), with element (i, j) being IOU of i-th first box and j-th second box
+    """
+
+    first_bounds = np.asarray(first_bounds, dtype=np.float64).reshape(-1, 4)
+    second_bounds = np.asarray(second_bounds, dtype=np.float64).reshape(-1, 4)
+
+    return get_intersections_over_unions(first_bounds[:, np.newaxis, :], second_bounds[np.newaxis, :, :])
+
+
+def get_scaled_bounds(bounds, scale):
+    """
+    Scale boxes in bounds array w.r.t. axis origin
+    :param bounds: bounds array of shape (..., 4)
+    :param scale: scale
+    :return: bounds array of shape (..., 4)
+    """
+
+    return np.asarray(bounds, dtype=np.float64) * scale
+
+
+def get_flipped_bounds(bounds, image_shape):
+    """
+    Flip boxes in bounds array about vertical axis of an image
+    :param bounds: bounds array of shape (..., 4)
+    :param image_shape: image shape
+    :return: bounds array of shape (..., 4)
+    """
+
+    bounds = np.asarray(bounds, dtype=np.float64)
+    width = image_shape[1]
+
+    return np.stack([width - bounds[..., 2], bounds[..., 1], width - bounds[..., 0], bounds[..., 3]], axis=-1)
+
+
+def get_clipped_bounds(bounds, image_shape):
+    """
+    Clip boxes in bounds array to lie within an image
+    :param bounds: bounds array of shape (..., 4)
+    :param image_shape: image shape
+    :return: bounds array of shape (..., 4)
+    """
+
+    bounds = np.asarray(bounds, dtype=np.float64)
+    upper_limits = np.array([image_shape[1], image_shape[0], image_shape[1], image_shape[0]], dtype=np.float64)
+
+    return np.clip(bounds, 0, upper_limits)
@@ -0,0 +1,224 @@
+"""
+Module with instrumentation utilities used to measure where time is spent in data pipelines
+"""
+
+import collections
+import threading
+import time
+
+
+class StageTimer:
+    """
+    A simple context manager that adds time spent within it to a stage of PipelineStatistics instance
+    """
+
+    def __init__(self, statistics, stage):
+        """
+        Constructor
+        :param statistics: PipelineStatistics instance
+        :param stage: name of the stage
+        """
+
+        self.statistics = statistics
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.statistics.add_stage_duration(self.stage, time.perf_counter() - self.start)
+
+
+class PipelineStatistics:
+    """
+    Class accumulating statistics of a training input pipeline - time spent in each stage, number of images and
+    batches produced, number of images skipped and number of attempts crop samplers needed to find good crops.
+    Statistics can be recorded from a data generator thread while they are collected from another thread.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+
+        self.stages_durations = collections.defaultdict(float)
+        self.stages_calls_counts = collections.defaultdict(int)
+
+        self.skipped_images_counts = collections.defaultdict(int)
+
+        self.crop_attempts_counts = collections.defaultdict(int)
+        self.crop_samplings_counts = collections.defaultdict(int)
+
+        self.images_count = 0
+        self.batches_count = 0
+
+    def timer(self, stage):
+        """
+        Get a context manager that measures time spent in a stage
+        :param stage: name of the stage
+        :return: context manager
+        """
+
+        return StageTimer(self, stage)
+
+    def add_stage_duration(self, stage, duration):
+        """
+        Record time spent in a stage
+        :param stage: name of the stage
+        :param duration: duration in seconds
+        """
+
+        with self.lock:
+
+            self.stages_durations[stage] += duration
+            self.stages_calls_counts[stage] += 1
+
+    def add_image(self):
+        """
+        Record an image was read by the pipeline
+        """
+
+        with self.lock:
+            self.images_count += 1
+
+    def add_batch(self):
+        """
+        Record a batch was produced by the pipeline
+        """
+
+        with self.lock:
+            self.batches_count += 1
+
+    def add_skipped_image(self, reason):
+        """
+        Record an image was skipped
+        :param reason: reason image was skipped for, e.g. exception name
+        """
+
+        with self.lock:
+            self.skipped_images_counts[reason] += 1
+
+    def add_crop_attempts(self, sampler, attempts_count):
+        """
+        Record number of attempts a crop sampler needed to find a crop, or gave up after
+        :param sampler: name of the crop sampler
+        :param attempts_count: number of attempts made
+        """
+
+        with self.lock:
+
+            self.crop_attempts_counts[sampler] += attempts_count
+            self.crop_samplings_counts[sampler] += 1
+
+    def reset(self):
+        """
+        Clear all accumulated statistics
+        """
+
+        with self.lock:
+            self._clear()
+
+    def collect(self):
+        """
+        Get accumulated statistics and clear them, as a single step, so that statistics recorded concurrently
+        end up either in returned statistics or in ones accumulated afterwards, and are never lost
+        :return: PipelineStatistics instance with statistics accumulated so far
+        """
+
+        statistics = PipelineStatistics()
+
+        with self.lock:
+
+            for name in [
+                    "stages_durations", "stages_calls_counts", "skipped_images_counts", "crop_attempts_counts",
+                    "crop_samplings_counts", "images_count", "batches_count"]:
+
+                setattr(statistics, name, getattr(self, name))
+
+            self._clear()
+
+        return statistics
+
+    def get_report(self):
+        """
+        Get a human readable report of accumulated statistics
+        :return: string
+        """
+
+        lines = ["Input pipeline: {} batches, {} images".format(self.batches_count, self.images_count)]
+
+        for stage, duration in sorted(self.stages_durations.items(), key=lambda item: -item[1]):
+
+            lines.append("  {}: {:.3f}s total, {:.2f}ms per call".format(
+                stage, duration, 1000 * duration / self.stages_calls_counts[stage]))
+
+        for reason, count in sorted(self.skipped_images_counts.items()):
+
+            lines.append("  skipped images due to {}: {}".format(reason, count))
+
+        for sampler, count in sorted(self.crop_samplings_counts.items()):
+
+            lines.append("  {} crop sampler: {:.2f} attempts per crop".format(
+                sampler, self.crop_attempts_counts[sampler] / count))
+
+        return "\n".join(lines)
+
+
+class NullStageTimer:
+    """
+    Context manager that does nothing
+    """
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        pass
+
+
+class NullPipelineStatistics:
+    """
+    PipelineStatistics counterpart that records nothing. Used as default statistics object, so that instrumented code
+    costs only a few no-op method calls per image when instrumentation is disabled.
+    """
+
+    null_timer = NullStageTimer()
+
+    def timer(self, stage):
+
+        return self.null_timer
+
+    def add_stage_duration(self, stage, duration):
+
+        pass
+
+    def add_image(self):
+
+        pass
+
+    def add_batch(self):
+
+        pass
+
+    def add_skipped_image(self, reason):
+
+        pass
+
+    def add_crop_attempts(self, sampler, attempts_count):
+
+        pass
+
+
+# Default statistics object, records nothing
+null_pipeline_statistics = NullPipelineStatistics()
@@ -0,0 +1,80 @@
+"""
+Module for importing heavy dependencies lazily, so that importing face modules is fast and dependencies
+are only loaded by code that actually uses them
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Placeholder for a module that imports it on first attribute access. Once module is imported, globals of module
+    placeholder was created in that refer to placeholder are rebound to real module, so that later accesses,
+    e.g. np.* calls in hot loops, are plain module attribute lookups. Accesses through placeholder itself are
+    forwarded to real module, so patches of real module's attributes are always seen.
+    Usage mirrors plain imports - cv2 = LazyModule("cv2") in place of import cv2,
+    shapely = LazyModule("shapely", ["shapely.geometry"]) in place of import shapely.geometry.
+    """
+
+    def __init__(self, name, submodules=()):
+        """
+        Constructor
+        :param name: name of top level module
+        :param submodules: names of submodules that should be imported along with module
+        """
+
+        super().__init__(name)
+
+        self._lazy_submodules = list(submodules)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+        # Globals of module placeholder is created in
+        self._lazy_globals = sys._getframe(1).f_globals
+
+    def _load(self):
+
+        with self._lazy_lock:
+
+            if self._lazy_module is None:
+
+                module = importlib.import_module(self.__name__)
+
+                for submodule in self._lazy_submodules:
+                    importlib.import_module(submodule)
+
+                self._lazy_module = module
+
+        return self._lazy_module
+
+    def _rebind(self, module):
+
+        # Placeholder might be bound again after it was loaded, e.g. when a patch of it is undone, so names are
+        # looked up on every forwarded access. Once no globals refer to placeholder, it's no longer accessed anyway.
+        for name, value in list(self._lazy_globals.items()):
+
+            if value is self:
+                self._lazy_globals[name] = module
+
+    def __getattr__(self, name):
+
+        # Guard against recursion when lazy attributes themselves aren't set yet, e.g. during unpickling
+        if name.startswith("_lazy_"):
+            raise AttributeError(name)
+
+        module = self._lazy_module if self._lazy_module is not None else self._load()
+        self._rebind(module)
+
+        return getattr(module, name)
+
+    def __dir__(self):
+
+        return dir(self._load())
+
+    def __repr__(self):
+
+        state = "loaded" if self._lazy_module is not None else "not loaded"
+        return "<lazy module '{}', {}>".format(self.__name__, state)
@@ -0,0 +1,239 @@
+"""
+Module with columnar dataset manifest - a single binary file describing a dataset's images paths, faces bounding
+boxes, images sizes and split assignments. Manifest columns are memory mapped, so loading it is cheap regardless of
+dataset size and only accessed rows are read from disk.
+"""
+
+import json
+import os
+import struct
+
+import face.lazy
+import face.geometry
+
+
+np = face.lazy.LazyModule("numpy")
+
+
+# Names of splits images can be assigned to, split column stores indices into this list
+splits_names = ["unassigned", "training", "validation", "test"]
+
+# Marks start of a manifest file, includes format version
+magic = b"FACEMANIFEST1\n"
+
+# Columns are aligned to this many bytes within manifest file
+alignment = 64
+
+
+class DatasetManifest:
+    """
+    Columnar dataset description. Rows are images, columns are paths, bounding boxes of faces as
+    [x_min, y_min, x_max, y_max] arrays, image sizes as [height, width] arrays and split indices.
+    Length and slicing are O(1) - slices share underlying, possibly memory mapped, columns.
+    """
+
+    def __init__(self, paths_offsets, paths_data, bounds, image_sizes, splits):
+        """
+        Constructor. Use DatasetManifest.from_lists or DatasetManifest.load to create manifests.
+        :param paths_offsets: array of offsets of each path in paths_data, has one more element than there are rows
+        :param paths_data: uint8 array with utf-8 encoded paths, concatenated
+        :param bounds: (n, 4) array of bounding boxes bounds
+        :param image_sizes: (n, 2) array of image sizes
+        :param splits: array of splits indices
+        """
+
+        self.paths_offsets = paths_offsets
+        self.paths_data = paths_data
+        self.bounds = bounds
+        self.image_sizes = image_sizes
+        self.splits = splits
+
+    @staticmethod
+    def from_lists(paths, bounds, image_sizes, splits):
+        """
+        Create manifest from per row lists
+        :param paths: list of image paths
+        :param bounds: list of [x_min, y_min, x_max, y_max] bounding boxes bounds
+        :param image_sizes: list of [height, width] image sizes
+        :param splits: list of split names
+        :return: DatasetManifest instance
+        """
+
+        encoded_paths = [path.encode("utf-8") for path in paths]
+
+        paths_offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        paths_offsets[1:] = np.cumsum([len(path) for path in encoded_paths])
+
+        return DatasetManifest(
+            paths_offsets=paths_offsets,
+            paths_data=np.frombuffer(b"".join(encoded_paths), dtype=np.uint8),
+            bounds=np.array(bounds, dtype=np.int32).reshape(-1, 4),
+            image_sizes=np.array(image_sizes, dtype=np.int32).reshape(-1, 2),
+            splits=np.array([splits_names.index(split) for split in splits], dtype=np.uint8))
+
+    def __len__(self):
+
+        return len(self.splits)
+
+    def __getitem__(self, index):
+        """
+        Get a slice of manifest. Only contiguous slices are supported, so that they can share underlying columns.
+        :param index: slice
+        :return: DatasetManifest instance
+        """
+
+        if not isinstance(index, slice):
+            raise TypeError("Manifest can only be indexed with slices, use get_path() to access single rows")
+
+        start, stop, step = index.indices(len(self))
+
+        if step != 1:
+            raise ValueError("Manifest slices must be contiguous")
+
+        stop = max(start, stop)
+
+        return DatasetManifest(
+            self.paths_offsets[start:stop + 1], self.paths_data,
+            self.bounds[start:stop], self.image_sizes[start:stop], self.splits[start:stop])
+
+    def get_path(self, index):
+        """
+        Get image path
+        :param index: row index
+        :return: str
+        """
+
+        start = self.paths_offsets[index]
+        end = self.paths_offsets[index + 1]
+
+        return self.paths_data[start:end].tobytes().decode("utf-8")
+
+    def get_paths(self):
+        """
+        Get all images paths
+        :return: list of str
+        """
+
+        data = self.paths_data[self.paths_offsets[0]:self.paths_offsets[-1]].tobytes()
+        offsets = self.paths_offsets - self.paths_offsets[0]
+
+        return [data[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def get_bounding_boxes_map(self):
+        """
+        Get dictionary mapping images file names to bounding boxes, in format used by face.geometry
+        :return: {image file name: shapely.geometry.Polygon} dictionary
+        """
+
+        bounding_boxes = face.geometry.get_bounding_boxes(self.bounds)
+        return {os.path.basename(path): box for path, box in zip(self.get_paths(), bounding_boxes)}
+
+    def get_split(self, name):
+        """
+        Get rows assigned to a split. Rows of each split must be contiguous, which is the case for manifests
+        created by face.datasets builders.
+        :param name: name of the split
+        :return: DatasetManifest instance
+        """
+
+        indices = np.flatnonzero(self.splits == splits_names.index(name))
+
+        if len(indices) == 0:
+            return self[0:0]
+
+        if indices[-1] - indices[0] + 1 != len(indices):
+            raise ValueError("Rows of split {} aren't contiguous".format(name))
+
+        return self[int(indices[0]):int(indices[-1]) + 1]
+
+    def with_splits(self, splits):
+        """
+        Get copy of manifest with split column replaced
+        :param splits: list of split names, one per row
+        :return: DatasetManifest instance
+        """
+
+        return DatasetManifest(
+            self.paths_offsets, self.paths_data, self.bounds, self.image_sizes,
+            np.array([splits_names.index(split) for split in splits], dtype=np.uint8))
+
+    def save(self, path):
+        """
+        Save manifest to a file. File is replaced atomically.
+        :param path: path to file
+        """
+
+        # Make paths of a sliced manifest start at offset 0
+        paths_data = self.paths_data[self.paths_offsets[0]:self.paths_offsets[-1]]
+        paths_offsets = self.paths_offsets - self.paths_offsets[0]
+
+        columns = [
+            ("paths_offsets", paths_offsets), ("paths_data", paths_data), ("bounds", self.bounds),
+            ("image_sizes", self.image_sizes), ("splits", self.splits)]
+
+        header = {"rows_count": len(self), "columns": {}}
+        offset = 0
+
+        for name, column in columns:
+
+            header["columns"][name] = {"dtype": column.dtype.str, "shape": list(column.shape), "offset": offset}
+            offset = _get_aligned(offset + column.nbytes)
+
+        encoded_header = json.dumps(header).encode("utf-8")
+        data_start = _get_aligned(len(magic) + 8 + len(encoded_header))
+
+        temporary_path = path + ".tmp"
+
+        with open(temporary_path, "wb") as file:
+
+            file.write(magic)
+            file.write(struct.pack("<Q", len(encoded_header)))
+            file.write(encoded_header)
+
+            for name, column in columns:
+
+                file.seek(data_start + header["columns"][name]["offset"])
+                file.write(np.ascontiguousarray(column).tobytes())
+
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def load(path):
+        """
+        Load manifest from a file. Columns are memory mapped rather than read.
+        :param path: path to file
+        :return: DatasetManifest instance
+        """
+
+        with open(path, "rb") as file:
+
+            if file.read(len(magic)) != magic:
+                raise ValueError("{} isn't a dataset manifest".format(path))
+
+            header_length = struct.unpack("<Q", file.read(8))[0]
+            header = json.loads(file.read(header_length).decode("utf-8"))
+
+        data_start = _get_aligned(len(magic) + 8 + header_length)
+        columns = {}
+
+        for name, description in header["columns"].items():
+
+            shape = tuple(description["shape"])
+
+            # numpy can't memory map empty arrays
+            if np.prod(shape) == 0:
+
+                columns[name] = np.zeros(shape, dtype=description["dtype"])
+
+            else:
+
+                columns[name] = np.memmap(
+                    path, dtype=description["dtype"], mode="r", offset=data_start + description["offset"],
+                    shape=shape)
+
+        return DatasetManifest(**columns)
+
+
+def _get_aligned(offset):
+
+    return (offset + alignment - 1) // alignment * alignment
@@ -2,14 +2,27 @@
 Module with definitions of prediction models
 """
 
-import keras
-import keras.applications
+import os
+import threading
 
+import face.lazy
+import face.config
 
-def get_pretrained_vgg_model(image_shape):
+
+keras = face.lazy.LazyModule("keras", ["keras.applications"])
+h5py = face.lazy.LazyModule("h5py")
+
+
+# Numbers of filters of convolutions in each block of VGG16 net
+vgg_blocks_channels = [[64, 64], [128, 128], [256, 256, 256], [512, 512, 512], [512, 512, 512]]
+
+
+def get_pretrained_vgg_model(image_shape, weights='imagenet'):
     """
     Builds a model based on pretrained VGG net
     :param image_shape: image shape
+    :param weights: weights VGG net is initialized with - 'imagenet' for pretrained weights, which might need to be
+    downloaded, or None for random initialization, e.g. when trained weights are loaded into the model afterwards
     :return: keras model
     """
 
@@ -24,7 +37,49 @@ def get_pretrained_vgg_model(image_shape):
 
     input_layer = keras.layers.Input(shape=image_shape)
 
-    x = keras.applications.VGG16(include_top=False, weights='imagenet')(input_layer)
+    x = keras.applications.VGG16(include_top=False, weights=weights)(input_layer)
+    x = keras.layers.Convolution2D(1, 2, 2, activation='sigmoid', name='final_convolution')(x)
+    x = keras.layers.Flatten()(x)
+
+    model = keras.models.Model(input=input_layer, output=x)
+
+    adam = keras.optimizers.Adam(lr=0.0001)
+    model.compile(optimizer=adam, loss='binary_crossentropy', metrics=['accuracy'])
+
+    return model
+
+
+def get_vgg_like_model(image_shape, blocks_channels):
+    """
+    Builds a model with VGG net topology, but custom number of filters in each convolution, e.g. obtained by pruning
+    model from get_pretrained_vgg_model. Unlike get_pretrained_vgg_model, convolutions aren't wrapped in a nested
+    model.
+    :param image_shape: image shape
+    :param blocks_channels: list of lists of numbers of filters of convolutions in each block
+    :return: keras model
+    """
+
+    expected_image_shape = (64, 64, 3)
+
+    if image_shape != expected_image_shape:
+
+        message = "Input image is specified to be {}, but this model is designed to work with inputs of shape {}"\
+            .format(image_shape, expected_image_shape)
+
+        raise ValueError(message)
+
+    input_layer = keras.layers.Input(shape=image_shape)
+    x = input_layer
+
+    for block_index, block_channels in enumerate(blocks_channels):
+
+        for convolution_index, channels in enumerate(block_channels):
+
+            name = "block{}_conv{}".format(block_index + 1, convolution_index + 1)
+            x = keras.layers.Convolution2D(channels, 3, 3, activation='relu', border_mode='same', name=name)(x)
+
+        x = keras.layers.MaxPooling2D((2, 2), strides=(2, 2), name="block{}_pool".format(block_index + 1))(x)
+
     x = keras.layers.Convolution2D(1, 2, 2, activation='sigmoid', name='final_convolution')(x)
     x = keras.layers.Flatten()(x)
 
@@ -87,5 +142,129 @@ def get_medium_scale_model(image_shape):
     return model
 
 
+def get_small_scale_model(image_shape):
+    """
+    Builds a small model intended to work on crops of size 64x64, trained by distilling VGG based model.
+    Outputs have the same shape as VGG based model's outputs, so it can be used by face.detection in its place.
+    :param image_shape: image shape
+    :return: keras model
+    """
+
+    expected_image_shape = (64, 64, 3)
+
+    if image_shape != expected_image_shape:
+        message = "Input image is specified to be {}, but this model is designed to work with inputs of shape {}" \
+            .format(image_shape, expected_image_shape)
+
+        raise ValueError(message)
+
+    input_layer = keras.layers.Input(shape=image_shape)
+
+    # Block 1
+    x = keras.layers.Convolution2D(32, 3, 3, activation='elu', border_mode='same', name='block1_conv1')(input_layer)
+    x = keras.layers.Convolution2D(32, 3, 3, activation='elu', border_mode='same', name='block1_conv2')(x)
+    x = keras.layers.MaxPooling2D((2, 2), strides=(2, 2), name='block1_pool')(x)
+
+    # Block 2
+    x = keras.layers.Convolution2D(64, 3, 3, activation='elu', border_mode='same', name='block2_conv1')(x)
+    x = keras.layers.Convolution2D(64, 3, 3, activation='elu', border_mode='same', name='block2_conv2')(x)
+    x = keras.layers.MaxPooling2D((2, 2), strides=(2, 2), name='block2_pool')(x)
+
+    # Block 3
+    x = keras.layers.Convolution2D(128, 3, 3, activation='elu', border_mode='same', name='block3_conv1')(x)
+    x = keras.layers.Convolution2D(128, 3, 3, activation='elu', border_mode='same', name='block3_conv2')(x)
+    x = keras.layers.MaxPooling2D((2, 2), strides=(2, 2), name='block3_pool')(x)
+
+    # Block 4
+    x = keras.layers.Convolution2D(128, 3, 3, activation='elu', border_mode='same', name='block4_conv1')(x)
+    x = keras.layers.MaxPooling2D((2, 2), strides=(2, 2), name='block4_pool')(x)
+
+    x = keras.layers.Convolution2D(1, 4, 4, activation='sigmoid', name='final_convolution')(x)
+    x = keras.layers.Flatten()(x)
+
+    model = keras.models.Model(input=input_layer, output=x)
+
+    adam = keras.optimizers.Adam(lr=0.0001)
+    model.compile(optimizer=adam, loss='binary_crossentropy', metrics=['accuracy'])
+
+    return model
+
+
+def load_trained_model(path):
+    """
+    Load a trained model. Files with complete models - architecture and weights - as saved by model.save() or
+    keras.callbacks.ModelCheckpoint, are loaded as they are. Files with weights only are loaded into VGG based model
+    built without ImageNet weights. Either way no pretrained weights are fetched.
+    :param path: path to model file
+    :return: keras model
+    """
+
+    with h5py.File(path, mode="r") as file:
+
+        is_complete_model = "model_config" in file.attrs
+
+    if is_complete_model:
 
+        return keras.models.load_model(path)
+
+    model = get_pretrained_vgg_model(face.config.image_shape, weights=None)
+    model.load_weights(path)
+
+    return model
+
+
+class ModelsRegistry:
+    """
+    Loads trained models on first use and caches them, so that each process loads each model only once,
+    no matter how many detectors, scripts functions or worker initializers ask for it.
+    """
+
+    def __init__(self, loader=load_trained_model):
+        """
+        Constructor
+        :param loader: function that loads model given a path
+        """
+
+        self.loader = loader
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get_model(self, path=face.config.model_path):
+        """
+        Get trained model, loading it if it wasn't loaded in this process yet
+        :param path: path to model file
+        :return: keras model
+        """
+
+        key = os.path.abspath(path)
+
+        with self.lock:
+
+            if key not in self.models:
+
+                self.models[key] = self.loader(path)
+
+            return self.models[key]
+
+    def clear(self):
+        """
+        Forget all cached models
+        """
+
+        with self.lock:
+
+            self.models.clear()
+
+
+# Registry of models used by default by scripts and evaluation workers
+models_registry = ModelsRegistry()
+
+
+def get_trained_model(path=face.config.model_path):
+    """
+    Get trained model from default models registry
+    :param path: path to model file
+    :return: keras model
+    """
 
+    return models_registry.get_model(path)
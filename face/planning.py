@@ -0,0 +1,152 @@
+"""
+Module with planning of image pyramids searched by face detectors. A plan lists scales, shapes and windows counts of
+all pyramid levels of an image shape ahead of search, so that cost of detection can be estimated before any window
+is scored. Plans depend only on image shape and search parameters, so they are cached.
+"""
+
+import functools
+import math
+
+import face.processing
+
+
+class PyramidLevel:
+    """
+    A simple class describing a single pyramid level
+    """
+
+    def __init__(self, scale, shape, grid_shape, face_size):
+        """
+        Constructor
+        :param scale: scale of level w.r.t. searched image
+        :param shape: (height, width) of level image
+        :param grid_shape: (rows, columns) of scores grid of level
+        :param face_size: size of faces, in searched image pixels, level's windows search for
+        """
+
+        self.scale = scale
+        self.shape = shape
+        self.grid_shape = grid_shape
+        self.face_size = face_size
+
+    def get_windows_count(self):
+        """
+        Get number of windows scored in level
+        :return: integer
+        """
+
+        return self.grid_shape[0] * self.grid_shape[1]
+
+    def get_batches_count(self, batch_size):
+        """
+        Get number of batches windows of level are scored in
+        :param batch_size: batch size
+        :return: integer
+        """
+
+        return math.ceil(self.get_windows_count() / batch_size)
+
+
+class PyramidPlan:
+    """
+    Plan of a multi scale search - all pyramid levels searched, from largest to smallest
+    """
+
+    def __init__(self, levels, batch_size):
+        """
+        Constructor
+        :param levels: list of PyramidLevel instances
+        :param batch_size: batch size windows are scored in
+        """
+
+        self.levels = levels
+        self.batch_size = batch_size
+
+    def get_scales(self):
+        """
+        Get scales of all levels
+        :return: list of floats
+        """
+
+        return [level.scale for level in self.levels]
+
+    def get_windows_count(self):
+        """
+        Get number of windows scored in all levels
+        :return: integer
+        """
+
+        return sum(level.get_windows_count() for level in self.levels)
+
+    def get_batches_count(self):
+        """
+        Get number of batches scored in all levels. Each level is scored in its own batches, so last batch of
+        each level is usually only partially filled.
+        :return: integer
+        """
+
+        return sum(level.get_batches_count(self.batch_size) for level in self.levels)
+
+    def get_estimated_seconds(self, seconds_per_batch, seconds_per_level=0):
+        """
+        Get estimated duration of search. Model cost is dominated by number of batches, since partially filled
+        batches take about as long as full ones.
+        :param seconds_per_batch: time model takes to score a batch, e.g. as measured with face.tracing traces
+        :param seconds_per_level: fixed time spent on each level, e.g. on scaling image
+        :return: time in seconds
+        """
+
+        return seconds_per_batch * self.get_batches_count() + seconds_per_level * len(self.levels)
+
+
+def get_pyramid_plan(image_shape, configuration, max_face_size=None, use_min_face_to_image_ratio=True):
+    """
+    Get plan of pyramid FaceDetector searches for an image. Largest level searches for faces of smallest expected
+    size, as given by min_face_size and min_face_to_image_ratio, each following level is image_rescaling_ratio
+    times smaller. Levels are added while they are larger than crop size and, if max_face_size is set, until
+    a level searches for faces at least that large. Plans are cached per image shape and search parameters.
+    :param image_shape: shape of searched image
+    :param configuration: FaceSearchConfiguration instance
+    :param max_face_size: largest face size to search for, if None, configuration's max_face_size is used
+    :param use_min_face_to_image_ratio: whether smallest expected face size depends on image size. Searches of
+    parts of an image, e.g. tiles, should only use min_face_size, as their size says nothing about size of faces.
+    :return: PyramidPlan instance
+    """
+
+    min_face_to_image_ratio = configuration.min_face_to_image_ratio if use_min_face_to_image_ratio else 0
+    max_face_size = max_face_size if max_face_size is not None else configuration.max_face_size
+
+    return _get_cached_pyramid_plan(
+        tuple(image_shape[:2]), configuration.crop_size, configuration.stride, configuration.batch_size,
+        configuration.min_face_size, min_face_to_image_ratio, configuration.image_rescaling_ratio, max_face_size)
+
+
+@functools.lru_cache(maxsize=256)
+def _get_cached_pyramid_plan(
+        image_shape, crop_size, stride, batch_size, min_face_size, min_face_to_image_ratio, image_rescaling_ratio,
+        max_face_size):
+
+    smallest_face_size = face.processing.get_smallest_expected_face_size(
+        image_shape=image_shape, min_face_size=min_face_size, min_face_to_image_ratio=min_face_to_image_ratio)
+
+    levels = []
+    scale = crop_size / smallest_face_size
+
+    while True:
+
+        # Level shapes are computed same as in get_scaled_image
+        shape = tuple(round(scale * size) for size in image_shape)
+
+        if min(shape) <= crop_size:
+            break
+
+        grid_shape = tuple((size - crop_size) // stride + 1 for size in shape)
+        levels.append(PyramidLevel(scale, shape, grid_shape, crop_size / scale))
+
+        # Faces larger than max_face_size are covered by this level, smaller levels would only search larger faces
+        if max_face_size is not None and crop_size / scale >= max_face_size:
+            break
+
+        scale *= image_rescaling_ratio
+
+    return PyramidPlan(levels, batch_size)
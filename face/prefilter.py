@@ -0,0 +1,229 @@
+"""
+Module with cheap statistical pre-filter of sliding window candidates. Statistics of all windows of an image are
+computed at once from integral images, and windows that clearly can't contain a face - flat regions such as sky,
+walls or letterbox borders and, optionally, regions with too little skin tone - are rejected before they reach
+the model. Thresholds are calibrated on face crops from training data, so that a chosen fraction of faces passes.
+"""
+
+import json
+
+import face.lazy
+
+
+np = face.lazy.LazyModule("numpy")
+
+
+def get_integral_image(values):
+    """
+    Get integral image of a 2D array. Integral image has an extra leading row and column of zeros, so that
+    sum of values[y0:y1, x0:x1] is integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0].
+    :param values: 2D numpy array
+    :return: 2D float64 numpy array of shape (rows + 1, columns + 1)
+    """
+
+    integral = np.zeros(shape=(values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    integral[1:, 1:] = np.cumsum(np.cumsum(values, axis=0, dtype=np.float64), axis=1)
+
+    return integral
+
+
+def get_windows_sums(integral, crop_size, stride):
+    """
+    Get sums of values within all sliding windows, using windows layout of face.detection.get_scores_grid
+    :param integral: integral image, as returned by get_integral_image
+    :param crop_size: size of windows
+    :param stride: stride between windows
+    :return: 2D numpy array. Element at (row, column) is sum within window with top left corner at
+    (column * stride, row * stride)
+    """
+
+    rows_count = max(0, (integral.shape[0] - 1 - crop_size) // stride + 1)
+    columns_count = max(0, (integral.shape[1] - 1 - crop_size) // stride + 1)
+
+    starts_y = np.arange(rows_count) * stride
+    starts_x = np.arange(columns_count) * stride
+
+    top = integral[starts_y]
+    bottom = integral[starts_y + crop_size]
+
+    return \
+        bottom[:, starts_x + crop_size] - top[:, starts_x + crop_size] - bottom[:, starts_x] + top[:, starts_x]
+
+
+def get_luminance(image):
+    """
+    Get luminance of an image
+    :param image: BGR image with values in [0, 1] range, as returned by face.utilities.get_image, or a batch
+    of such images
+    :return: numpy array with one less dimension than image
+    """
+
+    return 0.114 * image[..., 0] + 0.587 * image[..., 1] + 0.299 * image[..., 2]
+
+
+def get_skin_mask(image):
+    """
+    Get mask of pixels with skin tone. Skin tone is detected with a fixed box in Cr-Cb chrominance plane,
+    which is insensitive to lighting and covers a wide range of skin colours.
+    :param image: BGR image with values in [0, 1] range, or a batch of such images
+    :return: float32 numpy array with 1 for skin pixels and 0 otherwise, with one less dimension than image
+    """
+
+    luminance = get_luminance(image)
+
+    # Chrominance as defined by ITU-R BT.601, in 0-255 range used by the skin box thresholds
+    red_chrominance = 255 * (0.713 * (image[..., 2] - luminance) + 0.5)
+    blue_chrominance = 255 * (0.564 * (image[..., 0] - luminance) + 0.5)
+
+    mask = (red_chrominance >= 133) & (red_chrominance <= 173) & (blue_chrominance >= 77) & (blue_chrominance <= 127)
+    return mask.astype(np.float32)
+
+
+class WindowsPrefilter:
+    """
+    Rejects sliding windows whose luminance standard deviation, and optionally fraction of skin tone pixels,
+    is below a threshold. Default thresholds reject nothing, use WindowsPrefilter.calibrate to get thresholds
+    that preserve recall.
+    """
+
+    def __init__(self, min_standard_deviation=0, min_skin_fraction=None):
+        """
+        Constructor
+        :param min_standard_deviation: windows with luminance standard deviation below this value are rejected.
+        Luminance is in [0, 1] range.
+        :param min_skin_fraction: windows with fraction of skin tone pixels below this value are rejected,
+        if None skin tone isn't checked
+        """
+
+        self.min_standard_deviation = min_standard_deviation
+        self.min_skin_fraction = min_skin_fraction
+
+    def get_windows_statistics(self, image, crop_size, stride):
+        """
+        Get statistics of all sliding windows of an image
+        :param image: BGR image with values in [0, 1] range
+        :param crop_size: size of windows
+        :param stride: stride between windows
+        :return: tuple (standard deviations, skin fractions) of 2D numpy arrays with windows laid out as in
+        face.detection.get_scores_grid. Skin fractions are None if skin tone isn't checked.
+        """
+
+        luminance = get_luminance(image)
+        pixels_count = crop_size * crop_size
+
+        means = get_windows_sums(get_integral_image(luminance), crop_size, stride) / pixels_count
+        squares_means = get_windows_sums(get_integral_image(np.square(luminance)), crop_size, stride) / pixels_count
+
+        # Variance computed as difference of means can come out slightly negative due to rounding
+        standard_deviations = np.sqrt(np.maximum(squares_means - np.square(means), 0))
+
+        skin_fractions = None
+
+        if self.min_skin_fraction is not None:
+
+            skin_fractions = get_windows_sums(
+                get_integral_image(get_skin_mask(image)), crop_size, stride) / pixels_count
+
+        return standard_deviations, skin_fractions
+
+    def get_mask(self, image, crop_size, stride):
+        """
+        Get mask of windows that pass the filter
+        :param image: BGR image with values in [0, 1] range
+        :param crop_size: size of windows
+        :param stride: stride between windows
+        :return: 2D boolean numpy array with windows laid out as in face.detection.get_scores_grid
+        """
+
+        standard_deviations, skin_fractions = self.get_windows_statistics(image, crop_size, stride)
+
+        mask = standard_deviations >= self.min_standard_deviation
+
+        if skin_fractions is not None:
+
+            mask &= skin_fractions >= self.min_skin_fraction
+
+        return mask
+
+    def get_crops_mask(self, crops):
+        """
+        Get mask of crops that pass the filter. Crops are filtered exactly as windows of same contents would be.
+        :param crops: batch of BGR crops with values in [0, 1] range
+        :return: 1D boolean numpy array
+        """
+
+        standard_deviations, skin_fractions = _get_crops_statistics(crops)
+
+        mask = standard_deviations >= self.min_standard_deviation
+
+        if self.min_skin_fraction is not None:
+
+            mask &= skin_fractions >= self.min_skin_fraction
+
+        return mask
+
+    @staticmethod
+    def calibrate(crops, labels, recall=0.995, use_skin_tone=False):
+        """
+        Get pre-filter with thresholds set so that given fraction of face crops passes the filter. When skin tone
+        is used too, each threshold is allowed half of the misses, so that together they still let through at least
+        recall fraction of face crops.
+        :param crops: batch of BGR crops with values in [0, 1] range, e.g. from face.data_generators
+        :param labels: labels of crops, 1 for face crops and 0 for non-face crops
+        :param recall: fraction of face crops that should pass the filter
+        :param use_skin_tone: whether to filter windows on skin tone in addition to standard deviation
+        :return: WindowsPrefilter instance
+        """
+
+        faces_crops = np.asarray(crops)[np.ravel(labels) == 1]
+
+        if len(faces_crops) == 0:
+            raise ValueError("Pre-filter can't be calibrated without face crops")
+
+        standard_deviations, skin_fractions = _get_crops_statistics(faces_crops)
+
+        # Number of face crops allowed to be rejected by each threshold
+        misses_count = int(len(faces_crops) * ((1 - recall) / 2 if use_skin_tone else 1 - recall))
+
+        # Thresholds are set to values of actual crops, so that these crops still pass
+        min_standard_deviation = float(np.sort(standard_deviations)[misses_count])
+        min_skin_fraction = float(np.sort(skin_fractions)[misses_count]) if use_skin_tone else None
+
+        return WindowsPrefilter(min_standard_deviation, min_skin_fraction)
+
+    def save(self, path):
+        """
+        Save thresholds to a json file
+        :param path: path to file
+        """
+
+        with open(path, "w") as file:
+
+            json.dump(
+                {"min_standard_deviation": self.min_standard_deviation, "min_skin_fraction": self.min_skin_fraction},
+                file)
+
+    @staticmethod
+    def load(path):
+        """
+        Load pre-filter saved with WindowsPrefilter.save
+        :param path: path to file
+        :return: WindowsPrefilter instance
+        """
+
+        with open(path) as file:
+
+            return WindowsPrefilter(**json.load(file))
+
+
+def _get_crops_statistics(crops):
+
+    # Statistics are computed same way as for windows, so that rounding doesn't make a crop that
+    # set a threshold fall below it
+    prefilter = WindowsPrefilter(min_skin_fraction=0)
+    statistics = [prefilter.get_windows_statistics(crop, len(crop), len(crop)) for crop in crops]
+
+    standard_deviations = np.array([standard_deviation.item() for standard_deviation, _ in statistics])
+    skin_fractions = np.array([skin_fraction.item() for _, skin_fraction in statistics])
+
+    return standard_deviations, skin_fractions
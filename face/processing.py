@@ -5,13 +5,15 @@ Module with various image related processing functions
 import os
 import random
 
-import numpy as np
-import cv2
-import shapely.geometry
-
+import face.lazy
 import face.utilities
 import face.geometry
 import face.config
+import face.instrumentation
+
+
+np = face.lazy.LazyModule("numpy")
+cv2 = face.lazy.LazyModule("cv2")
 
 
 class InvalidBoundingBoxError(Exception):
@@ -47,7 +49,9 @@ def scale_image_keeping_aspect_ratio(image, size):
     return cv2.resize(image, target_shape)
 
 
-def get_data_batch(paths, bounding_boxes_map, index, batch_size, crop_size):
+def get_data_batch(
+        paths, bounding_boxes_map, index, batch_size, crop_size,
+        statistics=face.instrumentation.null_pipeline_statistics):
     """
     Create a single batch of face and non-face crops, along with labels.
     :param paths: list of image paths
@@ -55,6 +59,8 @@ def get_data_batch(paths, bounding_boxes_map, index, batch_size, crop_size):
     :param index: index from which paths list should be read
     :param batch_size: size of batch to be returned
     :param crop_size: size of each image crop in batch
+    :param statistics: face.instrumentation.PipelineStatistics instance pipeline statistics should be recorded in,
+    by default no statistics are recorded
     :return: tuple (image_crops, labels)
     """
 
@@ -66,38 +72,46 @@ def get_data_batch(paths, bounding_boxes_map, index, batch_size, crop_size):
         try:
 
             path = paths[index]
-            image = face.utilities.get_image(path)
+            statistics.add_image()
+
+            with statistics.timer("decode"):
+                image = face.utilities.get_image(path)
 
-            image_bounding_box = shapely.geometry.box(0, 0, image.shape[1], image.shape[0])
+            image_bounds = (0, 0, image.shape[1], image.shape[0])
             face_bounding_box = bounding_boxes_map[os.path.basename(path)]
 
             # Only allow images for which face covers at least 1% of the image. If it doesn't, then face bounding
             # box is probably incorrect
-            if face.geometry.get_intersection_over_union(image_bounding_box, face_bounding_box) < 0.01:
+            if face.geometry.get_intersections_over_unions(
+                    image_bounds, face.geometry.get_bounds_array(face_bounding_box)) < 0.01:
 
                 raise InvalidBoundingBoxError("Invalid bounding box for image {}".format(path))
 
             scale = face.geometry.get_scale(face_bounding_box, crop_size)
 
-            scaled_image = get_scaled_image(image, scale)
-            scaled_bounding_box = face.geometry.get_scaled_bounding_box(face_bounding_box, scale)
+            with statistics.timer("resize"):
 
-            # Randomly flip image
-            if random.randint(0, 1) == 1:
-                
-                scaled_image = cv2.flip(scaled_image, flipCode=1)
+                scaled_image = get_scaled_image(image, scale)
+                scaled_bounding_box = face.geometry.get_scaled_bounding_box(face_bounding_box, scale)
 
-                scaled_bounding_box = face.geometry.flip_bounding_box_about_vertical_axis(
-                    scaled_bounding_box, scaled_image.shape)
+                # Randomly flip image
+                if random.randint(0, 1) == 1:
 
-            crops, labels = get_image_crops_labels_batch(scaled_image, scaled_bounding_box, crop_size=crop_size)
+                    scaled_image = cv2.flip(scaled_image, flipCode=1)
+
+                    scaled_bounding_box = face.geometry.flip_bounding_box_about_vertical_axis(
+                        scaled_bounding_box, scaled_image.shape)
+
+            with statistics.timer("crops_sampling"):
+                crops, labels = get_image_crops_labels_batch(
+                    scaled_image, scaled_bounding_box, crop_size=crop_size, statistics=statistics)
 
             images_batch.extend(crops)
             labels_batch.extend(labels)
 
         # If image had an invalid bounding box, we want to skip over that image and go to next one
-        except (InvalidBoundingBoxError, CropException):
-            pass
+        except (InvalidBoundingBoxError, CropException) as error:
+            statistics.add_skipped_image(type(error).__name__)
 
         index += 1
 
@@ -105,12 +119,14 @@ def get_data_batch(paths, bounding_boxes_map, index, batch_size, crop_size):
 
             index = 0
 
-    # Shuffle within a batch
-    batch = list(zip(images_batch, labels_batch))
-    random.shuffle(batch)
-    images_batch, labels_batch = zip(*batch)
+    with statistics.timer("batch_assembly"):
 
-    return np.array(images_batch), np.array(labels_batch)
+        # Shuffle within a batch
+        batch = list(zip(images_batch, labels_batch))
+        random.shuffle(batch)
+        images_batch, labels_batch = zip(*batch)
+
+        return np.array(images_batch), np.array(labels_batch)
 
 
 def get_scaled_image(image, scale):
@@ -125,7 +141,8 @@ def get_scaled_image(image, scale):
     return cv2.resize(image, (round(scale * image.shape[1]), round(scale * image.shape[0])))
 
 
-def get_image_crops_labels_batch(image, face_bounding_box, crop_size):
+def get_image_crops_labels_batch(
+        image, face_bounding_box, crop_size, statistics=face.instrumentation.null_pipeline_statistics):
     """
     Given an image and a bounding box of face in it, return a tuple (crops, labels), where both crops and labels
     are a list of length 4. Crops contain random image crops of size crop_size x crop_size such that
@@ -135,15 +152,16 @@ def get_image_crops_labels_batch(image, face_bounding_box, crop_size):
     :param image: image
     :param face_bounding_box: bounding box of face in image
     :param crop_size: desired crop size
+    :param statistics: face.instrumentation.PipelineStatistics instance crop samplers attempts are recorded in
     :return: (crops, labels) tuple
     """
 
-    face_crop = get_random_face_crop(image, face_bounding_box, crop_size)
+    face_crop = get_random_face_crop(image, face_bounding_box, crop_size, statistics)
 
     non_face_crops = [
-        get_random_non_face_crop(image, face_bounding_box, crop_size),
-        get_random_face_part_crop(image, face_bounding_box, crop_size),
-        get_random_small_scale_face_crop(image, face_bounding_box, crop_size)
+        get_random_non_face_crop(image, face_bounding_box, crop_size, statistics),
+        get_random_face_part_crop(image, face_bounding_box, crop_size, statistics),
+        get_random_small_scale_face_crop(image, face_bounding_box, crop_size, statistics)
     ]
 
     crops = [face_crop] + non_face_crops
@@ -152,17 +170,20 @@ def get_image_crops_labels_batch(image, face_bounding_box, crop_size):
     return crops, labels
 
 
-def get_random_face_crop(image, face_bounding_box, crop_size):
+def get_random_face_crop(
+        image, face_bounding_box, crop_size, statistics=face.instrumentation.null_pipeline_statistics):
     """
     Given an image and face bounding box, return a random crop that has high IOU with face bounding box and
     is of size crop_size x crop_size
     :param image: image
     :param face_bounding_box: bounding box of face
     :param crop_size: desired crop size
+    :param statistics: face.instrumentation.PipelineStatistics instance number of attempts is recorded in
     :return: random crop that mostly contains face
     """
 
     bounds = face_bounding_box.bounds
+    face_bounds = face.geometry.get_bounds_array(face_bounding_box)
 
     # Try up to x times to get a good crop
     for index in range(100):
@@ -173,30 +194,36 @@ def get_random_face_crop(image, face_bounding_box, crop_size):
         x_end = x + crop_size
         y_end = y + crop_size
 
-        cropped_region = shapely.geometry.box(x, y, x_end, y_end)
+        cropped_region = (x, y, x_end, y_end)
 
         are_coordinates_legal = x >= 0 and y >= 0 and x_end < image.shape[1] and y_end < image.shape[0]
 
-        is_iou_high = face.geometry.get_intersection_over_union(face_bounding_box, cropped_region) > 0.6
+        is_iou_high = face.geometry.get_intersections_over_unions(face_bounds, cropped_region) > 0.6
 
         if are_coordinates_legal and is_iou_high:
 
+            statistics.add_crop_attempts("face", index + 1)
             return image[y:y_end, x:x_end]
 
     # We failed to find a good crop despite trying x times, throw
+    statistics.add_crop_attempts("face", 100)
     raise CropException()
 
 
-def get_random_non_face_crop(image, face_bounding_box, crop_size):
+def get_random_non_face_crop(
+        image, face_bounding_box, crop_size, statistics=face.instrumentation.null_pipeline_statistics):
     """
     Given an image and face bounding box, return a random crop that has low IOU with face bounding box and
     is of size crop_size x crop_size. Crop is taken at a random scale and resized to be crop_size x crop_size.
     :param image: image
     :param face_bounding_box: bounding box of face
     :param crop_size: desired crop size
+    :param statistics: face.instrumentation.PipelineStatistics instance number of attempts is recorded in
     :return: random crop that contains little or no face
     """
 
+    face_bounds = face.geometry.get_bounds_array(face_bounding_box)
+
     # Try up to x times to get a good crop
     for index in range(100):
 
@@ -207,21 +234,24 @@ def get_random_non_face_crop(image, face_bounding_box, crop_size):
         x_end = x + sampling_size
         y_end = y + sampling_size
 
-        sampled_region = shapely.geometry.box(x, y, x_end, y_end)
+        sampled_region = (x, y, x_end, y_end)
 
         are_coordinates_legal = x >= 0 and y >= 0 and x_end < image.shape[1] and y_end < image.shape[0]
 
-        is_iou_low = face.geometry.get_intersection_over_union(face_bounding_box, sampled_region) < 0.6
+        is_iou_low = face.geometry.get_intersections_over_unions(face_bounds, sampled_region) < 0.6
 
         if are_coordinates_legal and is_iou_low:
 
+            statistics.add_crop_attempts("non_face", index + 1)
             return cv2.resize(image[y:y_end, x:x_end], (crop_size, crop_size))
 
     # We failed to find a good crop despite trying x times, throw
+    statistics.add_crop_attempts("non_face", 100)
     raise CropException()
 
 
-def get_random_face_part_crop(image, face_bounding_box, crop_size):
+def get_random_face_part_crop(
+        image, face_bounding_box, crop_size, statistics=face.instrumentation.null_pipeline_statistics):
     """
     Return a random face part. Face part is defined as a random crop of image from within face_bounding_box
     region that has a small IOU with face bounding box. Cropped face part is rescaled so as
@@ -229,10 +259,12 @@ def get_random_face_part_crop(image, face_bounding_box, crop_size):
     :param image: input image containing face
     :param face_bounding_box: region occupied by the face
     :param crop_size: size of output image
+    :param statistics: face.instrumentation.PipelineStatistics instance number of attempts is recorded in
     :return: image representing random face part
     """
 
     bounds = face_bounding_box.bounds
+    face_bounds = face.geometry.get_bounds_array(face_bounding_box)
 
     # Try up to x times to get a good crop
     for index in range(100):
@@ -246,22 +278,25 @@ def get_random_face_part_crop(image, face_bounding_box, crop_size):
         x_end = x + sampling_width
         y_end = y + sampling_width
 
-        cropped_region = shapely.geometry.box(x, y, x_end, y_end)
+        cropped_region = (x, y, x_end, y_end)
 
         are_coordinates_legal = x >= 0 and y >= 0 and x_end < image.shape[1] and y_end < image.shape[0]
 
-        is_iou_low = face.geometry.get_intersection_over_union(face_bounding_box, cropped_region) < 0.5
+        is_iou_low = face.geometry.get_intersections_over_unions(face_bounds, cropped_region) < 0.5
 
         if are_coordinates_legal and is_iou_low:
 
+            statistics.add_crop_attempts("face_part", index + 1)
             crop = image[y:y_end, x:x_end]
             return cv2.resize(crop, (crop_size, crop_size))
 
     # We failed to find a good crop despite trying x times, throw
+    statistics.add_crop_attempts("face_part", 100)
     raise CropException()
 
 
-def get_random_small_scale_face_crop(image, face_bounding_box, crop_size):
+def get_random_small_scale_face_crop(
+        image, face_bounding_box, crop_size, statistics=face.instrumentation.null_pipeline_statistics):
     """
     Get a random crop of area such that face forms a small part of it. This is to teach algorithm not to
     recognize images in which face is too small, so that it learns to put bounding boxes only at the
@@ -269,10 +304,12 @@ def get_random_small_scale_face_crop(image, face_bounding_box, crop_size):
     :param image: input image containing face
     :param face_bounding_box: region occupied by the face
     :param crop_size: size of output image
+    :param statistics: face.instrumentation.PipelineStatistics instance number of attempts is recorded in
     :return: image with a small face in it
     """
 
     bounds = face_bounding_box.bounds
+    face_bounds = face.geometry.get_bounds_array(face_bounding_box)
 
     # Try up to x times to get a good crop
     for index in range(100):
@@ -292,20 +329,22 @@ def get_random_small_scale_face_crop(image, face_bounding_box, crop_size):
         x_end = x + crop_width
         y_end = y + crop_width
 
-        cropped_region = shapely.geometry.box(x, y, x_end, y_end)
+        cropped_region = (x, y, x_end, y_end)
 
         # Check coordinates would be legal and crop would be bigger than face bounding box
         are_coordinates_legal = x >= 0 and x_end < image.shape[1] and \
                                 y >= 0 and y_end < image.shape[0] and crop_width > crop_size
 
-        is_iou_low = face.geometry.get_intersection_over_union(face_bounding_box, cropped_region) < 0.5
+        is_iou_low = face.geometry.get_intersections_over_unions(face_bounds, cropped_region) < 0.5
 
         if are_coordinates_legal and is_iou_low:
 
+            statistics.add_crop_attempts("small_scale_face", index + 1)
             crop = image[y:y_end, x:x_end]
             return cv2.resize(crop, (crop_size, crop_size))
 
     # We failed to find a good crop despite trying x times, throw
+    statistics.add_crop_attempts("small_scale_face", 100)
     raise CropException()
 
 
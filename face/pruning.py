@@ -0,0 +1,294 @@
+"""
+Module with structured channel pruning of VGG based models. Convolution filters are ranked by L1 norms of their
+weights, weakest filters are removed from every convolution in steps and pruned model is fine-tuned after each step.
+Pruning stops once validation accuracy drops more than a tolerance below accuracy of unpruned model.
+"""
+
+import math
+import time
+
+import face.lazy
+import face.config
+import face.models
+
+
+np = face.lazy.LazyModule("numpy")
+keras = face.lazy.LazyModule("keras")
+
+
+def get_convolution_layers(model):
+    """
+    Get convolution layers of a model, in order, including layers of nested models such as VGG trunk
+    :param model: keras model
+    :return: list of keras layers
+    """
+
+    layers = []
+
+    for layer in model.layers:
+
+        if hasattr(layer, "layers"):
+
+            layers.extend(get_convolution_layers(layer))
+
+        elif isinstance(layer, keras.layers.Convolution2D):
+
+            layers.append(layer)
+
+    return layers
+
+
+def get_filters_importances(kernel):
+    """
+    Get importances of convolution filters, computed as L1 norms of their weights
+    :param kernel: convolution kernel of shape (rows, columns, input channels, output channels)
+    :return: numpy array with importance of each output channel
+    """
+
+    return np.sum(np.abs(kernel), axis=(0, 1, 2))
+
+
+def get_kept_channels(kernel, channels_count):
+    """
+    Get indices of most important filters of a convolution
+    :param kernel: convolution kernel of shape (rows, columns, input channels, output channels)
+    :param channels_count: number of filters to keep
+    :return: sorted numpy array of indices of kept filters
+    """
+
+    importances = get_filters_importances(kernel)
+
+    # Stable sort keeps pruning deterministic when importances are tied
+    return np.sort(np.argsort(-importances, kind="mergesort")[:channels_count])
+
+
+def get_pruned_weights(convolutions_weights, channels_counts):
+    """
+    Get weights of convolutions with least important filters removed. Removing a filter also removes
+    corresponding input channel of next convolution.
+    :param convolutions_weights: list of [kernel, bias] lists, one for each convolution in order. Last convolution
+    is the output convolution and keeps all its filters.
+    :param channels_counts: list of numbers of filters to keep, one for each convolution except the last
+    :return: list of [kernel, bias] lists
+    """
+
+    pruned_weights = []
+    kept_input_channels = None
+
+    output_channels_counts = list(channels_counts) + [convolutions_weights[-1][0].shape[-1]]
+
+    for (kernel, bias), channels_count in zip(convolutions_weights, output_channels_counts):
+
+        if kept_input_channels is not None:
+            kernel = kernel[:, :, kept_input_channels, :]
+
+        kept_output_channels = get_kept_channels(kernel, channels_count)
+
+        pruned_weights.append([kernel[..., kept_output_channels], bias[kept_output_channels]])
+        kept_input_channels = kept_output_channels
+
+    return pruned_weights
+
+
+def get_blocks_channels(channels_counts, blocks_sizes):
+    """
+    Group per convolution channels counts into blocks
+    :param channels_counts: list of channels counts
+    :param blocks_sizes: list of numbers of convolutions in each block
+    :return: list of lists of channels counts
+    """
+
+    blocks_channels = []
+    start = 0
+
+    for size in blocks_sizes:
+
+        blocks_channels.append(list(channels_counts[start:start + size]))
+        start += size
+
+    return blocks_channels
+
+
+def get_convolutions_flops(image_shape, blocks_channels, final_kernel_size=2):
+    """
+    Get number of floating point operations of convolutions of a VGG like model for a single input, counting
+    multiplication and addition separately
+    :param image_shape: input image shape
+    :param blocks_channels: list of lists of numbers of filters of convolutions of each block. Every block is
+    followed by a 2x2 max pooling.
+    :param final_kernel_size: kernel size of final, single filter convolution
+    :return: number of operations
+    """
+
+    size = image_shape[0]
+    input_channels = image_shape[2]
+
+    flops = 0
+
+    for block_channels in blocks_channels:
+
+        for channels in block_channels:
+
+            flops += 2 * size * size * 3 * 3 * input_channels * channels
+            input_channels = channels
+
+        size //= 2
+
+    final_size = size - final_kernel_size + 1
+    flops += 2 * final_size * final_size * final_kernel_size * final_kernel_size * input_channels
+
+    return flops
+
+
+def measure_latency(model, batch_size, repetitions=10):
+    """
+    Measure time model takes to predict a batch of random crops
+    :param model: keras model
+    :param batch_size: batch size
+    :param repetitions: number of measured predictions, best one is reported
+    :return: time in seconds
+    """
+
+    batch = np.random.uniform(size=(batch_size,) + face.config.image_shape).astype(np.float32)
+
+    # Warm up
+    model.predict(batch, batch_size=batch_size)
+
+    durations = []
+
+    for _ in range(repetitions):
+
+        start = time.perf_counter()
+        model.predict(batch, batch_size=batch_size)
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+class ChannelPruner:
+    """
+    Prunes convolution filters of a VGG based model in steps, fine-tuning model after each step, until validation
+    accuracy drops more than a tolerance below accuracy of unpruned model.
+    """
+
+    def __init__(
+            self, training_generator, validation_generator, fine_tuning_samples_count, validation_samples_count,
+            pruning_ratio=0.2, tolerance=0.01, min_channels_count=8, verbose=True):
+        """
+        Constructor
+        :param training_generator: generator of fine-tuning batches, e.g. from face.data_generators
+        :param validation_generator: generator of validation batches
+        :param fine_tuning_samples_count: number of samples model is fine-tuned on after each pruning step
+        :param validation_samples_count: number of samples accuracy is computed on
+        :param pruning_ratio: fraction of remaining filters of each convolution removed on each step
+        :param tolerance: max acceptable drop in validation accuracy
+        :param min_channels_count: convolutions are never pruned below this many filters
+        :param verbose: whether to output progress
+        """
+
+        self.training_generator = training_generator
+        self.validation_generator = validation_generator
+        self.fine_tuning_samples_count = fine_tuning_samples_count
+        self.validation_samples_count = validation_samples_count
+        self.pruning_ratio = pruning_ratio
+        self.tolerance = tolerance
+        self.min_channels_count = min_channels_count
+        self.verbose = verbose
+
+        # List of (channels counts, accuracy) tuples of all evaluated models, filled in by prune()
+        self.history = []
+
+    def get_accuracy(self, model):
+        """
+        Get validation accuracy of a model
+        :param model: keras model
+        :return: accuracy
+        """
+
+        _, accuracy = model.evaluate_generator(self.validation_generator, self.validation_samples_count)
+        return accuracy
+
+    def get_next_channels_counts(self, channels_counts):
+        """
+        Get channels counts after next pruning step
+        :param channels_counts: current channels counts
+        :return: list of channels counts
+        """
+
+        return [max(min(count, self.min_channels_count), math.ceil(count * (1 - self.pruning_ratio)))
+                for count in channels_counts]
+
+    def prune(self, model, blocks_sizes):
+        """
+        Prune model
+        :param model: VGG based keras model, e.g. from face.models.get_pretrained_vgg_model
+        :param blocks_sizes: list of numbers of convolutions in each block of model's trunk
+        :return: pruned keras model - the smallest one whose accuracy was within tolerance
+        """
+
+        baseline_accuracy = self.get_accuracy(model)
+
+        convolutions_weights = [layer.get_weights() for layer in get_convolution_layers(model)]
+        channels_counts = [kernel.shape[-1] for kernel, _ in convolutions_weights[:-1]]
+
+        self.history = [(channels_counts, baseline_accuracy)]
+        best_model = model
+
+        while True:
+
+            next_channels_counts = self.get_next_channels_counts(channels_counts)
+
+            if next_channels_counts == channels_counts:
+                break
+
+            pruned_model = face.models.get_vgg_like_model(
+                face.config.image_shape, get_blocks_channels(next_channels_counts, blocks_sizes))
+
+            for layer, weights in zip(get_convolution_layers(pruned_model),
+                                      get_pruned_weights(convolutions_weights, next_channels_counts)):
+                layer.set_weights(weights)
+
+            pruned_model.fit_generator(
+                self.training_generator, samples_per_epoch=self.fine_tuning_samples_count, nb_epoch=1,
+                verbose=int(self.verbose))
+
+            accuracy = self.get_accuracy(pruned_model)
+            self.history.append((next_channels_counts, accuracy))
+
+            if self.verbose:
+                print("Channels: {}, accuracy: {:.4f} (unpruned: {:.4f})".format(
+                    next_channels_counts, accuracy, baseline_accuracy))
+
+            if accuracy < baseline_accuracy - self.tolerance:
+                break
+
+            best_model = pruned_model
+            channels_counts = next_channels_counts
+            convolutions_weights = [layer.get_weights() for layer in get_convolution_layers(pruned_model)]
+
+        return best_model
+
+
+def get_pruning_report(image_shape, original_blocks_channels, pruned_blocks_channels, latencies, accuracies):
+    """
+    Get report comparing original and pruned models
+    :param image_shape: input image shape
+    :param original_blocks_channels: channels of convolutions of each block of original model
+    :param pruned_blocks_channels: channels of convolutions of each block of pruned model
+    :param latencies: (original model latency, pruned model latency) tuple, in seconds
+    :param accuracies: (original model accuracy, pruned model accuracy) tuple
+    :return: report string
+    """
+
+    flops = [get_convolutions_flops(image_shape, channels)
+             for channels in [original_blocks_channels, pruned_blocks_channels]]
+
+    lines = [
+        "{:<12}{:>16}{:>16}{:>12}".format("model", "MFLOPs per crop", "batch latency", "accuracy"),
+        "{:<12}{:>16.1f}{:>14.1f}ms{:>12.4f}".format("original", flops[0] / 1e6, 1000 * latencies[0], accuracies[0]),
+        "{:<12}{:>16.1f}{:>14.1f}ms{:>12.4f}".format("pruned", flops[1] / 1e6, 1000 * latencies[1], accuracies[1]),
+        "FLOPs reduced {:.1f}x, latency reduced {:.1f}x".format(flops[0] / flops[1], latencies[0] / latencies[1]),
+        "Pruned channels: {}".format(pruned_blocks_channels)
+    ]
+
+    return "\n".join(lines)
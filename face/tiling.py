@@ -0,0 +1,210 @@
+"""
+Module with tiled face detection for very large images. Image is searched at native resolution, one overlapping tile
+at a time, so that memory used depends on tile size rather than on image size. Tiles overlap by the size of largest
+window searched for, so every window of every pyramid level lies fully within at least one tile.
+"""
+
+import math
+import time
+
+import face.lazy
+import face.detection
+import face.planning
+import face.processing
+import face.tracing
+
+
+np = face.lazy.LazyModule("numpy")
+
+
+def get_tiles_bounds(image_shape, tile_size, overlap):
+    """
+    Get bounds of overlapping tiles covering an image. Tiles are laid out row by row, last tile of each row and
+    column is aligned with image border, so all tiles, except those of images smaller than tile size, are
+    tile_size x tile_size.
+    :param image_shape: shape of image
+    :param tile_size: size of tiles
+    :param overlap: minimum overlap of neighbouring tiles, must be smaller than tile size
+    :return: list of (x_min, y_min, x_max, y_max) tuples
+    """
+
+    if overlap >= tile_size:
+
+        raise ValueError("Tiles overlap ({}) must be smaller than tile size ({})".format(overlap, tile_size))
+
+    def get_starts(size):
+
+        if size <= tile_size:
+            return [0]
+
+        tiles_count = math.ceil((size - overlap) / (tile_size - overlap))
+
+        # Spread tiles evenly, so that last tile ends at image border
+        return [round(index * (size - tile_size) / (tiles_count - 1)) for index in range(tiles_count)]
+
+    height, width = image_shape[:2]
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in get_starts(height) for x in get_starts(width)]
+
+
+def get_tile_image(image, bounds):
+    """
+    Get tile of an image as a float32 image with values in [0, 1] range. Only tile is read, so image can be
+    a memory mapped array larger than available memory.
+    :param image: image with values in [0, 1] range, or uint8 image with values in [0, 255] range
+    :param bounds: (x_min, y_min, x_max, y_max) tuple
+    :return: numpy array
+    """
+
+    x_min, y_min, x_max, y_max = bounds
+    tile = image[y_min:y_max, x_min:x_max]
+
+    return tile.astype(np.float32) / 255 if tile.dtype == np.uint8 else np.array(tile, dtype=np.float32)
+
+
+class TiledFaceDetector:
+    """
+    Class for detecting faces in very large images. Unlike FaceDetector, image isn't scaled down before search, so
+    small faces in high resolution images can be found. Image is processed as a stream of overlapping tiles - each
+    tile's pyramid is searched and reduced to detections before next tile is read, so memory use is bounded by tile
+    size. Detections from all tiles are merged together, so faces on tiles seams are reported once.
+    """
+
+    def __init__(self, image, model, configuration, max_face_size, tile_size=None, post_processor=None,
+                 tracer=None, prefilter=None):
+        """
+        Constructor
+        :param image: image to search, with values in [0, 1] range, or uint8 image with values in [0, 255] range.
+        Can be a memory mapped array.
+        :param model: face detection model
+        :param configuration: FaceSearchConfiguration instance. Only min_face_size is used to bound size of
+        smallest faces, since min_face_to_image_ratio would discard small faces large images are searched for.
+        :param max_face_size: largest face size, in pixels, to search for. Tiles overlap by size of largest window
+        searched, which is at least max_face_size.
+        :param tile_size: size of tiles, if None, a size twice as large as tiles overlap, but not smaller than 1024,
+        is used. Tiles must be large enough for pyramid levels searching for faces of max_face_size.
+        :param post_processor: DetectionsPostProcessor instance, if None, one with default parameters is used
+        :param tracer: optional face.tracing.DetectionTracer instance
+        :param prefilter: optional face.prefilter.WindowsPrefilter instance windows are filtered with before scoring
+        """
+
+        self.image = image
+        self.model = model
+        self.configuration = configuration
+        self.max_face_size = max_face_size
+        self.post_processor = post_processor if post_processor is not None else \
+            face.detection.DetectionsPostProcessor()
+        self.tracer = tracer
+        self.prefilter = prefilter
+
+        self.tile_size = tile_size if tile_size is not None else 1024
+        self.plan = self.get_pyramid_plan()
+
+        # Larger default tiles might fit levels searching for larger faces, which widen overlap, so plan is
+        # recomputed until default tile size is at least twice the overlap
+        while tile_size is None and 2 * self.get_largest_window_size() > self.tile_size:
+
+            self.tile_size = 2 * self.get_largest_window_size()
+            self.plan = self.get_pyramid_plan()
+
+        if len(self.plan.levels) == 0 or self.plan.levels[-1].face_size < max_face_size:
+
+            raise ValueError("Tiles of size {} are too small to search for faces of size {}".format(
+                self.tile_size, max_face_size))
+
+        self.overlap = self.get_largest_window_size()
+
+    def get_pyramid_plan(self):
+        """
+        Get plan of pyramid searched in every full size tile. Only min_face_size bounds size of smallest faces,
+        since min_face_to_image_ratio would discard small faces large images are searched for.
+        :return: face.planning.PyramidPlan instance
+        """
+
+        return face.planning.get_pyramid_plan(
+            (self.tile_size, self.tile_size), self.configuration, max_face_size=self.max_face_size,
+            use_min_face_to_image_ratio=False)
+
+    def get_scales(self):
+        """
+        Get scales of pyramid levels searched in every tile, from largest to smallest
+        :return: list of floats
+        """
+
+        return self.plan.get_scales()
+
+    def get_largest_window_size(self):
+        """
+        Get size of largest window searched, in input image pixels
+        :return: integer
+        """
+
+        return math.ceil(self.plan.levels[-1].face_size)
+
+    def get_tiles_bounds(self):
+        """
+        Get bounds of tiles image is searched in
+        :return: list of (x_min, y_min, x_max, y_max) tuples
+        """
+
+        return get_tiles_bounds(self.image.shape, self.tile_size, self.overlap)
+
+    def get_tiles_scores_grids(self):
+        """
+        Get generator of raw scores grids of each tile. Grids of a tile are computed only when generator reaches it.
+        :return: generator yielding (tile bounds, list of ScoresGrid instances) tuples. Scores grids have scales
+        relative to input image and offsets place their windows in input image scaled by grid's scale.
+        """
+
+        for bounds in self.get_tiles_bounds():
+
+            tile = get_tile_image(self.image, bounds)
+            scores_grids = []
+
+            for scale in self.get_scales():
+
+                level_image = face.processing.get_scaled_image(tile, scale)
+
+                trace = None if self.tracer is None else face.tracing.PyramidLevelTrace(
+                    "TiledFaceDetector", scale, level_image.shape, self.configuration.batch_size)
+
+                scores = face.detection.get_scores_grid(
+                    level_image, self.model, self.configuration, trace, self.prefilter)
+
+                offset = (bounds[0] * scale, bounds[1] * scale)
+
+                scores_grids.append(face.detection.ScoresGrid(
+                    scores, scale, self.configuration.crop_size, self.configuration.stride, offset))
+
+                if trace is not None:
+
+                    trace.end = time.perf_counter()
+                    self.tracer.on_pyramid_level(trace)
+
+            yield bounds, scores_grids
+
+    def get_faces_detections(self):
+        """
+        Get face detections found in image instance was constructed with
+        :return: a list of FaceDetection instances, in input image coordinates
+        """
+
+        start = time.perf_counter()
+
+        detections = []
+
+        for _, scores_grids in self.get_tiles_scores_grids():
+
+            # Only detections of each tile are kept, scores grids are released before next tile is searched
+            detections.extend(self.post_processor.get_detections(scores_grids))
+
+        # Merging detections of all tiles merges duplicates found in overlapping parts of tiles
+        unique_detections = face.detection.UniqueDetectionsComputer.averaging(
+            detections, self.post_processor.iou_threshold)
+
+        if self.tracer is not None:
+
+            self.tracer.on_detection("TiledFaceDetector", start, time.perf_counter() - start)
+
+        return unique_detections
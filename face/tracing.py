@@ -0,0 +1,174 @@
+"""
+Module with tracing utilities for face detection. Detectors accept an optional tracer object that receives
+a PyramidLevelTrace for every pyramid level they search.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class PyramidLevelTrace:
+    """
+    A simple class collecting timings and counts of a search over a single pyramid level
+    """
+
+    def __init__(self, detector, scale, level_shape, batch_size):
+        """
+        Constructor
+        :param detector: name of detector performing the search
+        :param scale: scale of pyramid level
+        :param level_shape: shape of pyramid level image
+        :param batch_size: batch size used for predictions
+        """
+
+        self.detector = detector
+        self.scale = scale
+        self.level_shape = tuple(level_shape)
+        self.batch_size = batch_size
+
+        self.thread_id = threading.get_ident()
+
+        self.start = time.perf_counter()
+        self.end = None
+
+        self.candidates_count = 0
+        self.batches_count = 0
+
+        # Number of windows rejected by a pre-filter before reaching the model
+        self.rejected_count = 0
+        self.predict_duration = 0
+
+        self.post_processing_start = None
+        self.post_processing_duration = 0
+
+        # Number of windows with scores above detection threshold, None if not applicable
+        self.positives_count = None
+
+    def add_batch(self, candidates_count, predict_duration):
+        """
+        Record a batch of candidates was scored
+        :param candidates_count: number of candidates in batch
+        :param predict_duration: time, in seconds, model took to score the batch
+        """
+
+        self.candidates_count += candidates_count
+        self.batches_count += 1
+        self.predict_duration += predict_duration
+
+    def add_trace(self, trace):
+        """
+        Add statistics of a trace of a part of the level, e.g. a band of windows scored on another thread.
+        Level's start and end are extended to cover part's start and end.
+        :param trace: PyramidLevelTrace instance
+        """
+
+        self.candidates_count += trace.candidates_count
+        self.batches_count += trace.batches_count
+        self.predict_duration += trace.predict_duration
+        self.rejected_count += trace.rejected_count
+
+        self.start = min(self.start, trace.start)
+
+        if trace.end is not None:
+            self.end = trace.end if self.end is None else max(self.end, trace.end)
+
+    def get_batches_fill_ratio(self):
+        """
+        Get ratio of candidates scored to capacity of all batches used
+        :return: float
+        """
+
+        return self.candidates_count / (self.batches_count * self.batch_size) if self.batches_count > 0 else 0
+
+    def get_arguments(self):
+        """
+        Get trace statistics as a dictionary
+        :return: dictionary
+        """
+
+        return {
+            "scale": self.scale,
+            "level_shape": self.level_shape,
+            "candidates_count": self.candidates_count,
+            "rejected_count": self.rejected_count,
+            "batches_count": self.batches_count,
+            "batches_fill_ratio": self.get_batches_fill_ratio(),
+            "predict_duration": self.predict_duration,
+            "post_processing_duration": self.post_processing_duration,
+            "positives_count": self.positives_count
+        }
+
+
+class DetectionTracer:
+    """
+    Base class for detection tracers. All hooks do nothing, subclasses override hooks they need.
+    """
+
+    def on_pyramid_level(self, trace):
+        """
+        Called once search over a pyramid level, including its post-processing, is complete
+        :param trace: PyramidLevelTrace instance
+        """
+
+        pass
+
+    def on_detection(self, detector, start, duration):
+        """
+        Called once a detector finished processing an image
+        :param detector: name of the detector
+        :param start: time detection started at, as returned by time.perf_counter()
+        :param duration: detection duration in seconds
+        """
+
+        pass
+
+
+class ChromeTraceTracer(DetectionTracer):
+    """
+    Tracer that collects events in Chrome trace event format. Saved traces can be viewed in chrome://tracing
+    or Perfetto.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self.events = []
+        self.process_id = os.getpid()
+
+    def on_pyramid_level(self, trace):
+
+        self.events.append(self._get_event(
+            "{} level {:.3f}".format(trace.detector, trace.scale), trace.start, trace.end - trace.start,
+            trace.get_arguments(), trace.thread_id))
+
+        if trace.post_processing_start is not None:
+
+            self.events.append(self._get_event(
+                "{} post-processing {:.3f}".format(trace.detector, trace.scale), trace.post_processing_start,
+                trace.post_processing_duration, {"positives_count": trace.positives_count}, trace.thread_id))
+
+    def on_detection(self, detector, start, duration):
+
+        self.events.append(self._get_event(detector, start, duration, {}, threading.get_ident()))
+
+    def save(self, path):
+        """
+        Save collected events to a JSON file
+        :param path: path to file
+        """
+
+        with open(path, "w") as file:
+
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+
+    def _get_event(self, name, start, duration, arguments, thread_id):
+
+        # Chrome trace timestamps are in microseconds
+        return {
+            "name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+            "pid": self.process_id, "tid": thread_id, "args": arguments
+        }
@@ -4,8 +4,13 @@ Module with various utilities, mostly files related
 
 import logging
 import os
+import struct
 
-import cv2
+import face.lazy
+
+
+np = face.lazy.LazyModule("numpy")
+cv2 = face.lazy.LazyModule("cv2")
 
 
 def get_file_lines(path):
@@ -26,7 +31,8 @@ def get_file_lines_count(path):
     :return: number of lines file has
     """
 
-    return len(get_file_lines(path))
+    with open(path) as file:
+        return sum(1 for _ in file)
 
 
 def get_logger(path):
@@ -51,7 +57,45 @@ def get_image(path):
     """
     Get image at a given path, applying any necessary scaling.
     :param path:
-    :return: numpy array
+    :return: float32 numpy array with values in [0, 1] range. float32 is default Keras float type, so images
+    don't need converting before being passed to models.
     """
 
-    return cv2.imread(path) / 255
+    return cv2.imread(path).astype(np.float32) / 255
+
+
+def get_image_size(path):
+    """
+    Get size of image at a given path. For jpeg images size is read from image header, without decoding the image.
+    :param path: path to image
+    :return: (height, width) tuple
+    """
+
+    with open(path, "rb") as file:
+
+        # Jpeg files start with SOI marker, followed by segments, one of which - SOFn - holds image size
+        if file.read(2) == b"\xff\xd8":
+
+            while True:
+
+                marker = file.read(2)
+
+                if len(marker) != 2 or marker[0] != 0xff:
+                    break
+
+                # Padding bytes
+                if marker[1] == 0xff:
+                    file.seek(-1, os.SEEK_CUR)
+                    continue
+
+                segment_length = struct.unpack(">H", file.read(2))[0]
+
+                # SOFn markers, excluding DHT, JPG and DAC markers that share their range
+                if 0xc0 <= marker[1] <= 0xcf and marker[1] not in [0xc4, 0xc8, 0xcc]:
+
+                    _, height, width = struct.unpack(">BHH", file.read(5))
+                    return height, width
+
+                file.seek(segment_length - 2, os.SEEK_CUR)
+
+    return cv2.imread(path).shape[:2]
@@ -0,0 +1,206 @@
+"""
+Module with incremental face detection for video from static cameras. Scores of all windows of all pyramid levels
+are kept between frames, and only windows overlapping regions that changed since they were scored are passed to
+model again, so near-static frames cost a fraction of a full search.
+"""
+
+import time
+
+import face.lazy
+import face.detection
+import face.prefilter
+import face.processing
+
+
+np = face.lazy.LazyModule("numpy")
+
+
+def get_changes_mask(image, reference_image, change_threshold):
+    """
+    Get mask of pixels that changed between two images
+    :param image: image
+    :param reference_image: image of same shape to compare with
+    :param change_threshold: pixel is considered changed if any of its channels differs by more than this value
+    :return: 2D boolean numpy array
+    """
+
+    differences = np.abs(image - reference_image)
+
+    if differences.ndim == 3:
+        differences = np.max(differences, axis=2)
+
+    return differences > change_threshold
+
+
+def get_dirty_windows_mask(changes_integral, grid_shape, scale, crop_size, stride):
+    """
+    Get mask of windows of a pyramid level that overlap changed pixels of image level was scaled from
+    :param changes_integral: integral image of changes mask, as returned by face.prefilter.get_integral_image
+    :param grid_shape: (rows, columns) shape of level's scores grid
+    :param scale: scale of level w.r.t. image
+    :param crop_size: size of windows
+    :param stride: stride between windows
+    :return: 2D boolean numpy array of grid shape
+    """
+
+    height = changes_integral.shape[0] - 1
+    width = changes_integral.shape[1] - 1
+
+    # Resizing interpolates between neighbouring pixels, so a window also depends on pixels just outside it
+    margin = 2
+
+    def get_ranges(count, size):
+
+        starts = np.arange(count) * stride
+        image_starts = np.clip(np.floor(starts / scale).astype(int) - margin, 0, size)
+        image_ends = np.clip(np.ceil((starts + crop_size) / scale).astype(int) + margin, 0, size)
+
+        return image_starts, image_ends
+
+    y_starts, y_ends = get_ranges(grid_shape[0], height)
+    x_starts, x_ends = get_ranges(grid_shape[1], width)
+
+    top = changes_integral[y_starts]
+    bottom = changes_integral[y_ends]
+
+    changes_counts = bottom[:, x_ends] - top[:, x_ends] - bottom[:, x_starts] + top[:, x_starts]
+    return changes_counts > 0
+
+
+class IncrementalDetections:
+    """
+    A simple class representing results of incremental detection on a single frame
+    """
+
+    def __init__(self, detections, rescored_windows_count, total_windows_count):
+        """
+        Constructor
+        :param detections: list of FaceDetection instances
+        :param rescored_windows_count: number of windows scored by model for this frame
+        :param total_windows_count: number of windows in all pyramid levels
+        """
+
+        self.detections = detections
+        self.rescored_windows_count = rescored_windows_count
+        self.total_windows_count = total_windows_count
+
+    def get_rescored_fraction(self):
+        """
+        Get fraction of windows that were scored by model for this frame
+        :return: float
+        """
+
+        return self.rescored_windows_count / self.total_windows_count if self.total_windows_count > 0 else 0
+
+
+class IncrementalFaceDetector:
+    """
+    Detects faces in consecutive video frames. First frame, and any frame whose shape differs from previous one,
+    is searched fully, as FaceDetector would search it. For following frames only windows overlapping pixels that
+    changed by more than a threshold are rescored, other windows keep their scores, and detections are recomputed
+    from updated scores grids. Pixels are compared with a reference image that's only updated where changes were
+    detected, so slow changes below threshold accumulate until they trigger rescoring instead of being missed.
+    """
+
+    def __init__(self, model, configuration, post_processor=None, change_threshold=0.05, tracer=None):
+        """
+        Constructor
+        :param model: face detection model
+        :param configuration: FaceSearchConfiguration instance
+        :param post_processor: DetectionsPostProcessor instance, if None, one with default parameters is used
+        :param change_threshold: pixel is considered changed if any of its channels differs from reference image
+        by more than this value. Pixel values are in [0, 1] range. With threshold 0 results are same as those of
+        a full search of every frame.
+        :param tracer: optional face.tracing.DetectionTracer instance
+        """
+
+        self.model = model
+        self.configuration = configuration
+        self.post_processor = post_processor if post_processor is not None else \
+            face.detection.DetectionsPostProcessor()
+        self.change_threshold = change_threshold
+        self.tracer = tracer
+
+        self.input_image_shape = None
+        self.input_image_scale = None
+        self.reference_image = None
+        self.scores_grids = None
+
+    def get_faces_detections(self, frame):
+        """
+        Get face detections in a frame
+        :param frame: video frame, with values in [0, 1] range
+        :return: IncrementalDetections instance
+        """
+
+        start = time.perf_counter()
+
+        detector = face.detection.FaceDetector(frame, self.model, self.configuration, self.post_processor)
+
+        if self.scores_grids is None or frame.shape != self.input_image_shape:
+
+            self.scores_grids = detector.get_scores_grids()
+            self.reference_image = detector.image
+            self.input_image_shape = frame.shape
+            self.input_image_scale = detector.input_image_scale
+
+            windows_count = sum(scores_grid.scores.size for scores_grid in self.scores_grids)
+            rescored_windows_count = windows_count
+
+        else:
+
+            rescored_windows_count, windows_count = self._rescore_changed_windows(detector.image)
+
+        detections = self.post_processor.get_detections(self.scores_grids, self.input_image_scale)
+
+        if self.tracer is not None:
+
+            self.tracer.on_detection("IncrementalFaceDetector", start, time.perf_counter() - start)
+
+        return IncrementalDetections(detections, rescored_windows_count, windows_count)
+
+    def reset(self):
+        """
+        Forget previous frames, so that next frame is searched fully
+        """
+
+        self.reference_image = None
+        self.scores_grids = None
+
+    def _rescore_changed_windows(self, image):
+
+        changes_mask = get_changes_mask(image, self.reference_image, self.change_threshold)
+
+        windows_count = sum(scores_grid.scores.size for scores_grid in self.scores_grids)
+
+        if not np.any(changes_mask):
+            return 0, windows_count
+
+        # Reference is only updated where changes were detected, see class description
+        self.reference_image = np.where(
+            changes_mask.reshape(changes_mask.shape + (1,) * (image.ndim - 2)), image, self.reference_image)
+
+        changes_integral = face.prefilter.get_integral_image(changes_mask)
+        rescored_windows_count = 0
+
+        for scores_grid in self.scores_grids:
+
+            dirty_mask = get_dirty_windows_mask(
+                changes_integral, scores_grid.scores.shape, scores_grid.scale, scores_grid.crop_size,
+                scores_grid.stride)
+
+            rows, columns = np.nonzero(dirty_mask)
+
+            if len(rows) == 0:
+                continue
+
+            level_image = face.processing.get_scaled_image(image, scores_grid.scale)
+
+            for index, scores in face.detection.get_windows_scores_generator(
+                    level_image, self.model, self.configuration, rows, columns):
+
+                scores_grid.scores[rows[index:index + len(scores)], columns[index:index + len(scores)]] = scores
+
+            rescored_windows_count += len(rows)
+
+        return rescored_windows_count, windows_count
@@ -3,6 +3,7 @@ Script for checking face detection algorithms accuracy
 """
 
 import os
+import time
 
 import shapely.geometry
 import cv2
@@ -14,6 +15,8 @@ import face.utilities
 import face.geometry
 import face.models
 import face.detection
+import face.evaluation
+import face.manifest
 
 
 def does_opencv_detect_face_correctly(image, face_bounding_box, cascade_classifier):
@@ -61,9 +64,7 @@ def check_opencv_accuracy(image_paths, bounding_boxes_map):
     print("OpenCV accuracy is {}".format(np.mean(detection_scores)))
 
 
-def does_model_detect_face_correctly(image, face_bounding_box, model, configuration):
-
-    detections = face.detection.FaceDetector(image, model, configuration).get_faces_detections()
+def are_model_detections_correct(detections, face_bounding_box):
 
     # There should be exactly one face detection in image
     if len(detections) != 1:
@@ -78,36 +79,170 @@ def does_model_detect_face_correctly(image, face_bounding_box, model, configurat
         return is_detection_correct
 
 
-def check_model_accuracy(image_paths, bounding_boxes_map, file_path=None):
+# Model used by evaluation worker process
+worker_model = None
 
-    detection_scores = []
+# Directory evaluation worker process saves raw scores grids to, if None, scores grids aren't saved
+worker_scores_grids_directory = None
 
-    model = face.models.get_pretrained_vgg_model(face.config.image_shape)
-    model.load_weights(face.config.model_path)
 
-    for path in tqdm.tqdm(image_paths):
+def initialize_model_evaluation_worker(scores_grids_directory=None, model_path=face.config.model_path):
 
-        image = face.utilities.get_image(path)
+    global worker_model, worker_scores_grids_directory
 
-        image_bounding_box = shapely.geometry.box(0, 0, image.shape[1], image.shape[0])
-        face_bounding_box = bounding_boxes_map[os.path.basename(path)]
+    worker_model = face.models.get_trained_model(model_path)
 
-        # Only try to search for faces if they are larger than 1% of image. If they are smaller,
-        # ground truth bounding box probably is incorrect
-        if face.geometry.get_intersection_over_union(image_bounding_box, face_bounding_box) > 0.01:
+    worker_scores_grids_directory = scores_grids_directory
 
-            value = 1 if does_model_detect_face_correctly(
-                image, face_bounding_box, model, face.config.face_search_config) else 0
 
-            detection_scores.append(value)
+def evaluate_model_on_image(item):
+    """
+    Evaluate model on a single image
+    :param item: (image path, face bounds) tuple
+    :return: evaluation record
+    """
+
+    path, face_bounds = item
+
+    image = face.utilities.get_image(path)
+    face_bounding_box = shapely.geometry.box(*face_bounds)
+
+    record = {"path": path, "ground_truth": list(face_bounds)}
+
+    image_bounds = (0, 0, image.shape[1], image.shape[0])
+
+    # Only try to search for faces if they are larger than 1% of image. If they are smaller,
+    # ground truth bounding box probably is incorrect
+    if face.geometry.get_intersections_over_unions(image_bounds, face_bounds) <= 0.01:
+
+        record["skipped"] = True
+        return record
+
+    start = time.perf_counter()
+
+    detector = face.detection.FaceDetector(image, worker_model, face.config.face_search_config)
+    scores_grids = detector.get_scores_grids()
+    detections = detector.post_processor.get_detections(scores_grids, detector.input_image_scale)
+
+    record["seconds"] = time.perf_counter() - start
+    record["detections"] = [
+        list(detection.bounding_box.bounds) + [float(np.squeeze(detection.score))] for detection in detections]
+    record["correct"] = are_model_detections_correct(detections, face_bounding_box)
+
+    if worker_scores_grids_directory is not None:
+
+        face.detection.save_scores_grids(
+            get_scores_grids_path(worker_scores_grids_directory, path), scores_grids, detector.input_image_scale)
+
+    return record
+
+
+def get_scores_grids_path(directory, image_path):
+
+    return os.path.join(directory, os.path.basename(image_path) + ".npz")
+
+
+def check_model_accuracy(
+        image_paths, bounding_boxes_map, journal_path, workers_count, scores_grids_directory=None,
+        model_path=face.config.model_path):
+    """
+    Evaluate model accuracy over images. Per image results are journaled, so rerunning with the same journal path
+    resumes an interrupted evaluation.
+    :param image_paths: list of image paths
+    :param bounding_boxes_map: {image file name: face bounding box} dictionary
+    :param journal_path: path to evaluation journal
+    :param workers_count: number of evaluation processes
+    :param scores_grids_directory: optional directory raw scores grids of each image are saved to,
+    for use with scripts/tune_postprocessing.py
+    :param model_path: path to evaluated model
+    :return: dictionary with accuracy, throughput, mean detection time per image and detections metrics.
+    Accuracy and mean detection time are None if no images were evaluated, e.g. all of them were skipped.
+    """
+
+    items = [(path, bounding_boxes_map[os.path.basename(path)].bounds) for path in image_paths]
+
+    if scores_grids_directory is not None:
+
+        os.makedirs(scores_grids_directory, exist_ok=True)
+
+    runner = face.evaluation.ParallelEvaluationRunner(
+        evaluate_model_on_image, workers_count, initializer=initialize_model_evaluation_worker,
+        initializer_arguments=(scores_grids_directory, model_path))
+
+    with face.evaluation.EvaluationJournal(journal_path) as journal:
+
+        records, throughput = runner.run(items, item_key=lambda item: item[0], journal=journal)
+
+    # Journal might hold records of images from another run's images list
+    paths = set(path for path, _ in items)
+    records = [record for record in records if record["path"] in paths]
+
+    evaluated_records = [record for record in records if not record.get("skipped", False)]
+
+    # With no evaluated images there is no accuracy or mean time to report
+    accuracy = np.mean([1 if record["correct"] else 0 for record in evaluated_records]) \
+        if len(evaluated_records) > 0 else None
+
+    mean_seconds = np.mean([record["seconds"] for record in evaluated_records]) \
+        if len(evaluated_records) > 0 else None
+
+    print("Model accuracy is {}".format(accuracy if accuracy is not None else "n/a, no images were evaluated"))
+    print("Evaluated {:.2f} images/s with {} workers".format(throughput, workers_count))
+
+    metrics = face.evaluation.get_detections_metrics(face.evaluation.DetectionsData.from_records(records))
+    print(face.evaluation.get_detections_metrics_report(metrics))
+
+    return {
+        "accuracy": accuracy,
+        "throughput": throughput,
+        "mean_seconds": mean_seconds,
+        "metrics": metrics
+    }
+
+
+def compare_models(image_paths, bounding_boxes_map, models_paths, journals_directory, workers_count):
+    """
+    Evaluate several models on the same images and print a speed/accuracy table
+    :param image_paths: list of image paths
+    :param bounding_boxes_map: {image file name: face bounding box} dictionary
+    :param models_paths: {model name: model path} dictionary
+    :param journals_directory: directory evaluation journals are stored in, one journal per model
+    :param workers_count: number of evaluation processes
+    """
+
+    os.makedirs(journals_directory, exist_ok=True)
+    results = {}
+
+    for name, model_path in models_paths.items():
+
+        journal_path = os.path.join(journals_directory, "{}_accuracy_journal.txt".format(name))
+        results[name] = check_model_accuracy(
+            image_paths, bounding_boxes_map, journal_path, workers_count, model_path=model_path)
+
+    print(get_models_comparison_table(results))
+
+
+def get_models_comparison_table(results):
+    """
+    Get speed/accuracy table of models
+    :param results: {model name: results dictionary returned by check_model_accuracy} dictionary
+    :return: table string
+    """
+
+    def format_value(value, format_specification):
+        return format(value, format_specification) if value is not None else "n/a"
+
+    lines = ["{:<16}{:>10}{:>10}{:>14}{:>12}".format("model", "accuracy", "ap@0.5", "ms per image", "images/s")]
 
-            if file_path is not None:
+    for name, result in results.items():
 
-                with open(file_path, mode="a") as file:
+        mean_milliseconds = 1000 * result["mean_seconds"] if result["mean_seconds"] is not None else None
 
-                    file.write("{}\n".format(np.mean(detection_scores)))
+        lines.append("{:<16}{:>10}{:>10.3f}{:>14}{:>12.2f}".format(
+            name, format_value(result["accuracy"], ".3f"), result["metrics"][0]["ap@0.5"],
+            format_value(mean_milliseconds, ".1f"), result["throughput"]))
 
-    print("Model accuracy is {}".format(np.mean(detection_scores)))
+    return "\n".join(lines)
 
 
 def main():
@@ -118,14 +253,21 @@ def main():
 
     data_directory = os.path.join(face.config.data_directory, dataset)
 
-    image_paths_file = os.path.join(data_directory, "training_image_paths.txt")
-    bounding_boxes_file = os.path.join(data_directory, "training_bounding_boxes_list.txt")
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+    training_manifest = manifest.get_split("training")
 
-    image_paths = [path.strip() for path in face.utilities.get_file_lines(image_paths_file)]
-    bounding_boxes_map = face.geometry.get_bounding_boxes_map(bounding_boxes_file)
+    image_paths = training_manifest.get_paths()
+    bounding_boxes_map = training_manifest.get_bounding_boxes_map()
 
     # check_opencv_accuracy(image_paths, bounding_boxes_map)
-    check_model_accuracy(image_paths, bounding_boxes_map, file_path="/tmp/face_accuracy_log.txt")
+    check_model_accuracy(
+        image_paths, bounding_boxes_map, journal_path="/tmp/faces/{}_accuracy_journal.txt".format(dataset),
+        workers_count=4, scores_grids_directory="/tmp/faces/{}_scores_grids".format(dataset))
+
+    # compare_models(
+    #     image_paths, bounding_boxes_map,
+    #     models_paths={"teacher": face.config.model_path, "student": face.config.student_model_path},
+    #     journals_directory="/tmp/faces/{}_models_comparison".format(dataset), workers_count=4)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+"""
+Script for calibrating windows pre-filter thresholds on training crops. Thresholds are set so that requested fraction
+of face crops passes the filter, then recall and fraction of rejected non-face crops are reported on validation crops.
+"""
+
+import os
+
+import numpy as np
+
+import face.config
+import face.data_generators
+import face.manifest
+import face.prefilter
+
+
+def get_crops_and_labels(manifest, batches_count):
+
+    generator = face.data_generators.get_batches_generator(
+        manifest, None, face.config.batch_size, face.config.crop_size)
+
+    batches = [next(generator) for _ in range(batches_count)]
+
+    crops = np.concatenate([np.asarray(images) for images, _ in batches])
+    labels = np.concatenate([np.ravel(labels) for _, labels in batches])
+
+    return crops, labels
+
+
+def main():
+
+    # dataset = "large_dataset"
+    dataset = "medium_dataset"
+    # dataset = "small_dataset"
+
+    data_directory = os.path.join(face.config.data_directory, dataset)
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+
+    batches_count = 100
+
+    training_crops, training_labels = get_crops_and_labels(manifest.get_split("training"), batches_count)
+    validation_crops, validation_labels = get_crops_and_labels(manifest.get_split("validation"), batches_count)
+
+    for use_skin_tone in [False, True]:
+
+        prefilter = face.prefilter.WindowsPrefilter.calibrate(
+            training_crops, training_labels, recall=face.config.prefilter_recall, use_skin_tone=use_skin_tone)
+
+        mask = prefilter.get_crops_mask(validation_crops)
+
+        print("Skin tone: {}, min standard deviation: {:.4f}, min skin fraction: {}".format(
+            use_skin_tone, prefilter.min_standard_deviation, prefilter.min_skin_fraction))
+
+        print("Validation faces recall: {:.4f}, non-faces rejected: {:.4f}".format(
+            np.mean(mask[validation_labels == 1]), 1 - np.mean(mask[validation_labels == 0])))
+
+    # Skin tone is sensitive to lighting and white balance, so only variance threshold is used by default
+    prefilter = face.prefilter.WindowsPrefilter.calibrate(
+        training_crops, training_labels, recall=face.config.prefilter_recall)
+
+    os.makedirs(os.path.dirname(face.config.prefilter_path), exist_ok=True)
+    prefilter.save(face.config.prefilter_path)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,75 @@
+"""
+Script for distilling trained VGG based model into a small student model. Teacher scores over training crops
+are cached on first run, then student is trained on a mix of teacher scores and ground truth labels.
+"""
+
+import os
+
+import keras
+
+import face.config
+import face.data_generators
+import face.distillation
+import face.manifest
+import face.models
+
+
+def get_callbacks():
+
+    model_path = face.config.student_model_path
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    model_checkpoint = keras.callbacks.ModelCheckpoint(filepath=model_path, save_best_only=True, verbose=1)
+
+    reduce_learning_rate_callback = keras.callbacks.ReduceLROnPlateau(factor=0.7, patience=2, verbose=1)
+    early_stop_callback = keras.callbacks.EarlyStopping(patience=8, verbose=1)
+
+    return [model_checkpoint, reduce_learning_rate_callback, early_stop_callback]
+
+
+def main():
+
+    # dataset = "large_dataset"
+    dataset = "medium_dataset"
+    # dataset = "small_dataset"
+
+    data_directory = os.path.join(face.config.data_directory, dataset)
+
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+
+    training_manifest = manifest.get_split("training")
+    validation_manifest = manifest.get_split("validation")
+
+    batch_size = face.config.batch_size
+    cache_directory = os.path.join(os.path.dirname(face.config.model_path), "teacher_scores_{}".format(dataset))
+
+    if not face.distillation.TeacherScoresCache.exists(cache_directory):
+
+        teacher = face.models.get_trained_model(face.config.model_path)
+
+        # Each image yields four crops - one with a face and three without
+        batches_count = 4 * len(training_manifest) // batch_size
+
+        face.distillation.TeacherScoresCache.build(
+            cache_directory, teacher,
+            face.data_generators.get_batches_generator(training_manifest, None, batch_size, face.config.crop_size),
+            batches_count, batch_size)
+
+    cache = face.distillation.TeacherScoresCache(cache_directory)
+
+    student = face.models.get_small_scale_model(image_shape=face.config.image_shape)
+
+    validation_data_generator = face.data_generators.get_batches_generator(
+        validation_manifest, None, batch_size, face.config.crop_size)
+
+    student.fit_generator(
+        cache.get_batches_generator(batch_size), samples_per_epoch=len(cache),
+        nb_epoch=100,
+        validation_data=validation_data_generator,
+        nb_val_samples=4 * len(validation_manifest),
+        callbacks=get_callbacks()
+    )
+
+
+if __name__ == "__main__":
+
+    main()
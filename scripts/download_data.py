@@ -2,13 +2,34 @@
 This scripts downloads and preprocesses Celeb+ data used for training and testing
 """
 
+import argparse
+import json
+
 import face.datasets.celeb
 import face.config
 
 
 def main():
 
-    face.datasets.celeb.DatasetBuilder(face.config.data_directory).build_datasets()
+    parser = argparse.ArgumentParser(description="Download and preprocess Celeb+ data")
+
+    parser.add_argument(
+        "--record-checksums", metavar="PATH",
+        help="save sha256 digests of files downloaded by this run to a json file, so that they can be added to "
+             "face.datasets.celeb.celeb_checksums once download was verified, e.g. by extracting it successfully")
+
+    arguments = parser.parse_args()
+
+    builder = face.datasets.celeb.DatasetBuilder(face.config.data_directory)
+    builder.build_datasets()
+
+    if arguments.record_checksums is not None:
+
+        with open(arguments.record_checksums, "w") as file:
+            json.dump(builder.downloaded_checksums, file, indent=4, sort_keys=True)
+
+        print("Recorded checksums of {} downloaded files in {}".format(
+            len(builder.downloaded_checksums), arguments.record_checksums))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""
+Script for pruning convolution filters of trained VGG based model. Filters are removed in steps, with fine-tuning
+after each step, for as long as validation accuracy stays within a tolerance of unpruned model's accuracy.
+Prints FLOPs and latency report comparing original and pruned models.
+"""
+
+import os
+
+import face.config
+import face.data_generators
+import face.manifest
+import face.models
+import face.pruning
+
+
+def main():
+
+    # dataset = "large_dataset"
+    dataset = "medium_dataset"
+    # dataset = "small_dataset"
+
+    data_directory = os.path.join(face.config.data_directory, dataset)
+
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+
+    training_manifest = manifest.get_split("training")
+    validation_manifest = manifest.get_split("validation")
+
+    batch_size = face.config.batch_size
+
+    training_generator = face.data_generators.get_batches_generator(
+        training_manifest, None, batch_size, face.config.crop_size)
+
+    validation_generator = face.data_generators.get_batches_generator(
+        validation_manifest, None, batch_size, face.config.crop_size)
+
+    model = face.models.get_trained_model(face.config.model_path)
+
+    # Each image yields four crops - one with a face and three without
+    pruner = face.pruning.ChannelPruner(
+        training_generator, validation_generator,
+        fine_tuning_samples_count=4 * len(training_manifest) // 10,
+        validation_samples_count=4 * len(validation_manifest))
+
+    blocks_sizes = [len(block_channels) for block_channels in face.models.vgg_blocks_channels]
+    pruned_model = pruner.prune(model, blocks_sizes)
+
+    pruned_model.save(face.config.pruned_model_path)
+
+    pruned_channels = [
+        layer.get_weights()[0].shape[-1] for layer in face.pruning.get_convolution_layers(pruned_model)[:-1]]
+
+    latencies = [face.pruning.measure_latency(evaluated_model, batch_size) for evaluated_model in [model, pruned_model]]
+    accuracies = [pruner.history[0][1], pruner.get_accuracy(pruned_model)]
+
+    print(face.pruning.get_pruning_report(
+        face.config.image_shape, face.models.vgg_blocks_channels,
+        face.pruning.get_blocks_channels(pruned_channels, blocks_sizes), latencies, accuracies))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -3,16 +3,22 @@ Script for training models
 """
 
 import os
+import multiprocessing
+import multiprocessing.connection
 
+import numpy as np
 import keras
 
 import face.utilities
 import face.models
 import face.data_generators
 import face.config
+import face.instrumentation
+import face.callbacks
+import face.manifest
 
 
-def get_callbacks():
+def get_callbacks(statistics=None):
 
     model_path = face.config.model_path
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
@@ -21,7 +27,13 @@ def get_callbacks():
     reduce_learning_rate_callback = keras.callbacks.ReduceLROnPlateau(factor=0.7, patience=2, verbose=1)
     early_stop_callback = keras.callbacks.EarlyStopping(patience=8, verbose=1)
 
-    return [model_checkpoint, reduce_learning_rate_callback, early_stop_callback]
+    callbacks = [model_checkpoint, reduce_learning_rate_callback, early_stop_callback]
+
+    if statistics is not None:
+
+        callbacks.append(face.callbacks.InputPipelineStatisticsCallback(statistics))
+
+    return callbacks
 
 
 def main():
@@ -32,32 +44,220 @@ def main():
 
     data_directory = os.path.join(face.config.data_directory, dataset)
 
-    training_image_paths_file = os.path.join(data_directory, "training_image_paths.txt")
-    training_bounding_boxes_file = os.path.join(data_directory, "training_bounding_boxes_list.txt")
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
 
-    validation_image_paths_file = os.path.join(data_directory, "validation_image_paths.txt")
-    validation_bounding_boxes_file = os.path.join(data_directory, "validation_bounding_boxes_list.txt")
+    training_manifest = manifest.get_split("training")
+    validation_manifest = manifest.get_split("validation")
 
     batch_size = face.config.batch_size
 
     model = face.models.get_pretrained_vgg_model(image_shape=face.config.image_shape)
     # model.load_weights(face.config.model_path)
 
+    # Statistics of training input pipeline, reported at the end of each epoch
+    statistics = face.instrumentation.PipelineStatistics()
+
     training_data_generator = face.data_generators.get_batches_generator(
-        training_image_paths_file, training_bounding_boxes_file, batch_size, face.config.crop_size)
+        training_manifest, None, batch_size, face.config.crop_size, statistics=statistics)
 
     validation_data_generator = face.data_generators.get_batches_generator(
-        validation_image_paths_file, validation_bounding_boxes_file, batch_size, face.config.crop_size)
+        validation_manifest, None, batch_size, face.config.crop_size)
 
     model.fit_generator(
-        training_data_generator, samples_per_epoch=face.utilities.get_file_lines_count(training_image_paths_file),
+        training_data_generator, samples_per_epoch=len(training_manifest),
         nb_epoch=100,
         validation_data=validation_data_generator,
-        nb_val_samples=face.utilities.get_file_lines_count(validation_image_paths_file),
-        callbacks=get_callbacks()
+        nb_val_samples=len(validation_manifest),
+        callbacks=get_callbacks(statistics)
     )
 
 
+def average_workers_weights(weights_paths):
+    """
+    Average model weights saved by data parallel workers
+    :param weights_paths: paths to .npz files with weights of each worker
+    :return: list of numpy arrays
+    """
+
+    workers_weights = []
+
+    for path in weights_paths:
+
+        with np.load(path) as data:
+
+            layers_count = len([name for name in data.files if name.startswith("arr_")])
+            workers_weights.append([data["arr_{}".format(index)] for index in range(layers_count)])
+
+    return [np.mean(layer_weights, axis=0) for layer_weights in zip(*workers_weights)]
+
+
+def save_checkpoint(path, weights, epoch, index=0):
+    """
+    Save weights together with data generator position they were trained up to. File is replaced atomically,
+    so weights and position can't get out of sync if worker is killed while saving.
+    :param path: path to .npz file
+    :param weights: list of numpy arrays
+    :param epoch: epoch of data generator position
+    :param index: index within epoch of data generator position
+    """
+
+    temporary_path = path + ".tmp.npz"
+    np.savez(temporary_path, *weights, epoch=epoch, index=index)
+
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint_position(path):
+    """
+    Get data generator position weights in checkpoint saved with save_checkpoint were trained up to
+    :param path: path to .npz file
+    :return: tuple (epoch, index)
+    """
+
+    with np.load(path) as data:
+
+        return int(data["epoch"]), int(data["index"])
+
+
+def train_data_parallel_worker(rank, world_size, epochs_count, working_directory, barrier, checkpoint_period):
+    """
+    Single worker of data parallel training. Each worker trains a model replica for an epoch on its shard of data,
+    after which replicas weights are averaged and training continues from averaged weights.
+    Averaged weights are checkpointed after every epoch. Within an epoch each worker checkpoints its replica weights
+    together with data generator position every checkpoint_period batches, so a restarted worker resumes mid-epoch
+    and neither skips nor repeats batches it trained on.
+    """
+
+    # dataset = "large_dataset"
+    dataset = "medium_dataset"
+    # dataset = "small_dataset"
+
+    data_directory = os.path.join(face.config.data_directory, dataset)
+
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+
+    checkpoint_path = os.path.join(working_directory, "averaged_weights.npz")
+
+    workers_weights_paths = [
+        os.path.join(working_directory, "rank_{}_weights.npz".format(worker_rank)) for worker_rank in range(world_size)]
+
+    worker_checkpoint_path = workers_weights_paths[rank]
+
+    # ImageNet weights are only needed when training starts from scratch, resumed training overwrites them anyway
+    weights = None if os.path.exists(checkpoint_path) else 'imagenet'
+    model = face.models.get_pretrained_vgg_model(image_shape=face.config.image_shape, weights=weights)
+
+    training_data_generator = face.data_generators.ShardedBatchesGenerator(
+        manifest.get_split("training"), None, face.config.batch_size, face.config.crop_size,
+        rank=rank, world_size=world_size)
+
+    first_epoch = 0
+
+    # Resume from last averaged weights if a previous run was interrupted
+    if os.path.exists(checkpoint_path):
+
+        model.set_weights(average_workers_weights([checkpoint_path]))
+        first_epoch = load_checkpoint_position(checkpoint_path)[0]
+
+    position = (first_epoch, 0)
+
+    # Worker's own checkpoint is ahead of averaged weights if worker was interrupted mid-epoch,
+    # or after it finished an epoch, but before weights were averaged
+    if os.path.exists(worker_checkpoint_path) and load_checkpoint_position(worker_checkpoint_path) > position:
+
+        model.set_weights(average_workers_weights([worker_checkpoint_path]))
+        position = load_checkpoint_position(worker_checkpoint_path)
+
+    for epoch in range(first_epoch, epochs_count):
+
+        # Worker that finished the epoch before being interrupted only needs to take part in averaging
+        if position[0] == epoch:
+
+            state = training_data_generator.get_state()
+            state.update(epoch=epoch, index=position[1])
+
+            # Generator must be positioned before keras starts prefetching from it
+            training_data_generator.set_state(state)
+            batches_count = training_data_generator.get_remaining_batches_count()
+
+            def save_worker_checkpoint(trained_batches_count, state=state):
+
+                trained_state = training_data_generator.get_advanced_state(state, trained_batches_count)
+
+                save_checkpoint(
+                    worker_checkpoint_path, model.get_weights(), trained_state["epoch"], trained_state["index"])
+
+            # Keras epoch spans exactly one epoch of generator, so that worker walks its whole shard every epoch
+            model.fit_generator(
+                training_data_generator, samples_per_epoch=batches_count * face.config.batch_size, nb_epoch=1,
+                verbose=1 if rank == 0 else 0,
+                callbacks=[face.callbacks.BatchesCheckpointCallback(save_worker_checkpoint, checkpoint_period)])
+
+            save_worker_checkpoint(batches_count)
+
+        position = (epoch + 1, 0)
+
+        barrier.wait()
+
+        model.set_weights(average_workers_weights(workers_weights_paths))
+
+        # All workers must load weights before rank 0 overwrites any files
+        barrier.wait()
+
+        if rank == 0:
+
+            save_checkpoint(checkpoint_path, model.get_weights(), epoch + 1)
+            model.save(face.config.model_path)
+
+        barrier.wait()
+
+
+def train_data_parallel(world_size, epochs_count=100, checkpoint_period=100):
+    """
+    Train model with multiple local worker processes, each working on its own shard of training data.
+    Should any worker fail, remaining workers are stopped and an error is raised.
+    :param world_size: number of worker processes
+    :param epochs_count: number of epochs to train for
+    :param checkpoint_period: number of batches between checkpoints of each worker
+    """
+
+    working_directory = os.path.join(os.path.dirname(face.config.model_path), "data_parallel")
+    os.makedirs(working_directory, exist_ok=True)
+
+    # Spawn rather than fork, as keras backends don't survive forking
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(world_size)
+
+    processes = [
+        context.Process(
+            target=train_data_parallel_worker,
+            args=(rank, world_size, epochs_count, working_directory, barrier, checkpoint_period))
+        for rank in range(world_size)]
+
+    for process in processes:
+        process.start()
+
+    running_processes = list(processes)
+
+    while len(running_processes) > 0:
+
+        multiprocessing.connection.wait([process.sentinel for process in running_processes])
+        running_processes = [process for process in running_processes if process.is_alive()]
+
+        # Workers waiting for a dead worker on barrier would otherwise wait forever
+        if any([process.exitcode not in [None, 0] for process in processes]):
+            barrier.abort()
+
+    for process in processes:
+        process.join()
+
+    failed_ranks = [rank for rank, process in enumerate(processes) if process.exitcode != 0]
+
+    if len(failed_ranks) > 0:
+
+        raise RuntimeError("Data parallel workers {} failed".format(failed_ranks))
+
+
 if __name__ == "__main__":
 
     main()
@@ -0,0 +1,92 @@
+"""
+Script for tuning detections post-processing parameters - score threshold and merging IOU threshold.
+Works on raw scores grids saved by scripts/accuracy.py, so no predictions need to be recomputed.
+"""
+
+import os
+import itertools
+import time
+
+import numpy as np
+import tqdm
+
+import face.config
+import face.detection
+import face.manifest
+
+import scripts.accuracy
+
+
+def get_scores_grids_data(image_paths, bounding_boxes_map, scores_grids_directory):
+    """
+    Load scores grids of all images that have them saved
+    :param image_paths: list of image paths
+    :param bounding_boxes_map: {image file name: face bounding box} dictionary
+    :param scores_grids_directory: directory with saved scores grids
+    :return: list of (scores grids, input image scale, face bounding box) tuples
+    """
+
+    data = []
+
+    for path in tqdm.tqdm(image_paths):
+
+        scores_grids_path = scripts.accuracy.get_scores_grids_path(scores_grids_directory, path)
+
+        if os.path.exists(scores_grids_path):
+
+            scores_grids, input_image_scale = face.detection.load_scores_grids(scores_grids_path)
+            data.append((scores_grids, input_image_scale, bounding_boxes_map[os.path.basename(path)]))
+
+    return data
+
+
+def get_accuracy(scores_grids_data, post_processor):
+
+    detection_scores = []
+
+    for scores_grids, input_image_scale, face_bounding_box in scores_grids_data:
+
+        detections = post_processor.get_detections(scores_grids, input_image_scale)
+        is_correct = scripts.accuracy.are_model_detections_correct(detections, face_bounding_box)
+
+        detection_scores.append(1 if is_correct else 0)
+
+    return np.mean(detection_scores)
+
+
+def main():
+
+    # dataset = "large_dataset"
+    # dataset = "medium_dataset"
+    dataset = "small_dataset"
+
+    data_directory = os.path.join(face.config.data_directory, dataset)
+
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+    training_manifest = manifest.get_split("training")
+
+    image_paths = training_manifest.get_paths()
+    bounding_boxes_map = training_manifest.get_bounding_boxes_map()
+
+    scores_grids_directory = "/tmp/faces/{}_scores_grids".format(dataset)
+    scores_grids_data = get_scores_grids_data(image_paths, bounding_boxes_map, scores_grids_directory)
+
+    score_thresholds = [0.5, 0.7, 0.8, 0.9, 0.95, 0.99]
+    iou_thresholds = [0.1, 0.2, 0.3, 0.4, 0.5]
+
+    print("{:>16}{:>16}{:>12}{:>10}".format("score threshold", "iou threshold", "accuracy", "seconds"))
+
+    for score_threshold, iou_threshold in itertools.product(score_thresholds, iou_thresholds):
+
+        start = time.perf_counter()
+
+        post_processor = face.detection.DetectionsPostProcessor(score_threshold, iou_threshold)
+        accuracy = get_accuracy(scores_grids_data, post_processor)
+
+        print("{:>16}{:>16}{:>12.4f}{:>10.2f}".format(
+            score_threshold, iou_threshold, accuracy, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+
+    main()
@@ -18,6 +18,7 @@ import face.models
 import face.config
 import face.detection
 import face.geometry
+import face.manifest
 
 
 def log_data_batches(data_generator, logger):
@@ -33,8 +34,7 @@ def log_data_batches(data_generator, logger):
 
 def log_crops_predictions(data_generator, logger):
 
-    model = face.models.get_pretrained_vgg_model(face.config.image_shape)
-    model.load_weights(face.config.model_path)
+    model = face.models.get_trained_model(face.config.model_path)
 
     for _ in range(8):
 
@@ -47,12 +47,11 @@ def log_crops_predictions(data_generator, logger):
         logger.info(vlogging.VisualRecord("Crops predictions", images, str(predictions)))
 
 
-def log_heatmaps(image_paths_file, logger):
+def log_heatmaps(image_paths, logger):
 
-    model = face.models.get_pretrained_vgg_model(face.config.image_shape)
-    model.load_weights(face.config.model_path)
+    model = face.models.get_trained_model(face.config.model_path)
 
-    paths = [path.strip() for path in face.utilities.get_file_lines(image_paths_file)]
+    paths = list(image_paths)
     random.shuffle(paths)
 
     for path in tqdm.tqdm(paths[:10]):
@@ -68,12 +67,11 @@ def log_heatmaps(image_paths_file, logger):
         logger.info(vlogging.VisualRecord("Heatmap", scaled_images, str(image.shape)))
 
 
-def log_face_detections(image_paths_file, logger):
+def log_face_detections(image_paths, logger):
 
-    model = face.models.get_pretrained_vgg_model(face.config.image_shape)
-    model.load_weights(face.config.model_path)
+    model = face.models.get_trained_model(face.config.model_path)
 
-    paths = [path.strip() for path in face.utilities.get_file_lines(image_paths_file)]
+    paths = list(image_paths)
     random.shuffle(paths)
 
     for path in tqdm.tqdm(paths[:10]):
@@ -91,6 +89,32 @@ def log_face_detections(image_paths_file, logger):
                                           "{} - {}".format(path, str(image.shape))))
 
 
+def log_face_detections_and_heatmaps(image_paths, logger):
+
+    model = face.models.get_trained_model(face.config.model_path)
+
+    paths = list(image_paths)
+    random.shuffle(paths)
+
+    for path in tqdm.tqdm(paths[:10]):
+
+        image = face.utilities.get_image(path)
+
+        # Detections and heatmap are both computed from a single search
+        results = face.detection.FaceDetector(image, model, face.config.face_search_config).scan()
+        heatmap = results.get_heatmap()
+
+        for face_detection in results.get_detections():
+
+            face.geometry.draw_bounding_box(image, face_detection.bounding_box, color=(0, 1, 0), thickness=4)
+
+        scaled_images = [255 * image, 255 * heatmap]
+        scaled_images = [face.processing.scale_image_keeping_aspect_ratio(image, 200) for image in scaled_images]
+
+        logger.info(vlogging.VisualRecord("Detections and heatmap", scaled_images,
+                                          "{} - {}".format(path, str(image.shape))))
+
+
 def main():
 
     logger = face.utilities.get_logger(face.config.log_path)
@@ -101,16 +125,17 @@ def main():
 
     data_directory = os.path.join(face.config.data_directory, dataset)
 
-    image_paths_file = os.path.join(data_directory, "training_image_paths.txt")
-    bounding_boxes_file = os.path.join(data_directory, "training_bounding_boxes_list.txt")
+    manifest = face.manifest.DatasetManifest.load(os.path.join(data_directory, "dataset.manifest"))
+    training_manifest = manifest.get_split("training")
 
     generator = face.data_generators.get_batches_generator(
-        image_paths_file, bounding_boxes_file, batch_size=8, crop_size=face.config.crop_size)
+        training_manifest, None, batch_size=8, crop_size=face.config.crop_size)
 
     # log_data_batches(generator, logger)
     # log_crops_predictions(generator, logger)
-    # log_heatmaps(image_paths_file, logger)
-    log_face_detections(image_paths_file, logger)
+    # log_heatmaps(training_manifest.get_paths(), logger)
+    log_face_detections(training_manifest.get_paths(), logger)
+    # log_face_detections_and_heatmaps(training_manifest.get_paths(), logger)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,373 @@
+"""
+Tests for face.datasets.archives module
+"""
+
+import hashlib
+import http.server
+import os
+import threading
+
+import mock
+import numpy as np
+import pytest
+
+import face.datasets.archives
+import face.download
+
+import tests.face.test_download
+
+
+class TestMultiPartFile:
+    """
+    Tests for face.datasets.archives.MultiPartFile
+    """
+
+    def setup_method(self, method):
+
+        self.parts = [b"abcd", b"efg", b"hijkl"]
+
+    def get_file(self, directory):
+
+        paths = [os.path.join(directory, "part_{}".format(index)) for index in range(len(self.parts))]
+
+        for path, part in zip(paths, self.parts):
+
+            with open(path, "wb") as file:
+                file.write(part)
+
+        return face.datasets.archives.MultiPartFile(paths, [len(part) for part in self.parts], timeout=5), paths
+
+    def test_read_across_parts(self, tmpdir):
+
+        multi_part_file, _ = self.get_file(str(tmpdir))
+
+        for index in range(len(self.parts)):
+            multi_part_file.set_part_available(index)
+
+        assert b"abcdefghijkl" == multi_part_file.read()
+
+        multi_part_file.seek(-3, os.SEEK_END)
+        assert b"jkl" == multi_part_file.read(10)
+
+        multi_part_file.seek(2)
+        assert b"cdefgh" == multi_part_file.read(6)
+
+    def test_read_waits_for_part_to_become_available(self, tmpdir):
+
+        multi_part_file, _ = self.get_file(str(tmpdir))
+        multi_part_file.set_part_available(0)
+
+        assert b"abcd" == multi_part_file.read(4)
+
+        timer = threading.Timer(0.1, multi_part_file.set_part_available, args=[1])
+        timer.start()
+
+        assert b"efg" == multi_part_file.read(3)
+        timer.join()
+
+    def test_read_from_aborted_part_fails(self, tmpdir):
+
+        multi_part_file, _ = self.get_file(str(tmpdir))
+        multi_part_file.abort()
+
+        with pytest.raises(IOError):
+            multi_part_file.read(1)
+
+    def test_read_times_out_on_part_that_never_becomes_available(self, tmpdir):
+
+        multi_part_file, _ = self.get_file(str(tmpdir))
+        multi_part_file.timeout = 0.01
+
+        with pytest.raises(TimeoutError):
+            multi_part_file.read(1)
+
+    def test_consumed_parts_are_deleted(self, tmpdir):
+
+        multi_part_file, paths = self.get_file(str(tmpdir))
+
+        for index in range(len(self.parts)):
+            multi_part_file.set_part_available(index)
+
+        # Like reading archive headers from archive's end
+        multi_part_file.seek(-2, os.SEEK_END)
+        multi_part_file.read(2)
+
+        multi_part_file.enable_consumed_parts_deletion()
+        assert all([os.path.exists(path) for path in paths])
+
+        multi_part_file.seek(0)
+        multi_part_file.read(5)
+        assert [False, True, True] == [os.path.exists(path) for path in paths]
+
+        multi_part_file.read(2)
+        assert [False, False, True] == [os.path.exists(path) for path in paths]
+
+        multi_part_file.seek(0)
+
+        with pytest.raises(IOError):
+            multi_part_file.read(1)
+
+
+class TestPipelinedArchiveExtractor:
+    """
+    Tests for face.datasets.archives.PipelinedArchiveExtractor
+    """
+
+    def test_download_order_starts_with_last_part(self):
+
+        extractor = face.datasets.archives.PipelinedArchiveExtractor(
+            ["a", "b", "c", "d"], ["1", "2", "3", "4"], "directory", download_manager=mock.Mock())
+
+        assert [3, 0, 1, 2] == extractor.get_download_order()
+
+    def test_extract_without_py7zr_uses_7z_tool_and_removes_parts(self, tmpdir):
+
+        paths = [os.path.join(str(tmpdir), "archive.7z.00{}".format(index)) for index in range(1, 3)]
+
+        def download(urls, paths, checksums, verbose):
+
+            for path in paths:
+
+                with open(path, "wb") as file:
+                    file.write(b"data")
+
+        download_manager = mock.Mock()
+        download_manager.download.side_effect = download
+
+        extractor = face.datasets.archives.PipelinedArchiveExtractor(
+            ["a", "b"], paths, str(tmpdir), download_manager=download_manager, verbose=False)
+
+        with mock.patch("face.datasets.archives.py7zr", None), mock.patch("subprocess.check_call") as check_call:
+            extractor.extract()
+
+        check_call.assert_called_once_with(["7z", "x", "-y", paths[0], "-o" + str(tmpdir)])
+
+        assert not any([os.path.exists(path) for path in paths])
+        assert extractor.duration >= 0
+        assert "2 archive parts" in extractor.get_report()
+
+
+class FakeSevenZipFile:
+    """
+    Stand-in for py7zr.SevenZipFile that reads archive headers from its end, as 7z readers do, and extracts
+    archive's raw contents to a single file
+    """
+
+    def __init__(self, file, mode):
+
+        self.file = file
+
+        self.file.seek(-1, os.SEEK_END)
+        self.file.read(1)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        pass
+
+    def extractall(self, path):
+
+        self.file.seek(0)
+
+        with open(os.path.join(path, "contents"), "wb") as file:
+            file.write(self.file.read())
+
+
+class CorruptedSevenZipFile(FakeSevenZipFile):
+    """
+    Stand-in for py7zr.SevenZipFile whose extraction fails after headers were read
+    """
+
+    def extractall(self, path):
+
+        raise IOError("Corrupted archive")
+
+
+def test_failed_extraction_stops_download(tmpdir):
+
+    paths = [os.path.join(str(tmpdir), "archive.7z.00{}".format(index)) for index in range(1, 4)]
+    stop_events = []
+
+    def download(urls, paths, checksums, verbose, file_callback, sizes_callback, stop_event):
+
+        stop_events.append(stop_event)
+
+        # Only last part, which is downloaded first, is available when extraction fails
+        with open(paths[0], "wb") as file:
+            file.write(b"headers")
+
+        sizes_callback([7, 100, 100])
+        file_callback(0)
+
+        # Remaining parts would take long to download, unless download is stopped
+        if not stop_event.wait(timeout=10):
+            raise AssertionError("Download wasn't stopped")
+
+        raise face.download.DownloadStoppedError()
+
+    download_manager = mock.Mock()
+    download_manager.download.side_effect = download
+
+    extractor = face.datasets.archives.PipelinedArchiveExtractor(
+        ["a", "b", "c"], paths, str(tmpdir), download_manager=download_manager, verbose=False)
+
+    with mock.patch("face.datasets.archives.py7zr", mock.Mock(SevenZipFile=CorruptedSevenZipFile)):
+
+        with pytest.raises(IOError, match="Corrupted archive"):
+            extractor.extract()
+
+    assert stop_events[0].is_set()
+
+
+class TestPipelinedArchiveExtractorWithServer:
+    """
+    Tests of PipelinedArchiveExtractor downloading archive parts from a local http server
+    """
+
+    def setup_method(self):
+
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), tests.face.test_download.RangeRequestHandler)
+
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.accept_ranges = True
+        self.server.bytes_limit = None
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.serve_parts([os.urandom(300), os.urandom(200)])
+
+    def teardown_method(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_parts(self, parts):
+
+        base_url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+        self.names = ["archive.7z.{:03}".format(index + 1) for index in range(len(parts))]
+        self.server.assets = {"/" + name: part for name, part in zip(self.names, parts)}
+
+        self.urls = [base_url + "/" + name for name in self.names]
+        self.checksums = [hashlib.sha256(part).hexdigest() for part in parts]
+
+    def extract(self, directory, checksums, extracted_parts):
+        """
+        Extract archive with 7z tool mocked, appending contents parts had when extraction started to extracted_parts
+        """
+
+        paths = [os.path.join(directory, name) for name in self.names]
+
+        def extract_parts(command):
+
+            for path in paths:
+
+                with open(path, "rb") as file:
+                    extracted_parts.append(file.read())
+
+        extractor = face.datasets.archives.PipelinedArchiveExtractor(
+            self.urls, paths, directory, checksums=checksums, verbose=False)
+
+        with mock.patch("face.datasets.archives.py7zr", None), \
+                mock.patch("subprocess.check_call", side_effect=extract_parts):
+
+            extractor.extract()
+
+    def test_corrupted_part_is_downloaded_again_before_extraction(self, tmpdir):
+
+        directory = str(tmpdir)
+        path = os.path.join(directory, self.names[0])
+
+        # Part left by an earlier download that completed, but got corrupted
+        with open(path, "wb") as file:
+            file.write(os.urandom(300))
+
+        progress = face.download.DownloadProgress(path, self.urls[0], 300, [[0, 300, 300]])
+        progress.sha256 = face.download.get_file_sha256(path).hexdigest()
+        progress.save()
+
+        extracted_parts = []
+        self.extract(directory, self.checksums, extracted_parts)
+
+        assert [self.server.assets["/" + name] for name in self.names] == extracted_parts
+        assert any([request[:2] == ("GET", "/" + self.names[0]) for request in self.server.requests])
+
+    def test_part_with_checksum_mismatch_isnt_extracted(self, tmpdir):
+
+        directory = str(tmpdir)
+        extracted_parts = []
+
+        with pytest.raises(face.download.ChecksumMismatchError):
+            self.extract(directory, [self.checksums[0], "0" * 64], extracted_parts)
+
+        assert [] == extracted_parts
+        assert not os.path.exists(os.path.join(directory, self.names[1]))
+
+    def test_extract_while_downloading_uses_sizes_from_download_manager(self, tmpdir):
+
+        directory = str(tmpdir)
+        paths = [os.path.join(directory, name) for name in self.names]
+
+        extractor = face.datasets.archives.PipelinedArchiveExtractor(
+            self.urls, paths, directory, checksums=self.checksums, verbose=False)
+
+        with mock.patch("face.datasets.archives.py7zr", mock.Mock(SevenZipFile=FakeSevenZipFile)):
+            extractor.extract()
+
+        with open(os.path.join(directory, "contents"), "rb") as file:
+            assert b"".join([self.server.assets["/" + name] for name in self.names]) == file.read()
+
+        # Digests are reported in order of parts, not in order parts were downloaded in
+        assert self.checksums == extractor.digests
+
+        # Each part's size was requested once, by download manager
+        assert ["/archive.7z.001", "/archive.7z.002"] == \
+            sorted([request[1] for request in self.server.requests if request[0] == "HEAD"])
+
+        assert not any([os.path.exists(path) for path in paths])
+
+    def test_extract_while_downloading_with_py7zr(self, tmpdir):
+
+        py7zr = pytest.importorskip("py7zr")
+
+        random_state = np.random.RandomState(0)
+        files = {"img_celeba/{}.jpg".format(index): random_state.bytes(20000) for index in range(3)}
+
+        archive_path = str(tmpdir.join("archive.7z"))
+
+        with py7zr.SevenZipFile(archive_path, mode="w") as archive:
+
+            for name, data in files.items():
+                archive.writestr(data, name)
+
+        with open(archive_path, "rb") as file:
+            archive_data = file.read()
+
+        os.remove(archive_path)
+
+        # Split archive into parts, as 7z does with -v switch
+        part_size = len(archive_data) // 3 + 1
+        self.serve_parts([archive_data[start:start + part_size] for start in range(0, len(archive_data), part_size)])
+
+        output_directory = str(tmpdir.join("output"))
+        os.makedirs(output_directory)
+
+        paths = [str(tmpdir.join(name)) for name in self.names]
+
+        extractor = face.datasets.archives.PipelinedArchiveExtractor(
+            self.urls, paths, output_directory, checksums=self.checksums, verbose=False)
+
+        extractor.extract()
+
+        for name, data in files.items():
+
+            with open(os.path.join(output_directory, name), "rb") as file:
+                assert data == file.read()
+
+        assert not any([os.path.exists(path) for path in paths])
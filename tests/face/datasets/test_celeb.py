@@ -0,0 +1,118 @@
+"""
+Tests for face.datasets.celeb module
+"""
+
+import os
+
+import mock
+import numpy as np
+import cv2
+
+import face.datasets.celeb
+import face.manifest
+
+
+class TestDatasetBuilder:
+    """
+    Tests for face.datasets.celeb.DatasetBuilder
+    """
+
+    def get_builder(self, directory, medium_dataset_split):
+
+        builder = face.datasets.celeb.DatasetBuilder(directory, datasets_splits={
+            "large_dataset": [0, 4, 5, None],
+            "medium_dataset": medium_dataset_split
+        })
+
+        images_directory = os.path.join(directory, "img_celeba")
+
+        def get_images():
+
+            os.makedirs(images_directory)
+
+            for index in range(6):
+                cv2.imwrite(os.path.join(images_directory, "{}.jpg".format(index)), np.zeros((8, 10 + index, 3)))
+
+            return [images_directory]
+
+        def get_bounding_boxes():
+
+            with open(builder.bounding_boxes_path, "w") as file:
+
+                file.write("6\nimage_id x_1 y_1 width height\n")
+
+                for index in range(6):
+                    file.write("{}.jpg {} 10 20 30\n".format(index, index))
+
+            return [builder.bounding_boxes_path]
+
+        builder._get_images = get_images
+        builder._get_bounding_boxes = get_bounding_boxes
+
+        return builder
+
+    def test_changing_split_rebuilds_only_affected_dataset(self, tmpdir):
+
+        directory = str(tmpdir)
+
+        executed_stages = self.get_builder(directory, [0, 1, 2, 3]).build_datasets()
+
+        assert ["download_and_extract_images", "download_bounding_boxes", "index",
+                "split_large_dataset", "split_medium_dataset"] == executed_stages
+
+        manifest = face.manifest.DatasetManifest.load(os.path.join(directory, "large_dataset", "dataset.manifest"))
+
+        assert 6 == len(manifest)
+        assert ["{}.jpg".format(index) for index in range(4)] == \
+            [os.path.basename(path) for path in manifest.get_split("training").get_paths()]
+
+        assert [] == self.get_builder(directory, [0, 1, 2, 3]).build_datasets()
+        assert ["split_medium_dataset"] == self.get_builder(directory, [0, 2, 3, 4]).build_datasets()
+
+        manifest = face.manifest.DatasetManifest.load(os.path.join(directory, "medium_dataset", "dataset.manifest"))
+        validation_manifest = manifest.get_split("validation")
+
+        assert ["2.jpg"] == [os.path.basename(path) for path in validation_manifest.get_paths()]
+        assert [[2, 10, 22, 40]] == validation_manifest.bounds.tolist()
+        assert [[8, 12]] == validation_manifest.image_sizes.tolist()
+
+    def test_checksums_are_matched_to_archive_parts_by_file_name(self, tmpdir):
+
+        builder = face.datasets.celeb.DatasetBuilder(
+            str(tmpdir), checksums={"img_celeba.7z.002": "2" * 64, "img_celeba.7z.014": "e" * 64})
+
+        assert 14 == len(builder.image_archives_checksums)
+        assert ["2" * 64, "e" * 64] == [builder.image_archives_checksums[index] for index in [1, 13]]
+        assert 12 == builder.image_archives_checksums.count(None)
+
+    def test_images_stage_outputs_images_directory_extracted_by_earlier_run(self, tmpdir):
+
+        builder = face.datasets.celeb.DatasetBuilder(str(tmpdir))
+
+        # Directory left behind by an interrupted run
+        os.makedirs(builder.images_directory)
+
+        with mock.patch("face.datasets.archives.PipelinedArchiveExtractor") as extractor_mock:
+
+            extractor_mock.return_value.digests = [None] * len(builder.image_archives_paths)
+            assert [os.path.join(str(tmpdir), "img_celeba")] == builder._get_images()
+
+        extractor_mock.return_value.extract.assert_called_once_with()
+
+    def test_downloaded_files_checksums_are_recorded_by_file_name(self, tmpdir):
+
+        builder = face.datasets.celeb.DatasetBuilder(str(tmpdir))
+        digests = ["{:064x}".format(index) for index in range(len(builder.image_archives_paths))]
+
+        with mock.patch("face.datasets.archives.PipelinedArchiveExtractor") as extractor_mock, \
+                mock.patch("face.download.DownloadManager") as download_manager_mock:
+
+            extractor_mock.return_value.digests = digests
+            download_manager_mock.return_value.download.return_value = ["f" * 64]
+
+            builder._get_images()
+            builder._get_bounding_boxes()
+
+        assert digests[1] == builder.downloaded_checksums["img_celeba.7z.002"]
+        assert "f" * 64 == builder.downloaded_checksums["list_bbox_celeba.txt"]
+        assert 15 == len(builder.downloaded_checksums)
@@ -0,0 +1,120 @@
+"""
+Tests for face.datasets.stages module
+"""
+
+import os
+
+import face.datasets.stages
+
+
+class TestStagesRunner:
+    """
+    Tests for face.datasets.stages.StagesRunner
+    """
+
+    def setup_method(self, method):
+
+        self.calls = []
+
+    def get_stages(self, directory, parameter):
+
+        def get_function(name):
+
+            def function():
+
+                self.calls.append(name)
+
+                path = os.path.join(directory, name)
+
+                with open(path, "w") as file:
+                    file.write(name)
+
+                return [path]
+
+            return function
+
+        first = face.datasets.stages.Stage("first", get_function("first"))
+        second = face.datasets.stages.Stage("second", get_function("second"), parameters=parameter,
+                                            dependencies=[first])
+        third = face.datasets.stages.Stage("third", get_function("third"), dependencies=[second])
+
+        return first, second, third
+
+    def test_up_to_date_stages_are_skipped(self, tmpdir):
+
+        records_path = os.path.join(str(tmpdir), "records.json")
+
+        runner = face.datasets.stages.StagesRunner(records_path)
+        runner.run(self.get_stages(str(tmpdir), 1)[-1])
+
+        assert ["first", "second", "third"] == self.calls
+
+        runner = face.datasets.stages.StagesRunner(records_path)
+        runner.run(self.get_stages(str(tmpdir), 1)[-1])
+
+        assert ["first", "second", "third"] == self.calls
+        assert [] == runner.executed_stages_names
+
+    def test_changed_parameters_rerun_stage_and_its_dependents_only(self, tmpdir):
+
+        records_path = os.path.join(str(tmpdir), "records.json")
+
+        face.datasets.stages.StagesRunner(records_path).run(self.get_stages(str(tmpdir), 1)[-1])
+        self.calls = []
+
+        runner = face.datasets.stages.StagesRunner(records_path)
+        runner.run(self.get_stages(str(tmpdir), 2)[-1])
+
+        assert ["second", "third"] == self.calls
+
+    def test_missing_outputs_rerun_stage(self, tmpdir):
+
+        records_path = os.path.join(str(tmpdir), "records.json")
+
+        face.datasets.stages.StagesRunner(records_path).run(self.get_stages(str(tmpdir), 1)[-1])
+        self.calls = []
+
+        os.remove(os.path.join(str(tmpdir), "third"))
+        os.remove(os.path.join(str(tmpdir), "first"))
+
+        face.datasets.stages.StagesRunner(records_path).run(self.get_stages(str(tmpdir), 1)[-1])
+
+        # Outputs of first stage are missing, but stages depending on it are up to date, so it isn't rerun
+        assert ["third"] == self.calls
+
+    def test_stage_without_outputs_is_rerun(self, tmpdir):
+
+        records_path = os.path.join(str(tmpdir), "records.json")
+
+        def function():
+
+            self.calls.append("empty")
+            return []
+
+        for _ in range(2):
+            face.datasets.stages.StagesRunner(records_path).run(face.datasets.stages.Stage("empty", function))
+
+        assert ["empty", "empty"] == self.calls
+
+    def test_interrupted_stage_is_rerun(self, tmpdir):
+
+        records_path = os.path.join(str(tmpdir), "records.json")
+        first, second, third = self.get_stages(str(tmpdir), 1)
+
+        def failing_function():
+            raise KeyboardInterrupt()
+
+        face.datasets.stages.StagesRunner(records_path).run(second)
+
+        interrupted_second = face.datasets.stages.Stage(
+            "second", failing_function, parameters=2, dependencies=[first])
+
+        try:
+            face.datasets.stages.StagesRunner(records_path).run(interrupted_second)
+        except KeyboardInterrupt:
+            pass
+
+        self.calls = []
+        face.datasets.stages.StagesRunner(records_path).run(self.get_stages(str(tmpdir), 1)[-1])
+
+        assert ["second", "third"] == self.calls
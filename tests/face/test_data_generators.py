@@ -0,0 +1,123 @@
+"""
+Tests for face.data_generators module
+"""
+
+import mock
+
+import pytest
+
+import face.data_generators
+import face.manifest
+
+
+class TestShardedBatchesGenerator:
+    """
+    Test class for face.data_generators.ShardedBatchesGenerator
+    """
+
+    def setup_method(self, method):
+
+        self.paths = ["{}.jpg\n".format(index) for index in range(10)]
+
+        self.patches = [
+            mock.patch("face.utilities.get_file_lines", return_value=self.paths),
+            mock.patch("face.geometry.get_bounding_boxes_map", return_value={}),
+            mock.patch("face.processing.get_data_batch", side_effect=lambda paths, *args: (paths, args[1]))
+        ]
+
+        for patch in self.patches:
+            patch.start()
+
+    def teardown_method(self, method):
+
+        for patch in self.patches:
+            patch.stop()
+
+    def get_generator(self, rank, world_size, **kwargs):
+
+        return face.data_generators.ShardedBatchesGenerator(
+            "paths", "bounding_boxes", batch_size=4, crop_size=8, rank=rank, world_size=world_size, **kwargs)
+
+    def test_shards_are_disjoint_and_of_equal_size(self):
+
+        generators = [self.get_generator(rank, world_size=3) for rank in range(3)]
+
+        shards = [set(generator.get_shard_paths(epoch=0)) for generator in generators]
+
+        assert all(len(shard) == 3 for shard in shards)
+        assert 9 == len(set.union(*shards))
+
+    def test_shards_are_reshuffled_every_epoch(self):
+
+        generator = self.get_generator(rank=0, world_size=2)
+
+        assert generator.get_shard_paths(epoch=0) == generator.get_shard_paths(epoch=0)
+        assert generator.get_shard_paths(epoch=0) != generator.get_shard_paths(epoch=1)
+
+    def test_epoch_advances_after_shard_is_consumed(self):
+
+        generator = self.get_generator(rank=1, world_size=2)
+
+        indices = [next(generator)[1] for _ in range(6)]
+
+        assert [0, 1, 2, 3, 4, 0] == indices
+        assert 1 == generator.epoch
+
+    def test_resuming_from_saved_state(self, tmpdir):
+
+        state_path = str(tmpdir.join("state.json"))
+
+        generator = self.get_generator(rank=0, world_size=2, state_path=state_path)
+
+        for _ in range(7):
+            next(generator)
+
+        resumed_generator = self.get_generator(rank=0, world_size=2, state_path=state_path)
+
+        assert {"rank": 0, "world_size": 2, "seed": 0, "epoch": 1, "index": 2} == resumed_generator.get_state()
+        assert next(generator) == next(resumed_generator)
+
+    def test_advanced_state_matches_state_after_batches(self):
+
+        generator = self.get_generator(rank=0, world_size=2)
+        generator.set_state(dict(generator.get_state(), epoch=1, index=3))
+
+        start_state = generator.get_state()
+
+        for batches_count in range(12):
+
+            assert generator.get_state() == generator.get_advanced_state(start_state, batches_count)
+            next(generator)
+
+    def test_remaining_batches_count(self):
+
+        generator = self.get_generator(rank=1, world_size=2)
+
+        assert 5 == generator.get_batches_per_epoch()
+        assert 5 == generator.get_remaining_batches_count()
+
+        for _ in range(3):
+            next(generator)
+
+        assert 2 == generator.get_remaining_batches_count()
+
+    def test_loading_state_of_different_worker_raises(self, tmpdir):
+
+        state_path = str(tmpdir.join("state.json"))
+        self.get_generator(rank=0, world_size=2).save_state(state_path)
+
+        with pytest.raises(ValueError):
+
+            self.get_generator(rank=1, world_size=2, state_path=state_path)
+
+
+def test_get_paths_and_bounding_boxes_map_from_manifest():
+
+    manifest = face.manifest.DatasetManifest.from_lists(
+        ["/data/a.jpg", "/data/b.jpg"], [[0, 0, 10, 10], [5, 5, 20, 30]], [[50, 50], [60, 60]],
+        ["training", "training"])
+
+    paths, bounding_boxes_map = face.data_generators.get_paths_and_bounding_boxes_map(manifest, None)
+
+    assert ["/data/a.jpg", "/data/b.jpg"] == paths
+    assert (5, 5, 20, 30) == bounding_boxes_map["b.jpg"].bounds
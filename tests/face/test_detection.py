@@ -2,6 +2,8 @@
 Tests for face.detection module
 """
 
+import contextlib
+
 import mock
 
 import numpy as np
@@ -11,6 +13,8 @@ import pytest
 import face.detection
 import face.config
 import face.geometry
+import face.prefilter
+import face.tracing
 
 
 def test_get_face_candidates_generator_raises_on_stride_larger_than_crop_size():
@@ -194,6 +198,21 @@ def test_get_heatmap_single_batch():
     assert np.allclose(actual_heatmap, expected_heatmap)
 
 
+def test_get_multi_scale_heatmap_takes_maximum_over_levels():
+
+    scores_grids = [
+        face.detection.ScoresGrid(np.array([[0.2, 0.4]]), scale=1, crop_size=4, stride=4),
+        face.detection.ScoresGrid(np.array([[0.3]]), scale=0.5, crop_size=4, stride=4)
+    ]
+
+    heatmap = face.detection.get_multi_scale_heatmap(scores_grids, (8, 8), (8, 8))
+
+    assert (8, 8) == heatmap.shape
+    assert np.allclose(0.3, heatmap[:4, :4])
+    assert np.allclose(0.4, heatmap[:4, 4:])
+    assert np.allclose(0.3, heatmap[4:, :])
+
+
 class TestUniqueDetectionsComputer:
 
     def test_non_maximum_suppression_one_group_only(self):
@@ -305,3 +324,439 @@ class TestUniqueDetectionsComputer:
             face_detections, iou_threshold)
 
         assert expected_results == actual_results
+
+
+def test_get_scores_grid():
+
+    image = np.zeros(shape=[10, 14])
+
+    mock_model = mock.Mock()
+    mock_model.predict.side_effect = [np.array([[0.1], [0.2], [0.3], [0.4]]), np.array([[0.5], [0.6]])]
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=5, stride=4, batch_size=4)
+
+    expected = np.array([
+        [0.1, 0.2, 0.3],
+        [0.4, 0.5, 0.6]
+    ])
+
+    actual = face.detection.get_scores_grid(image, mock_model, configuration)
+
+    assert np.allclose(expected, actual)
+
+
+def test_get_scores_grid_matches_scores_of_face_candidates():
+
+    image = np.random.RandomState(0).uniform(size=(30, 41, 3))
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.mean(crops.reshape(len(crops), -1), axis=1)
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=8, stride=4, batch_size=7)
+
+    expected = np.concatenate([
+        face.detection.get_candidate_scores(batch, model, configuration.batch_size)
+        for batch in face.detection.get_face_candidates_generator(image, 8, 4, 7)])
+
+    actual = face.detection.get_scores_grid(image, model, configuration)
+
+    assert np.allclose(expected, actual.ravel())
+
+
+def test_get_scores_grid_passes_float32_crops_in_reused_buffers():
+
+    batches = []
+
+    def predict(crops, batch_size):
+
+        batches.append(crops)
+        return np.zeros(len(crops))
+
+    model = mock.Mock()
+    model.predict.side_effect = predict
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=8, stride=4, batch_size=4)
+    face.detection.get_scores_grid(np.zeros((16, 24, 3)), model, configuration)
+
+    assert 4 == len(batches)
+    assert all(np.float32 == batch.dtype for batch in batches)
+    assert all(np.shares_memory(batches[0], batch) for batch in batches)
+
+
+def test_get_scores_grid_image_smaller_than_crop():
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=5, stride=4, batch_size=4)
+    scores = face.detection.get_scores_grid(np.zeros(shape=[3, 10]), mock.Mock(), configuration)
+
+    assert (0, 2) == scores.shape
+
+
+def test_get_scores_grid_with_prefilter_scores_only_accepted_windows():
+
+    image = np.zeros(shape=[8, 24])
+    image[:, 8:16] = np.tile([0, 1], 32).reshape(8, 8)
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.full(len(crops), 0.7)
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=8, stride=8, batch_size=4)
+    prefilter = face.prefilter.WindowsPrefilter(min_standard_deviation=0.1)
+
+    image = np.dstack([image] * 3)
+    trace = face.tracing.PyramidLevelTrace("test", 1, image.shape, configuration.batch_size)
+
+    scores = face.detection.get_scores_grid(image, model, configuration, trace, prefilter)
+
+    assert np.allclose([[0, 0.7, 0]], scores)
+    assert 1 == len(model.predict.call_args[0][0])
+    assert (1, 2) == (trace.candidates_count, trace.rejected_count)
+
+
+def test_get_levels_scores_grids_matches_sequential_scores_grids():
+
+    random_state = np.random.RandomState(0)
+    images = [random_state.uniform(size=shape) for shape in [(40, 52, 3), (20, 26, 3), (6, 6, 3)]]
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.mean(crops.reshape(len(crops), -1), axis=1)
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=8, stride=4, batch_size=5)
+
+    expected = [face.detection.get_scores_grid(image, model, configuration) for image in images]
+
+    traces = [face.tracing.PyramidLevelTrace("test", 1, image.shape, 5) for image in images]
+    actual = face.detection.get_levels_scores_grids(images, model, configuration, threads_count=3, traces=traces)
+
+    for expected_scores, actual_scores in zip(expected, actual):
+        assert np.array_equal(expected_scores, actual_scores)
+
+    assert [expected_scores.size for expected_scores in expected] == [trace.candidates_count for trace in traces]
+
+
+def test_get_levels_scores_grids_calls_keras_model_within_its_graph():
+
+    # Stand-in for a Keras model, recognized by module of its class
+    keras_model_class = type("Model", (), {
+        "__module__": "keras.engine.training", "predict": None, "_make_predict_function": None})
+
+    model = mock.Mock(spec=keras_model_class)
+    model.predict.side_effect = lambda crops, batch_size: np.zeros(len(crops))
+
+    configuration = face.config.SingleScaleFaceSearchConfiguration(crop_size=8, stride=4, batch_size=5)
+    images = [np.zeros(shape=(40, 52, 3), dtype=np.float32)]
+
+    # Patched with an explicit mock, since inspecting lazy keras module would import it
+    with mock.patch("face.detection.keras", new=mock.MagicMock()) as keras:
+
+        keras.backend.backend.return_value = "tensorflow"
+        graph = keras.backend.get_session.return_value.graph
+
+        face.detection.get_levels_scores_grids(images, model, configuration, threads_count=3)
+
+    model._make_predict_function.assert_called_once_with()
+    assert 0 < graph.as_default.return_value.__enter__.call_count
+
+
+def test_get_model_threads_context_without_graph_internals():
+
+    # Stand-ins for Keras models of a version with and without private predict function
+    graph_model_class = type("Model", (), {
+        "__module__": "keras.engine.training", "predict": None, "_make_predict_function": None})
+
+    eager_model_class = type("Model", (), {"__module__": "keras.src.models.model", "predict": None})
+
+    with mock.patch("face.detection.keras", new=mock.MagicMock()) as keras:
+
+        keras.backend.backend.return_value = "tensorflow"
+
+        assert contextlib.nullcontext is face.detection.get_model_threads_context(mock.Mock(spec=eager_model_class))
+
+        # Backend without sessions
+        del keras.backend.get_session
+
+        assert contextlib.nullcontext is face.detection.get_model_threads_context(mock.Mock(spec=graph_model_class))
+
+
+def test_scores_grid_get_windows_bounds():
+
+    scores_grid = face.detection.ScoresGrid(np.zeros(shape=[3, 3]), scale=1, crop_size=5, stride=4, offset=(10, 20))
+
+    expected = np.array([[10, 20, 15, 25], [14, 28, 19, 33]])
+    actual = scores_grid.get_windows_bounds(rows=[0, 2], columns=[0, 1])
+
+    assert np.all(expected == actual)
+
+
+class TestDetectionsPostProcessor:
+
+    def test_get_single_scale_detections_thresholds_and_merges_windows(self):
+
+        scores = np.array([
+            [0.95, 0.99, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1],
+            [0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.97]
+        ])
+
+        scores_grid = face.detection.ScoresGrid(scores, scale=1, crop_size=10, stride=2)
+        post_processor = face.detection.DetectionsPostProcessor(score_threshold=0.9, iou_threshold=0.2)
+
+        expected = [
+            face.detection.FaceDetection(shapely.geometry.box(1, 0, 11, 10), 0.99),
+            face.detection.FaceDetection(shapely.geometry.box(14, 2, 24, 12), 0.97)
+        ]
+
+        actual = post_processor.get_single_scale_detections(scores_grid)
+
+        assert len(expected) == len(actual)
+
+        for expected_detection, actual_detection in zip(expected, actual):
+
+            assert expected_detection.bounding_box.equals(actual_detection.bounding_box)
+            assert np.isclose(expected_detection.score, actual_detection.score)
+
+    def test_get_detections_rescales_detections_to_input_image(self):
+
+        scores_grids = [
+            face.detection.ScoresGrid(np.array([[0.95]]), scale=2, crop_size=10, stride=2),
+            face.detection.ScoresGrid(np.array([[0.5]]), scale=1, crop_size=10, stride=2)
+        ]
+
+        post_processor = face.detection.DetectionsPostProcessor(score_threshold=0.9, iou_threshold=0.2)
+        detections = post_processor.get_detections(scores_grids, input_image_scale=0.5)
+
+        assert 1 == len(detections)
+        assert shapely.geometry.box(0, 0, 10, 10).equals(detections[0].bounding_box)
+
+
+def test_save_and_load_scores_grids(tmpdir):
+
+    path = str(tmpdir.join("scores_grids.npz"))
+
+    scores_grids = [
+        face.detection.ScoresGrid(np.array([[0.1, 0.2]]), scale=1.5, crop_size=64, stride=8),
+        face.detection.ScoresGrid(np.zeros(shape=[0, 0]), scale=1.2, crop_size=64, stride=8, offset=(3, 4))
+    ]
+
+    face.detection.save_scores_grids(path, scores_grids, input_image_scale=0.5)
+    loaded_scores_grids, input_image_scale = face.detection.load_scores_grids(path)
+
+    assert 0.5 == input_image_scale
+    assert 2 == len(loaded_scores_grids)
+
+    for expected, actual in zip(scores_grids, loaded_scores_grids):
+
+        assert np.all(expected.scores == actual.scores)
+        assert expected.scale == actual.scale
+        assert expected.offset == actual.offset
+        assert (64, 8) == (actual.crop_size, actual.stride)
+
+
+def get_two_faces_image():
+
+    # Two bright squares, which mean intensity model sees as faces
+    image = np.zeros(shape=(64, 80, 3))
+    image[8:24, 16:32] = 1
+    image[32:56, 40:64] = 1
+
+    return image
+
+
+def get_mean_intensity_model():
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.mean(crops.reshape(len(crops), -1), axis=1)
+
+    return model
+
+
+def get_two_faces_search_configuration(batch_size):
+
+    return face.config.FaceSearchConfiguration(
+        crop_size=8, stride=4, batch_size=batch_size, min_face_size=8, min_face_to_image_ratio=0.1,
+        image_rescaling_ratio=0.5)
+
+
+class TestFaceDetector:
+
+    def setup_method(self, method):
+
+        self.image = get_two_faces_image()
+        self.model = get_mean_intensity_model()
+        self.configuration = get_two_faces_search_configuration(batch_size=16)
+
+    def test_scan_gives_detections_and_heatmap_from_single_search(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+
+        expected_detections = detector.get_faces_detections()
+        detections_predict_calls_count = self.model.predict.call_count
+
+        results = detector.scan()
+        detections = results.get_detections()
+        heatmap = results.get_heatmap()
+
+        assert 2 * detections_predict_calls_count == self.model.predict.call_count
+        assert expected_detections == detections
+
+        assert self.image.shape[:2] == heatmap.shape
+        assert np.isclose(1, heatmap[16, 24])
+        assert 0 == heatmap[0, 0]
+
+        # Heatmap computer paints heatmap from the same search
+        assert np.array_equal(
+            heatmap, face.detection.HeatmapComputer(self.image, self.model, self.configuration).get_heatmap())
+
+    def test_threaded_search_gives_same_results_as_sequential_search(self):
+
+        expected_detections = face.detection.FaceDetector(
+            self.image, self.model, self.configuration).get_faces_detections()
+
+        expected_heatmap = face.detection.HeatmapComputer(self.image, self.model, self.configuration).get_heatmap()
+
+        for threads_count in [1, 4]:
+
+            tracer = face.tracing.DetectionTracer()
+
+            detections = face.detection.FaceDetector(
+                self.image, self.model, self.configuration, tracer=tracer,
+                threads_count=threads_count).get_faces_detections()
+
+            heatmap = face.detection.HeatmapComputer(
+                self.image, self.model, self.configuration, threads_count=threads_count).get_heatmap()
+
+            assert expected_detections == detections
+            assert np.array_equal(expected_heatmap, heatmap)
+
+
+class TestFaceDetectorWithinDeadline:
+
+    def setup_method(self, method):
+
+        self.image = get_two_faces_image()
+        self.model = get_mean_intensity_model()
+        self.configuration = get_two_faces_search_configuration(batch_size=16)
+
+    def test_large_time_budget_gives_same_detections_as_full_search(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+
+        expected = detector.get_faces_detections()
+        actual = detector.get_faces_detections_within_deadline(time_budget=1000)
+
+        assert not actual.is_partial
+        assert 2 == len(expected)
+        assert expected == actual.detections
+
+    def test_zero_time_budget_skips_all_scales(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+        results = detector.get_faces_detections_within_deadline(time_budget=0)
+
+        assert results.is_partial
+        assert [] == results.detections
+        assert sorted(detector.get_scales()) == sorted(results.skipped_scales)
+        assert 0 == self.model.predict.call_count
+
+    def test_levels_closest_to_expected_face_size_are_searched_first(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+
+        # Level at scale 0.5 searches for faces of size 16, level at scale 1 for faces of size 8
+        search = face.detection.PrioritizedSearch(detector, None, expected_face_to_image_ratio=16 / 64)
+        search.scales = [1, 0.5, 0.25]
+
+        assert [1, 0, 2] == search.get_levels_search_order()
+
+        previous_detections = [face.detection.FaceDetection(shapely.geometry.box(0, 0, 32, 32), 1)]
+
+        search = face.detection.PrioritizedSearch(detector, previous_detections, expected_face_to_image_ratio=16 / 64)
+        search.scales = [1, 0.5, 0.25]
+
+        assert [2, 1, 0] == search.get_levels_search_order()
+
+    def test_windows_overlapping_previous_detections_are_searched_first(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+        previous_detections = [face.detection.FaceDetection(shapely.geometry.box(10, 10, 12, 12), 1)]
+
+        search = face.detection.PrioritizedSearch(detector, previous_detections, expected_face_to_image_ratio=0.4)
+        scores_grid = face.detection.ScoresGrid(np.zeros(shape=(3, 3)), scale=1, crop_size=8, stride=4)
+
+        rows, columns = search.get_windows_search_order(scores_grid)
+
+        assert [(1, 1), (1, 2), (2, 1), (2, 2), (0, 0)] == list(zip(rows, columns))[:5]
+
+
+class TestFaceDetectorWithEarlyExit:
+
+    def setup_method(self, method):
+
+        self.image = get_two_faces_image()
+        self.model = get_mean_intensity_model()
+        self.configuration = get_two_faces_search_configuration(batch_size=4)
+
+    def test_search_stops_after_requested_number_of_faces_is_confirmed(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+        results = detector.get_faces_detections_with_early_exit(max_faces=1, confirmation_score=0.99)
+
+        assert 1 == len(results.detections)
+        assert 0.99 <= results.detections[0].score
+        assert 0 < results.saved_windows_count
+        assert results.total_windows_count == results.scored_windows_count + results.saved_windows_count
+
+    def test_search_post_processes_scored_windows_only_when_enough_faces_might_be_confirmed(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+
+        with mock.patch.object(
+                detector.post_processor, "get_detections", wraps=detector.post_processor.get_detections) as spy:
+
+            results = detector.get_faces_detections_with_early_exit(max_faces=2, confirmation_score=0.99)
+
+        assert 2 == len(results.detections)
+
+        # One check once two separated windows were confirmed, and final post-processing
+        assert 2 == spy.call_count
+
+    def test_search_covers_all_windows_when_not_enough_faces_are_found(self):
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration)
+        results = detector.get_faces_detections_with_early_exit(max_faces=10, confirmation_score=0.99)
+
+        expected = sorted(detector.get_faces_detections(), key=lambda detection: detection.score, reverse=True)
+
+        assert 0 == results.saved_windows_count
+        assert expected == results.detections
+
+    def test_prefilter_rejects_flat_windows_without_changing_detections(self):
+
+        # Faces of stub model need some texture to pass the pre-filter
+        texture = np.random.RandomState(0).uniform(0.9, 1, size=self.image.shape[:2])
+        self.image[self.image == 1] = np.dstack([texture] * 3)[self.image == 1]
+
+        prefilter = face.prefilter.WindowsPrefilter(min_standard_deviation=0.001)
+
+        detector = face.detection.FaceDetector(self.image, self.model, self.configuration, prefilter=prefilter)
+        search = face.detection.PrioritizedSearch(detector, None, face.config.expected_face_to_image_ratio)
+        search.run()
+
+        expected = face.detection.FaceDetector(self.image, self.model, self.configuration).get_faces_detections()
+
+        assert search.scored_windows_count < search.get_total_windows_count()
+        assert expected == detector.get_faces_detections()
+        assert expected == detector.post_processor.get_detections(search.get_scores_grids(), 1)
+
+
+def test_get_separated_detections():
+
+    detections = [
+        face.detection.FaceDetection(shapely.geometry.box(0, 0, 10, 10), 0.95),
+        face.detection.FaceDetection(shapely.geometry.box(5, 5, 15, 15), 0.99),
+        face.detection.FaceDetection(shapely.geometry.box(20, 20, 30, 30), 0.97),
+        face.detection.FaceDetection(shapely.geometry.box(40, 40, 50, 50), 0.5)
+    ]
+
+    expected = [detections[1], detections[2]]
+    actual = face.detection.get_separated_detections(detections, min_score=0.9)
+
+    assert expected == actual
@@ -0,0 +1,69 @@
+"""
+Tests for face.distillation module
+"""
+
+import mock
+
+import numpy as np
+
+import face.distillation
+
+
+def get_data_generator():
+
+    random_generator = np.random.RandomState(0)
+
+    while True:
+
+        images = random_generator.uniform(size=(4, 8, 8, 3))
+        labels = np.array([1, 0, 0, 0])
+
+        yield images, labels
+
+
+def test_get_softened_scores():
+
+    scores = np.array([0.1, 0.5, 0.9])
+
+    assert np.allclose(scores, face.distillation.get_softened_scores(scores, temperature=1))
+
+    softened_scores = face.distillation.get_softened_scores(scores, temperature=2)
+
+    assert np.allclose([0.25, 0.5, 0.75], softened_scores)
+
+
+def test_teacher_scores_cache(tmpdir):
+
+    directory = str(tmpdir)
+
+    teacher = mock.Mock()
+    teacher.predict.side_effect = lambda images, batch_size: np.mean(images, axis=(1, 2, 3)).reshape(-1, 1)
+
+    assert not face.distillation.TeacherScoresCache.exists(directory)
+
+    face.distillation.TeacherScoresCache.build(
+        directory, teacher, get_data_generator(), batches_count=3, batch_size=4, verbose=False)
+
+    assert face.distillation.TeacherScoresCache.exists(directory)
+    assert 3 == teacher.predict.call_count
+
+    cache = face.distillation.TeacherScoresCache(directory)
+
+    assert 12 == len(cache)
+    assert (12, 8, 8, 3) == cache.images.shape
+    assert np.uint8 == cache.images.dtype
+    assert [1, 0, 0, 0] * 3 == cache.labels.tolist()
+
+    # Cached scores are teacher scores over cached images, up to uint8 quantization
+    assert np.allclose(np.mean(cache.images / 255, axis=(1, 2, 3)), cache.scores, atol=0.01)
+
+    images, targets = next(cache.get_batches_generator(batch_size=5, teacher_weight=0.5, seed=0))
+
+    assert (5, 8, 8, 3) == images.shape
+    assert (5, 1) == targets.shape
+
+    # Targets are halfway between teacher scores and labels
+    indices = [np.argmin(np.abs(np.mean(cache.images / 255, axis=(1, 2, 3)) - np.mean(image))) for image in images]
+    expected_targets = 0.5 * cache.scores[indices] + 0.5 * cache.labels[indices]
+
+    assert np.allclose(expected_targets, targets.ravel())
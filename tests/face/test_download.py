@@ -1,7 +1,12 @@
 """
 Tests for face.download module
 """
+import hashlib
 import itertools
+import http.server
+import os
+import re
+import threading
 
 import mock
 import urllib.error
@@ -18,10 +23,15 @@ def test_get_url_asset_size():
     context = mock_url_opener.return_value.__enter__.return_value
     context.info = mock.Mock(return_value={"Content-Length": "10"})
 
-    kwargs = {"url_opener": mock_url_opener}
+    mock_url_request = mock.Mock()
+
+    kwargs = {"url_opener": mock_url_opener, "url_request": mock_url_request}
     size = face.download.get_url_asset_size(url="url", **kwargs)
     assert 10 == size
 
+    # Size should be obtained with a HEAD request, without downloading asset
+    mock_url_request.assert_called_once_with(url="url", method="HEAD")
+
 
 class TestDownloader:
     """
@@ -58,7 +68,7 @@ class TestDownloader:
         downloader.download(verbose=False)
 
         assert 2 == self.mock_url_opener.call_count
-        assert 1 == self.mock_url_request.call_count
+        assert 2 == self.mock_url_request.call_count
         assert 1 == self.mock_file_opener.call_count
 
         self.mock_file_context.write.assert_called_once_with(packet)
@@ -79,7 +89,7 @@ class TestDownloader:
         downloader.download(verbose=False)
 
         assert 2 == self.mock_url_opener.call_count
-        assert 1 == self.mock_url_request.call_count
+        assert 2 == self.mock_url_request.call_count
         assert 1 == self.mock_file_opener.call_count
 
         calls = itertools.repeat(mock.call(packet), 3)
@@ -102,7 +112,7 @@ class TestDownloader:
         downloader.download(verbose=False)
 
         assert 3 == self.mock_url_opener.call_count
-        assert 2 == self.mock_url_request.call_count
+        assert 3 == self.mock_url_request.call_count
         assert 2 == self.mock_file_opener.call_count
 
         calls = itertools.repeat(mock.call(packet), 3)
@@ -127,7 +137,7 @@ class TestDownloader:
             downloader.download(verbose=False)
 
         assert 5 == self.mock_url_opener.call_count
-        assert 4 == self.mock_url_request.call_count
+        assert 5 == self.mock_url_request.call_count
         assert 4 == self.mock_file_opener.call_count
 
         calls = itertools.repeat(mock.call(packet), 2)
@@ -151,7 +161,7 @@ class TestDownloader:
         downloader.download(verbose=False)
 
         assert 3 == self.mock_url_opener.call_count
-        assert 2 == self.mock_url_request.call_count
+        assert 3 == self.mock_url_request.call_count
         assert 2 == self.mock_file_opener.call_count
 
         calls = itertools.repeat(mock.call(packet), 4)
@@ -178,7 +188,7 @@ class TestDownloader:
         downloader.download(verbose=False)
 
         assert 3 == self.mock_url_opener.call_count
-        assert 2 == self.mock_url_request.call_count
+        assert 3 == self.mock_url_request.call_count
         assert 2 == self.mock_file_opener.call_count
 
         calls = itertools.repeat(mock.call(packet), 4)
@@ -205,7 +215,7 @@ class TestDownloader:
             downloader.download(verbose=False)
 
         assert 4 == self.mock_url_opener.call_count
-        assert 3 == self.mock_url_request.call_count
+        assert 4 == self.mock_url_request.call_count
         assert 3 == self.mock_file_opener.call_count
 
         self.mock_file_context.write.assert_called_once_with(packet)
@@ -213,3 +223,259 @@ class TestDownloader:
 
         assert 10 == downloader.downloaded_bytes_count
         assert 2 == downloader.reties_count
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handler serving assets from server's assets dictionary, with support for HEAD and Range requests
+    """
+
+    def do_HEAD(self):
+
+        self._send(send_body=False)
+
+    def do_GET(self):
+
+        self._send(send_body=True)
+
+    def _send(self, send_body):
+
+        data = self.server.assets[self.path]
+        self.server.requests.append((self.command, self.path, self.headers.get("Range")))
+
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+
+        if match is not None and self.server.accept_ranges:
+
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) != "" else len(data)
+
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end - 1, len(data)))
+
+        else:
+
+            start, end = 0, len(data)
+            self.send_response(200)
+
+        if self.server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+
+        if send_body:
+
+            # Simulate connection dropped after sending limited number of bytes
+            if self.server.bytes_limit is not None:
+                end = min(end, start + self.server.bytes_limit)
+
+            self.wfile.write(data[start:end])
+
+    def log_message(self, format, *args):
+
+        pass
+
+
+class TestDownloadManager:
+    """
+    Tests for DownloadManager, run against a local http server
+    """
+
+    def setup_method(self):
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        self.server.daemon_threads = True
+        self.server.assets = {
+            "/first": os.urandom(1000),
+            "/second": os.urandom(777),
+            "/empty": b""
+        }
+        self.server.requests = []
+        self.server.accept_ranges = True
+        self.server.bytes_limit = None
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.base_url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def teardown_method(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _download(self, names, directory, **kwargs):
+
+        urls = [self.base_url + "/" + name for name in names]
+        paths = [os.path.join(str(directory), name) for name in names]
+
+        face.download.DownloadManager(**kwargs).download(urls, paths, verbose=False)
+
+        return paths
+
+    def test_download_with_ranges(self, tmpdir):
+
+        paths = self._download(
+            ["first", "second", "empty"], tmpdir, connections_per_file=4, min_range_size=100, buffer_size=64)
+
+        for path, name in zip(paths, ["first", "second", "empty"]):
+
+            with open(path, "rb") as file:
+                assert self.server.assets["/" + name] == file.read()
+
+        ranged_requests = [request for request in self.server.requests
+                           if request[0] == "GET" and request[1] == "/first"]
+
+        assert 4 == len(ranged_requests)
+        assert {"bytes=0-249", "bytes=250-499", "bytes=500-749", "bytes=750-999"} == \
+            set(request[2] for request in ranged_requests)
+
+    def test_download_small_files_use_single_connection(self, tmpdir):
+
+        paths = self._download(["first"], tmpdir, connections_per_file=4, min_range_size=10000)
+
+        with open(paths[0], "rb") as file:
+            assert self.server.assets["/first"] == file.read()
+
+        assert [("HEAD", "/first", None), ("GET", "/first", "bytes=0-999")] == self.server.requests
+
+    def test_download_without_range_support(self, tmpdir):
+
+        self.server.accept_ranges = False
+
+        paths = self._download(["first", "second"], tmpdir, connections_per_file=4, min_range_size=100)
+
+        for path, name in zip(paths, ["first", "second"]):
+
+            with open(path, "rb") as file:
+                assert self.server.assets["/" + name] == file.read()
+
+        get_requests = [request for request in self.server.requests if request[0] == "GET"]
+        assert 2 == len(get_requests)
+
+    def test_download_returns_checksums_and_skips_complete_files(self, tmpdir):
+
+        names = ["first", "second"]
+        urls = [self.base_url + "/" + name for name in names]
+        paths = [os.path.join(str(tmpdir), name) for name in names]
+
+        manager = face.download.DownloadManager(min_range_size=100)
+        digests = manager.download(urls, paths, verbose=False)
+
+        expected_digests = [hashlib.sha256(self.server.assets["/" + name]).hexdigest() for name in names]
+        assert expected_digests == digests
+
+        self.server.requests = []
+
+        assert expected_digests == manager.download(urls, paths, checksums=expected_digests, verbose=False)
+        assert [] == self.server.requests
+
+    def test_download_redownloads_complete_file_corrupted_on_disk(self, tmpdir):
+
+        url = self.base_url + "/first"
+        path = os.path.join(str(tmpdir), "first")
+
+        manager = face.download.DownloadManager(connections_per_file=1)
+        manager.download([url], [path], verbose=False)
+
+        expected_digest = hashlib.sha256(self.server.assets["/first"]).hexdigest()
+        assert expected_digest == face.download.DownloadProgress.load(path).sha256
+
+        # Corruption keeps file size intact
+        with open(path, "r+b") as file:
+            file.seek(500)
+            file.write(bytes([255 - self.server.assets["/first"][500]]))
+
+        self.server.requests = []
+
+        assert [expected_digest] == manager.download([url], [path], verbose=False)
+        assert 1 == len([request for request in self.server.requests if request[0] == "GET"])
+
+        with open(path, "rb") as file:
+            assert self.server.assets["/first"] == file.read()
+
+    def test_download_resumes_after_interruption(self, tmpdir):
+
+        url = self.base_url + "/first"
+        path = os.path.join(str(tmpdir), "first")
+
+        self.server.bytes_limit = 300
+
+        manager = face.download.DownloadManager(
+            connections_per_file=2, min_range_size=100, buffer_size=50, max_retries=0)
+
+        with pytest.raises(urllib.error.URLError):
+            manager.download([url], [path], verbose=False)
+
+        # Progress of both ranges was persisted
+        progress = face.download.DownloadProgress.load(path)
+        assert [[0, 300, 500], [500, 800, 1000]] == progress.ranges
+        assert progress.sha256 is None
+
+        self.server.bytes_limit = None
+        self.server.requests = []
+
+        digests = manager.download([url], [path], verbose=False)
+
+        with open(path, "rb") as file:
+            assert self.server.assets["/first"] == file.read()
+
+        assert [hashlib.sha256(self.server.assets["/first"]).hexdigest()] == digests
+
+        # Only missing bytes were requested
+        assert {"bytes=300-499", "bytes=800-999"} == \
+            set(request[2] for request in self.server.requests if request[0] == "GET")
+
+    def test_download_with_checksum_mismatch(self, tmpdir):
+
+        url = self.base_url + "/first"
+        path = os.path.join(str(tmpdir), "first")
+
+        with pytest.raises(face.download.ChecksumMismatchError):
+            face.download.DownloadManager().download([url], [path], checksums=["0" * 64], verbose=False)
+
+        assert not os.path.exists(path)
+        assert face.download.DownloadProgress.load(path) is None
+
+    def test_stopped_download_raises_and_can_be_resumed(self, tmpdir):
+
+        url = self.base_url + "/first"
+        path = os.path.join(str(tmpdir), "first")
+
+        stop_event = threading.Event()
+        stop_event.set()
+
+        manager = face.download.DownloadManager(min_range_size=100)
+
+        with pytest.raises(face.download.DownloadStoppedError):
+            manager.download([url], [path], verbose=False, stop_event=stop_event)
+
+        assert [] == [request for request in self.server.requests if request[0] == "GET"]
+        assert face.download.DownloadProgress.load(path).sha256 is None
+
+        manager.download([url], [path], verbose=False)
+
+        with open(path, "rb") as file:
+            assert self.server.assets["/first"] == file.read()
+
+    def test_download_reports_sizes_before_files(self, tmpdir):
+
+        names = ["first", "second"]
+        urls = [self.base_url + "/" + name for name in names]
+        paths = [os.path.join(str(tmpdir), name) for name in names]
+
+        manager = face.download.DownloadManager(min_range_size=100)
+        manager.download(urls[:1], paths[:1], verbose=False)
+
+        events = []
+
+        manager.download(
+            urls, paths, verbose=False, file_callback=lambda index: events.append(("file", index)),
+            sizes_callback=lambda sizes: events.append(("sizes", sizes)))
+
+        assert [("sizes", [1000, 777]), ("file", 0), ("file", 1)] == events
+
+        # Size of complete file is taken from disk, so only pending file was asked for its size
+        assert [("HEAD", "/first", None)] == \
+            [request for request in self.server.requests if request[0] == "HEAD" and request[1] == "/first"]
@@ -0,0 +1,168 @@
+"""
+Tests for face.evaluation module
+"""
+
+import numpy as np
+
+import face.evaluation
+
+
+def get_squared_record(item):
+
+    return {"path": str(item), "value": item * item}
+
+
+class TestEvaluationJournal:
+    """
+    Test class for face.evaluation.EvaluationJournal
+    """
+
+    def test_get_records_of_nonexistent_journal(self, tmpdir):
+
+        journal = face.evaluation.EvaluationJournal(str(tmpdir.join("journal.txt")))
+        assert [] == journal.get_records()
+
+    def test_appended_records_are_read_back(self, tmpdir):
+
+        path = str(tmpdir.join("journal.txt"))
+
+        with face.evaluation.EvaluationJournal(path) as journal:
+
+            journal.append({"path": "a", "correct": True})
+            journal.append({"path": "b", "correct": False})
+
+        expected = [{"path": "a", "correct": True}, {"path": "b", "correct": False}]
+        assert expected == face.evaluation.EvaluationJournal(path).get_records()
+
+    def test_partially_written_record_is_discarded(self, tmpdir):
+
+        path = tmpdir.join("journal.txt")
+        path.write('{"path": "a"}\n{"path": "b", "corr')
+
+        with face.evaluation.EvaluationJournal(str(path)) as journal:
+
+            assert [{"path": "a"}] == journal.get_records()
+            journal.append({"path": "c"})
+
+        assert [{"path": "a"}, {"path": "c"}] == journal.get_records()
+
+
+class TestParallelEvaluationRunner:
+    """
+    Test class for face.evaluation.ParallelEvaluationRunner
+    """
+
+    def test_run_in_current_process(self, tmpdir):
+
+        runner = face.evaluation.ParallelEvaluationRunner(get_squared_record, workers_count=1)
+
+        with face.evaluation.EvaluationJournal(str(tmpdir.join("journal.txt"))) as journal:
+
+            records, _ = runner.run([1, 2, 3], item_key=str, journal=journal, verbose=False)
+
+        assert [1, 4, 9] == [record["value"] for record in records]
+
+    def test_run_in_worker_processes(self, tmpdir):
+
+        runner = face.evaluation.ParallelEvaluationRunner(get_squared_record, workers_count=2)
+
+        with face.evaluation.EvaluationJournal(str(tmpdir.join("journal.txt"))) as journal:
+
+            records, _ = runner.run(list(range(10)), item_key=str, journal=journal, verbose=False)
+
+        assert [index * index for index in range(10)] == sorted(record["value"] for record in records)
+
+    def test_run_resumes_from_journal(self, tmpdir):
+
+        path = tmpdir.join("journal.txt")
+        path.write('{"path": "1", "value": 100}\n')
+
+        runner = face.evaluation.ParallelEvaluationRunner(get_squared_record, workers_count=1)
+
+        with face.evaluation.EvaluationJournal(str(path)) as journal:
+
+            records, _ = runner.run([1, 2], item_key=str, journal=journal, verbose=False)
+
+        assert [100, 4] == [record["value"] for record in records]
+        assert 2 == len(face.evaluation.EvaluationJournal(str(path)).get_records())
+
+
+def test_detections_data_from_records():
+
+    records = [
+        {"path": "a", "ground_truth": [0, 0, 10, 10], "detections": [[0, 0, 10, 10, 0.9], [5, 5, 8, 8, 0.3]]},
+        {"path": "b", "skipped": True},
+        {"path": "c", "ground_truth": [5, 5, 10, 10], "detections": []}
+    ]
+
+    data = face.evaluation.DetectionsData.from_records(records)
+
+    assert np.all(np.array([[0, 0, 10, 10], [5, 5, 8, 8]]) == data.detections_bounds)
+    assert np.allclose([0.9, 0.3], data.detections_scores)
+    assert np.all(np.array([0, 0]) == data.detections_images_ids)
+    assert np.all(np.array([[0, 0, 10, 10], [5, 5, 10, 10]]) == data.ground_truth_bounds)
+    assert np.all(np.array([0, 1]) == data.ground_truth_images_ids)
+
+
+def test_get_matches_prefers_higher_scored_detections():
+
+    data = face.evaluation.DetectionsData(
+        detections_bounds=[[0, 0, 10, 10], [1, 1, 11, 11], [100, 100, 110, 110], [0, 0, 10, 10]],
+        detections_scores=[0.5, 0.9, 0.8, 0.7],
+        detections_images_ids=[0, 0, 0, 1],
+        ground_truth_bounds=[[0, 0, 10, 10], [0, 0, 10, 10]],
+        ground_truth_images_ids=[0, 1])
+
+    expected = np.array([-1, 0, -1, 1])
+    actual = face.evaluation.get_matches(data, iou_threshold=0.5)
+
+    assert np.all(expected == actual)
+
+
+def test_get_matches_picks_ground_truth_with_highest_iou():
+
+    data = face.evaluation.DetectionsData(
+        detections_bounds=[[10, 0, 20, 10], [0, 0, 10, 10]],
+        detections_scores=[0.9, 0.8],
+        detections_images_ids=[0, 0],
+        ground_truth_bounds=[[0, 0, 10, 10], [8, 0, 18, 10]],
+        ground_truth_images_ids=[0, 0])
+
+    expected = np.array([1, 0])
+    actual = face.evaluation.get_matches(data, iou_threshold=0.1)
+
+    assert np.all(expected == actual)
+
+
+def test_get_precision_recall_curve():
+
+    precisions, recalls, thresholds = face.evaluation.get_precision_recall_curve(
+        scores=[0.3, 0.9, 0.6], is_true_positive=[True, True, False], ground_truth_count=4)
+
+    assert np.allclose([1, 0.5, 2 / 3], precisions)
+    assert np.allclose([0.25, 0.25, 0.5], recalls)
+    assert np.allclose([0.9, 0.6, 0.3], thresholds)
+
+
+def test_get_average_precision_uses_interpolated_precisions():
+
+    precisions = np.array([1, 0.5, 2 / 3])
+    recalls = np.array([0.25, 0.25, 0.5])
+
+    assert np.isclose(0.25 + 0.25 * 2 / 3, face.evaluation.get_average_precision(precisions, recalls))
+
+
+def test_get_detections_metrics_size_breakdown():
+
+    data = face.evaluation.DetectionsData(
+        detections_bounds=[[0, 0, 100, 100], [0, 0, 20, 20]],
+        detections_scores=[0.9, 0.8],
+        detections_images_ids=[0, 1],
+        ground_truth_bounds=[[0, 0, 100, 100], [50, 50, 70, 70]],
+        ground_truth_images_ids=[0, 1])
+
+    metrics = face.evaluation.get_detections_metrics(data, iou_thresholds=[0.5], size_bins=[0, 64, np.inf])
+
+    assert [2, 1, 1] == [size_metrics["faces_count"] for size_metrics in metrics]
+    assert np.allclose([0.5, 0, 1], [size_metrics["recall@0.5"] for size_metrics in metrics])
+    assert np.allclose([0.5, 0, 1], [size_metrics["ap@0.5"] for size_metrics in metrics])
@@ -4,6 +4,8 @@ Tests for face.geometry module
 
 import mock
 
+import numpy as np
+
 import shapely.geometry
 
 import face.geometry
@@ -132,4 +134,77 @@ def test_flip_bounding_box_box_centered_on_axis():
     expected = box
     actual = face.geometry.flip_bounding_box_about_vertical_axis(box, image_shape)
 
-    assert expected.equals(actual)
\ No newline at end of file
+    assert expected.equals(actual)
+
+
+def test_get_bounds_array_single_bounding_box():
+
+    box = shapely.geometry.box(10, 20, 50, 30)
+
+    expected = np.array([10, 20, 50, 30])
+    actual = face.geometry.get_bounds_array(box)
+
+    assert np.all(expected == actual)
+
+
+def test_get_bounds_array_list_of_bounding_boxes():
+
+    boxes = [shapely.geometry.box(10, 20, 50, 30), shapely.geometry.box(0, 0, 5, 5)]
+
+    expected = np.array([[10, 20, 50, 30], [0, 0, 5, 5]])
+    actual = face.geometry.get_bounds_array(boxes)
+
+    assert np.all(expected == actual)
+
+
+def test_get_intersections_over_unions_one_to_many():
+
+    bounds = [10, 10, 20, 20]
+    other_bounds = [[10, 10, 15, 15], [100, 100, 150, 150], [10, 10, 20, 20]]
+
+    expected = np.array([0.25, 0, 1])
+    actual = face.geometry.get_intersections_over_unions(bounds, other_bounds)
+
+    assert np.allclose(expected, actual)
+
+
+def test_get_intersections_over_unions_degenerate_boxes():
+
+    assert 0 == face.geometry.get_intersections_over_unions([10, 10, 10, 10], [10, 10, 10, 10])
+
+
+def test_get_pairwise_intersections_over_unions():
+
+    first_bounds = [[0, 0, 10, 10], [5, 0, 15, 10]]
+    second_bounds = [[0, 0, 10, 10], [0, 0, 5, 10], [20, 20, 30, 30]]
+
+    expected = np.array([
+        [1, 0.5, 0],
+        [1 / 3, 0, 0]
+    ])
+
+    actual = face.geometry.get_pairwise_intersections_over_unions(first_bounds, second_bounds)
+
+    assert np.allclose(expected, actual)
+
+
+def test_get_flipped_bounds_many_boxes():
+
+    bounds = [[10, 20, 60, 40], [30, 10, 90, 90]]
+    image_shape = [200, 120]
+
+    expected = np.array([[60, 20, 110, 40], [30, 10, 90, 90]])
+    actual = face.geometry.get_flipped_bounds(bounds, image_shape)
+
+    assert np.all(expected == actual)
+
+
+def test_get_clipped_bounds():
+
+    bounds = [[-10, 20, 60, 400], [30, -5, 150, 90]]
+    image_shape = [200, 120]
+
+    expected = np.array([[0, 20, 60, 200], [30, 0, 120, 90]])
+    actual = face.geometry.get_clipped_bounds(bounds, image_shape)
+
+    assert np.all(expected == actual)
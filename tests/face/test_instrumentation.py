@@ -0,0 +1,107 @@
+"""
+Tests for face.instrumentation module
+"""
+
+import threading
+
+import face.instrumentation
+
+
+def test_pipeline_statistics_timer_records_stage_duration():
+
+    statistics = face.instrumentation.PipelineStatistics()
+
+    with statistics.timer("decode"):
+        pass
+
+    with statistics.timer("decode"):
+        pass
+
+    assert 2 == statistics.stages_calls_counts["decode"]
+    assert statistics.stages_durations["decode"] >= 0
+
+
+def test_pipeline_statistics_report():
+
+    statistics = face.instrumentation.PipelineStatistics()
+
+    statistics.add_image()
+    statistics.add_batch()
+    statistics.add_skipped_image("CropException")
+    statistics.add_crop_attempts("face", 1)
+    statistics.add_crop_attempts("face", 4)
+
+    report = statistics.get_report()
+
+    assert "1 batches, 1 images" in report
+    assert "skipped images due to CropException: 1" in report
+    assert "face crop sampler: 2.50 attempts per crop" in report
+
+
+def test_pipeline_statistics_reset():
+
+    statistics = face.instrumentation.PipelineStatistics()
+
+    statistics.add_image()
+    statistics.add_skipped_image("CropException")
+    statistics.reset()
+
+    assert 0 == statistics.images_count
+    assert 0 == len(statistics.skipped_images_counts)
+
+
+def test_pipeline_statistics_collect_returns_statistics_and_clears_them():
+
+    statistics = face.instrumentation.PipelineStatistics()
+
+    statistics.add_image()
+    statistics.add_skipped_image("CropException")
+
+    collected = statistics.collect()
+
+    assert 1 == collected.images_count
+    assert {"CropException": 1} == collected.skipped_images_counts
+
+    assert 0 == statistics.images_count
+    assert 0 == len(statistics.skipped_images_counts)
+
+
+def test_pipeline_statistics_collect_doesnt_lose_concurrently_recorded_statistics():
+
+    statistics = face.instrumentation.PipelineStatistics()
+    images_per_thread = 20000
+
+    def record():
+
+        for _ in range(images_per_thread):
+            statistics.add_image()
+            statistics.add_stage_duration("decode", 1)
+
+    threads = [threading.Thread(target=record) for _ in range(2)]
+
+    for thread in threads:
+        thread.start()
+
+    collected = []
+
+    while any([thread.is_alive() for thread in threads]):
+        collected.append(statistics.collect())
+
+    for thread in threads:
+        thread.join()
+
+    collected.append(statistics.collect())
+
+    assert 2 * images_per_thread == sum([item.images_count for item in collected])
+    assert 2 * images_per_thread == sum([item.stages_calls_counts["decode"] for item in collected])
+
+
+def test_null_pipeline_statistics_records_nothing():
+
+    statistics = face.instrumentation.null_pipeline_statistics
+
+    with statistics.timer("decode"):
+        statistics.add_image()
+        statistics.add_crop_attempts("face", 3)
+
+    assert not hasattr(statistics, "images_count")
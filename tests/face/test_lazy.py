@@ -0,0 +1,101 @@
+"""
+Tests for face.lazy module
+"""
+
+import subprocess
+import sys
+
+import mock
+
+import face.lazy
+
+
+def test_lazy_module_imports_module_on_first_attribute_access():
+
+    code = "\n".join([
+        "import sys",
+        "import face.lazy",
+        "json = face.lazy.LazyModule('json', ['json.decoder'])",
+        "assert 'json' not in sys.modules",
+        "assert {'a': 1} == json.loads('{\"a\": 1}')",
+        "assert 'json.decoder' in sys.modules",
+        "assert json.decoder.JSONDecodeError is sys.modules['json.decoder'].JSONDecodeError"
+    ])
+
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_lazy_module_sees_attributes_patched_before_load():
+
+    code = "\n".join([
+        "import os",
+        "import face.lazy",
+        "os.getcwd = lambda: 'patched'",
+        "lazy_os = face.lazy.LazyModule('os')",
+        "assert 'patched' == lazy_os.getcwd()"
+    ])
+
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def get_lazy_module_namespace(name):
+    """
+    Create a lazy module in a fresh namespace, standing in for globals of a module that uses it
+    """
+
+    namespace = {}
+    exec("import face.lazy\nlazy_module = face.lazy.LazyModule({!r})".format(name), namespace)
+
+    return namespace
+
+
+def test_lazy_module_rebinds_globals_to_loaded_module():
+
+    namespace = get_lazy_module_namespace("os")
+    lazy_os = namespace["lazy_module"]
+
+    assert isinstance(lazy_os, face.lazy.LazyModule)
+
+    lazy_os.getcwd()
+
+    assert namespace["lazy_module"] is sys.modules["os"]
+
+
+def test_lazy_module_sees_attributes_patched_after_first_access():
+
+    namespace = get_lazy_module_namespace("os")
+    lazy_os = namespace["lazy_module"]
+
+    lazy_os.getcwd()
+
+    with mock.patch("os.getcwd", return_value="patched"):
+
+        assert "patched" == lazy_os.getcwd()
+        assert "patched" == namespace["lazy_module"].getcwd()
+
+    assert "patched" != lazy_os.getcwd()
+
+
+def test_lazy_module_rebinds_globals_it_was_bound_to_again_after_load():
+
+    namespace = get_lazy_module_namespace("os")
+    lazy_os = namespace["lazy_module"]
+
+    lazy_os.getcwd()
+
+    # E.g. a patch of placeholder was undone
+    namespace["lazy_module"] = lazy_os
+    lazy_os.getcwd()
+
+    assert namespace["lazy_module"] is sys.modules["os"]
+
+
+def test_face_detection_import_doesnt_import_heavy_dependencies():
+
+    code = "\n".join([
+        "import sys",
+        "import face.detection",
+        "assert not any([name in sys.modules for name in ['numpy', 'cv2', 'shapely', 'keras']])"
+    ])
+
+    subprocess.check_call([sys.executable, "-c", code])
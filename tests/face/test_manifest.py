@@ -0,0 +1,83 @@
+"""
+Tests for face.manifest module
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import face.manifest
+
+
+def get_manifest():
+
+    paths = ["/data/{}.jpg".format(index) for index in range(5)] + ["/data/zdjęcie.jpg"]
+    bounds = [[index, 2 * index, 10 + index, 20 + index] for index in range(6)]
+    image_sizes = [[100 + index, 200] for index in range(6)]
+    splits = ["training"] * 3 + ["validation"] * 2 + ["test"]
+
+    return face.manifest.DatasetManifest.from_lists(paths, bounds, image_sizes, splits)
+
+
+def test_manifest_save_and_load(tmpdir):
+
+    path = os.path.join(str(tmpdir), "dataset.manifest")
+
+    manifest = get_manifest()
+    manifest.save(path)
+
+    loaded_manifest = face.manifest.DatasetManifest.load(path)
+
+    assert 6 == len(loaded_manifest)
+    assert manifest.get_paths() == loaded_manifest.get_paths()
+    assert "/data/zdjęcie.jpg" == loaded_manifest.get_path(5)
+
+    assert np.all(manifest.bounds == loaded_manifest.bounds)
+    assert np.all(manifest.image_sizes == loaded_manifest.image_sizes)
+    assert np.all(manifest.splits == loaded_manifest.splits)
+
+    assert isinstance(loaded_manifest.bounds, np.memmap)
+
+
+def test_manifest_slicing():
+
+    manifest = get_manifest()
+
+    sliced_manifest = manifest[1:4]
+
+    assert 3 == len(sliced_manifest)
+    assert ["/data/1.jpg", "/data/2.jpg", "/data/3.jpg"] == sliced_manifest.get_paths()
+    assert "/data/2.jpg" == sliced_manifest.get_path(1)
+    assert [[3, 6, 13, 23]] == sliced_manifest[2:].bounds.tolist()
+
+    assert 0 == len(manifest[4:2])
+    assert [] == manifest[4:2].get_paths()
+
+    with pytest.raises(ValueError):
+        manifest[::2]
+
+
+def test_manifest_get_split(tmpdir):
+
+    manifest = get_manifest()
+
+    assert ["/data/3.jpg", "/data/4.jpg"] == manifest.get_split("validation").get_paths()
+    assert 0 == len(manifest.get_split("unassigned"))
+
+    # Sliced manifests are saved with their own rows only
+    path = os.path.join(str(tmpdir), "dataset.manifest")
+    manifest.get_split("validation").save(path)
+
+    assert ["/data/3.jpg", "/data/4.jpg"] == face.manifest.DatasetManifest.load(path).get_paths()
+
+    with pytest.raises(ValueError):
+        manifest.with_splits(["training", "test"] * 3).get_split("training")
+
+
+def test_manifest_get_bounding_boxes_map():
+
+    bounding_boxes_map = get_manifest()[:2].get_bounding_boxes_map()
+
+    assert ["0.jpg", "1.jpg"] == sorted(bounding_boxes_map.keys())
+    assert (1, 2, 11, 21) == bounding_boxes_map["1.jpg"].bounds
@@ -0,0 +1,24 @@
+"""
+Tests for face.models module
+"""
+
+import mock
+
+import face.models
+
+
+def test_models_registry_loads_each_model_once():
+
+    loader = mock.Mock(side_effect=lambda path: "model from " + path)
+    registry = face.models.ModelsRegistry(loader=loader)
+
+    assert "model from /models/first.h5" == registry.get_model("/models/first.h5")
+    assert "model from /models/first.h5" == registry.get_model("/models/../models/first.h5")
+    assert "model from /models/second.h5" == registry.get_model("/models/second.h5")
+
+    assert 2 == loader.call_count
+
+    registry.clear()
+    registry.get_model("/models/first.h5")
+
+    assert 3 == loader.call_count
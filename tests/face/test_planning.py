@@ -0,0 +1,100 @@
+"""
+Tests for face.planning module
+"""
+
+import mock
+
+import numpy as np
+
+import face.config
+import face.detection
+import face.planning
+
+
+def get_configuration(max_face_size=None):
+
+    return face.config.FaceSearchConfiguration(
+        crop_size=8, stride=4, batch_size=16, min_face_size=8, min_face_to_image_ratio=0.1,
+        image_rescaling_ratio=0.5, max_face_size=max_face_size)
+
+
+def test_get_pyramid_plan_levels():
+
+    plan = face.planning.get_pyramid_plan((64, 80, 3), get_configuration())
+
+    assert [1, 0.5, 0.25] == plan.get_scales()
+    assert [(64, 80), (32, 40), (16, 20)] == [level.shape for level in plan.levels]
+    assert [(15, 19), (7, 9), (3, 4)] == [level.grid_shape for level in plan.levels]
+    assert [8, 16, 32] == [level.face_size for level in plan.levels]
+
+    assert 285 + 63 + 12 == plan.get_windows_count()
+    assert 18 + 4 + 1 == plan.get_batches_count()
+    assert np.isclose(23 * 0.1 + 3 * 0.01, plan.get_estimated_seconds(seconds_per_batch=0.1, seconds_per_level=0.01))
+
+
+def test_get_pyramid_plan_skips_levels_searching_only_faces_larger_than_max_face_size():
+
+    plan = face.planning.get_pyramid_plan((64, 80, 3), get_configuration(max_face_size=12))
+
+    assert [1, 0.5] == plan.get_scales()
+
+
+def test_get_pyramid_plan_is_cached_per_shape_and_parameters():
+
+    first = face.planning.get_pyramid_plan((64, 80, 3), get_configuration())
+
+    assert first is face.planning.get_pyramid_plan((64, 80), get_configuration())
+    assert first is not face.planning.get_pyramid_plan((64, 81), get_configuration())
+    assert first is not face.planning.get_pyramid_plan((64, 80), get_configuration(max_face_size=12))
+
+
+def test_detectors_follow_plan():
+
+    image = np.random.RandomState(0).uniform(size=(64, 80, 3))
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.zeros(len(crops))
+
+    configuration = get_configuration(max_face_size=12)
+    detector = face.detection.FaceDetector(image, model, configuration)
+
+    plan = detector.get_pyramid_plan()
+    scores_grids = detector.get_scores_grids()
+
+    assert plan.get_scales() == [scores_grid.scale for scores_grid in scores_grids]
+    assert [level.grid_shape for level in plan.levels] == [scores_grid.scores.shape for scores_grid in scores_grids]
+    assert plan.get_batches_count() == model.predict.call_count
+
+    search = face.detection.PrioritizedSearch(detector, None, face.config.expected_face_to_image_ratio)
+    assert plan.get_windows_count() == search.get_total_windows_count()
+
+
+def test_heatmap_computer_searches_planned_levels():
+
+    image = np.zeros((64, 64, 3))
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.zeros(len(crops))
+
+    for configuration in [get_configuration(), get_configuration(max_face_size=16)]:
+
+        model.reset_mock()
+
+        face.detection.HeatmapComputer(image, model, configuration).get_heatmap()
+        windows_count = sum(len(call[0][0]) for call in model.predict.call_args_list)
+
+        assert face.planning.get_pyramid_plan(image.shape, configuration).get_windows_count() == windows_count
+
+    # With max_face_size 16 second level, 32x32, already searches for faces of size 16, so 16x16 level is skipped
+    assert 225 + 49 == windows_count
+
+
+def test_get_pyramid_plan_with_overridden_face_sizes_bounds():
+
+    configuration = get_configuration(max_face_size=64)
+
+    # Without min_face_to_image_ratio smallest faces searched are of min_face_size, not of 0.1 x 640 = 64 pixels
+    plan = face.planning.get_pyramid_plan(
+        (640, 640, 3), configuration, max_face_size=16, use_min_face_to_image_ratio=False)
+
+    assert [8, 16] == [level.face_size for level in plan.levels]
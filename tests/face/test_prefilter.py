@@ -0,0 +1,100 @@
+"""
+Tests for face.prefilter module
+"""
+
+import numpy as np
+import pytest
+
+import face.prefilter
+
+
+def test_get_windows_sums_matches_direct_sums():
+
+    values = np.random.RandomState(0).uniform(size=(13, 17))
+
+    sums = face.prefilter.get_windows_sums(face.prefilter.get_integral_image(values), crop_size=5, stride=3)
+
+    expected = np.array([[np.sum(values[row:row + 5, column:column + 5]) for column in range(0, 13, 3)]
+                         for row in range(0, 9, 3)])
+
+    assert (3, 5) == sums.shape
+    assert np.allclose(expected, sums)
+
+
+def test_get_windows_sums_image_smaller_than_crop():
+
+    sums = face.prefilter.get_windows_sums(face.prefilter.get_integral_image(np.zeros((3, 10))), crop_size=5, stride=4)
+
+    assert (0, 2) == sums.shape
+
+
+def test_get_mask_rejects_flat_windows_and_keeps_textured_ones():
+
+    image = np.full(shape=(16, 32, 3), fill_value=0.5)
+    image[:, 16:] = np.random.RandomState(0).uniform(size=(16, 16, 3))
+
+    prefilter = face.prefilter.WindowsPrefilter(min_standard_deviation=0.05)
+    mask = prefilter.get_mask(image, crop_size=8, stride=8)
+
+    assert np.all(mask == [[False, False, True, True], [False, False, True, True]])
+
+
+def test_get_mask_with_skin_tone_rejects_textured_windows_without_skin():
+
+    random_state = np.random.RandomState(0)
+
+    # Light skin tone in BGR, with some texture
+    image = np.zeros(shape=(8, 16, 3))
+    image[:, :8] = [0.55, 0.65, 0.85] + random_state.uniform(-0.05, 0.05, size=(8, 8, 3))
+
+    # Saturated blue and green texture
+    image[:, 8:, 0] = random_state.uniform(0.5, 1, size=(8, 8))
+    image[:, 8:, 1] = random_state.uniform(0.5, 1, size=(8, 8))
+
+    prefilter = face.prefilter.WindowsPrefilter(min_standard_deviation=0.01, min_skin_fraction=0.5)
+    mask = prefilter.get_mask(image, crop_size=8, stride=8)
+
+    assert np.all(mask == [[True, False]])
+
+
+def test_calibrate_preserves_requested_recall():
+
+    random_state = np.random.RandomState(0)
+
+    faces_crops = random_state.uniform(size=(200, 8, 8, 3)) * random_state.uniform(size=(200, 1, 1, 1))
+    flat_crops = np.full(shape=(200, 8, 8, 3), fill_value=0.5)
+
+    crops = np.concatenate([faces_crops, flat_crops])
+    labels = np.concatenate([np.ones(200), np.zeros(200)])
+
+    prefilter = face.prefilter.WindowsPrefilter.calibrate(crops, labels, recall=0.95)
+
+    assert np.mean(prefilter.get_crops_mask(faces_crops)) >= 0.95
+    assert not np.any(prefilter.get_crops_mask(flat_crops))
+
+
+def test_calibrate_with_skin_tone_preserves_requested_recall():
+
+    random_state = np.random.RandomState(0)
+    crops = random_state.uniform(size=(100, 8, 8, 3))
+
+    prefilter = face.prefilter.WindowsPrefilter.calibrate(crops, np.ones(100), recall=0.9, use_skin_tone=True)
+
+    assert prefilter.min_skin_fraction is not None
+    assert np.mean(prefilter.get_crops_mask(crops)) >= 0.9
+
+
+def test_calibrate_raises_without_face_crops():
+
+    with pytest.raises(ValueError):
+        face.prefilter.WindowsPrefilter.calibrate(np.zeros((4, 8, 8, 3)), np.zeros(4))
+
+
+def test_save_and_load(tmpdir):
+
+    path = str(tmpdir.join("prefilter.json"))
+
+    face.prefilter.WindowsPrefilter(min_standard_deviation=0.02, min_skin_fraction=0.1).save(path)
+    prefilter = face.prefilter.WindowsPrefilter.load(path)
+
+    assert (0.02, 0.1) == (prefilter.min_standard_deviation, prefilter.min_skin_fraction)
@@ -0,0 +1,75 @@
+"""
+Tests for face.pruning module
+"""
+
+import numpy as np
+
+import face.pruning
+
+
+def get_convolutions_weights():
+
+    random_generator = np.random.RandomState(0)
+
+    # Convolution with 3 filters, followed by convolution with 4 filters and single filter output convolution
+    first_kernel = random_generator.uniform(-1, 1, size=(3, 3, 2, 3))
+    first_kernel[..., 1] *= 0.01
+
+    second_kernel = random_generator.uniform(-1, 1, size=(3, 3, 3, 4))
+    second_kernel[..., 0] *= 0.01
+    second_kernel[..., 2] *= 0.02
+
+    output_kernel = random_generator.uniform(-1, 1, size=(2, 2, 4, 1))
+
+    return [[first_kernel, np.arange(3)], [second_kernel, np.arange(4)], [output_kernel, np.arange(1)]]
+
+
+def test_get_kept_channels():
+
+    kernel = np.ones((3, 3, 2, 4))
+    kernel[..., 1] = 0.5
+    kernel[..., 2] = -2
+
+    assert [0, 2] == face.pruning.get_kept_channels(kernel, 2).tolist()
+    assert [0, 2, 3] == face.pruning.get_kept_channels(kernel, 3).tolist()
+
+
+def test_get_pruned_weights():
+
+    weights = get_convolutions_weights()
+    pruned_weights = face.pruning.get_pruned_weights(weights, [2, 2])
+
+    assert [(3, 3, 2, 2), (3, 3, 2, 2), (2, 2, 2, 1)] == [kernel.shape for kernel, _ in pruned_weights]
+
+    # Weakest filters were removed, along with corresponding input channels of next convolutions
+    assert [0, 2] == pruned_weights[0][1].tolist()
+    assert [1, 3] == pruned_weights[1][1].tolist()
+
+    assert np.all(weights[1][0][:, :, [0, 2]][..., [1, 3]] == pruned_weights[1][0])
+    assert np.all(weights[2][0][:, :, [1, 3]] == pruned_weights[2][0])
+
+
+def test_get_convolutions_flops():
+
+    # Single 3x3 convolution with 4 filters on 4x4x1 input, pooled to 2x2 and followed by 2x2 output convolution
+    flops = face.pruning.get_convolutions_flops((4, 4, 1), [[4]], final_kernel_size=2)
+
+    assert 2 * 4 * 4 * 3 * 3 * 1 * 4 + 2 * 1 * 1 * 2 * 2 * 4 == flops
+
+
+def test_get_vgg_flops_are_reduced_by_pruning():
+
+    original_flops = face.pruning.get_convolutions_flops(
+        (64, 64, 3), [[64, 64], [128, 128], [256, 256, 256], [512, 512, 512], [512, 512, 512]])
+
+    pruned_flops = face.pruning.get_convolutions_flops(
+        (64, 64, 3), [[32, 32], [64, 64], [128, 128, 128], [256, 256, 256], [256, 256, 256]])
+
+    assert 3.5 < original_flops / pruned_flops < 4
+
+
+def test_channel_pruner_get_next_channels_counts():
+
+    pruner = face.pruning.ChannelPruner(None, None, 0, 0, pruning_ratio=0.25, min_channels_count=8)
+
+    assert [48, 8, 8, 4] == pruner.get_next_channels_counts([64, 10, 8, 4])
@@ -0,0 +1,107 @@
+"""
+Tests for face.tiling module
+"""
+
+import mock
+
+import numpy as np
+import pytest
+import shapely.geometry
+
+import face.config
+import face.detection
+import face.planning
+import face.tiling
+
+
+def test_get_tiles_bounds_covers_image_with_requested_overlap():
+
+    bounds = face.tiling.get_tiles_bounds((100, 240, 3), tile_size=100, overlap=30)
+
+    assert [(0, 0, 100, 100), (70, 0, 170, 100), (140, 0, 240, 100)] == bounds
+
+
+def test_get_tiles_bounds_single_tile_for_image_smaller_than_tile():
+
+    assert [(0, 0, 40, 30)] == face.tiling.get_tiles_bounds((30, 40), tile_size=100, overlap=30)
+
+
+def test_get_tiles_bounds_raises_when_overlap_is_not_smaller_than_tile():
+
+    with pytest.raises(ValueError):
+        face.tiling.get_tiles_bounds((300, 300), tile_size=50, overlap=50)
+
+
+def test_get_tile_image_rescales_uint8_images():
+
+    image = np.full((10, 10, 3), 255, dtype=np.uint8)
+    tile = face.tiling.get_tile_image(image, (2, 3, 6, 5))
+
+    assert (2, 4, 3) == tile.shape
+    assert np.allclose(1, tile)
+
+
+class TestTiledFaceDetector:
+
+    def setup_method(self, method):
+
+        self.model = mock.Mock()
+        self.model.predict.side_effect = lambda crops, batch_size: np.mean(crops.reshape(len(crops), -1), axis=1)
+
+        self.configuration = face.config.FaceSearchConfiguration(
+            crop_size=8, stride=4, batch_size=16, min_face_size=8, min_face_to_image_ratio=0.1,
+            image_rescaling_ratio=0.5)
+
+    def test_scales_search_faces_up_to_max_face_size(self):
+
+        detector = face.tiling.TiledFaceDetector(
+            np.zeros((100, 100, 3)), self.model, self.configuration, max_face_size=30)
+
+        assert [1, 0.5, 0.25] == detector.get_scales()
+        assert 32 == detector.overlap
+
+    def test_scales_come_from_pyramid_plan_of_a_tile(self):
+
+        detector = face.tiling.TiledFaceDetector(
+            np.zeros((100, 100, 3)), self.model, self.configuration, max_face_size=30, tile_size=64)
+
+        plan = face.planning.get_pyramid_plan(
+            (64, 64), self.configuration, max_face_size=30, use_min_face_to_image_ratio=False)
+
+        assert plan.get_scales() == detector.get_scales()
+        assert plan.get_windows_count() == detector.get_pyramid_plan().get_windows_count()
+
+    def test_raises_when_tiles_are_too_small_for_max_face_size(self):
+
+        with pytest.raises(ValueError):
+            face.tiling.TiledFaceDetector(
+                np.zeros((100, 100, 3)), self.model, self.configuration, max_face_size=30, tile_size=24)
+
+    def test_face_on_tiles_seam_is_detected_once(self):
+
+        image = np.zeros((64, 160, 3), dtype=np.uint8)
+        image[20:36, 72:88] = 255
+
+        detector = face.tiling.TiledFaceDetector(
+            image, self.model, self.configuration, max_face_size=16, tile_size=48)
+
+        assert len(detector.get_tiles_bounds()) > 2
+
+        detections = detector.get_faces_detections()
+
+        assert 1 == len(detections)
+        assert detections[0].bounding_box.centroid.distance(shapely.geometry.Point(80, 28)) < 2
+
+    def test_small_face_in_large_image_is_found_at_native_resolution(self):
+
+        image = np.zeros((1200, 1200, 3), dtype=np.uint8)
+        image[600:608, 900:908] = 255
+
+        tiled_detections = face.tiling.TiledFaceDetector(
+            image, self.model, self.configuration, max_face_size=8, tile_size=256).get_faces_detections()
+
+        downscaled_detections = face.detection.FaceDetector(
+            image / 255, self.model, self.configuration).get_faces_detections()
+
+        assert 0 == len(downscaled_detections)
+        assert 1 == len(tiled_detections)
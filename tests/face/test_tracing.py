@@ -0,0 +1,115 @@
+"""
+Tests for face.tracing module
+"""
+
+import json
+
+import mock
+import numpy as np
+
+import face.config
+import face.detection
+import face.tracing
+
+
+def get_constant_score_model(score):
+
+    model = mock.Mock()
+    model.predict.side_effect = lambda crops, batch_size: np.full(shape=(len(crops), 1), fill_value=score)
+
+    return model
+
+
+def get_configuration():
+
+    return face.config.FaceSearchConfiguration(
+        crop_size=8, stride=4, batch_size=16, min_face_size=8, min_face_to_image_ratio=0.1,
+        image_rescaling_ratio=0.5)
+
+
+def test_pyramid_level_trace_batches_fill_ratio():
+
+    trace = face.tracing.PyramidLevelTrace("detector", scale=1, level_shape=(10, 10), batch_size=4)
+
+    trace.add_batch(candidates_count=4, predict_duration=0.1)
+    trace.add_batch(candidates_count=2, predict_duration=0.1)
+
+    assert 0.75 == trace.get_batches_fill_ratio()
+    assert 6 == trace.candidates_count
+
+
+def test_face_detector_reports_every_pyramid_level():
+
+    tracer = mock.Mock(spec=face.tracing.DetectionTracer)
+    image = np.zeros(shape=(32, 32, 3))
+
+    detector = face.detection.FaceDetector(image, get_constant_score_model(0.95), get_configuration(), tracer=tracer)
+    detector.get_faces_detections()
+
+    traces = [call[0][0] for call in tracer.on_pyramid_level.call_args_list]
+
+    assert [1, 0.5] == [trace.scale for trace in traces]
+    assert [49, 9] == [trace.candidates_count for trace in traces]
+    assert [49, 9] == [trace.positives_count for trace in traces]
+    assert all(trace.post_processing_start is not None for trace in traces)
+
+    assert 1 == tracer.on_detection.call_count
+
+
+def test_face_detector_results_do_not_depend_on_tracing():
+
+    image = np.zeros(shape=(32, 32, 3))
+    model = get_constant_score_model(0.95)
+
+    expected = face.detection.FaceDetector(image, model, get_configuration()).get_faces_detections()
+    actual = face.detection.FaceDetector(
+        image, model, get_configuration(), tracer=face.tracing.DetectionTracer()).get_faces_detections()
+
+    assert expected == actual
+
+
+def test_search_without_tracer_doesnt_read_clock():
+
+    image = np.zeros(shape=(32, 32, 3))
+    detector = face.detection.FaceDetector(image, get_constant_score_model(0.95), get_configuration())
+
+    with mock.patch("face.detection.time.perf_counter") as perf_counter:
+
+        detector.get_faces_detections()
+        detector.scan()
+
+    assert 0 == perf_counter.call_count
+
+
+def test_heatmap_computer_reports_every_pyramid_level():
+
+    tracer = mock.Mock(spec=face.tracing.DetectionTracer)
+    image = np.zeros(shape=(32, 32, 3))
+
+    face.detection.HeatmapComputer(
+        image, get_constant_score_model(0.5), get_configuration(), tracer=tracer).get_heatmap()
+
+    traces = [call[0][0] for call in tracer.on_pyramid_level.call_args_list]
+
+    assert [(32, 32, 3), (16, 16, 3)] == [trace.level_shape for trace in traces]
+    assert [49, 9] == [trace.candidates_count for trace in traces]
+
+
+def test_chrome_trace_tracer_saves_events(tmpdir):
+
+    tracer = face.tracing.ChromeTraceTracer()
+    image = np.zeros(shape=(32, 32, 3))
+
+    face.detection.FaceDetector(
+        image, get_constant_score_model(0.95), get_configuration(), tracer=tracer).get_faces_detections()
+
+    path = str(tmpdir.join("trace.json"))
+    tracer.save(path)
+
+    with open(path) as file:
+        events = json.load(file)["traceEvents"]
+
+    # Two levels, each with a post-processing event, and a single detection event
+    assert 5 == len(events)
+    assert all(event["ph"] == "X" for event in events)
+    assert "FaceDetector" == events[-1]["name"]
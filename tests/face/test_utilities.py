@@ -0,0 +1,41 @@
+"""
+Tests for face.utilities module
+"""
+
+import os
+
+import numpy as np
+import cv2
+
+import face.utilities
+
+
+def test_get_file_lines_count(tmpdir):
+
+    path = os.path.join(str(tmpdir), "file.txt")
+
+    with open(path, "w") as file:
+        file.write("a\nb\nc")
+
+    assert 3 == face.utilities.get_file_lines_count(path)
+
+
+def test_get_image_size(tmpdir):
+
+    for extension in ["jpg", "png"]:
+
+        path = os.path.join(str(tmpdir), "image." + extension)
+        cv2.imwrite(path, np.zeros((37, 53, 3), dtype=np.uint8))
+
+        assert (37, 53) == tuple(face.utilities.get_image_size(path))
+
+
+def test_get_image_returns_float32_image(tmpdir):
+
+    path = str(tmpdir.join("image.png"))
+    cv2.imwrite(path, np.full((4, 6, 3), 255, dtype=np.uint8))
+
+    image = face.utilities.get_image(path)
+
+    assert np.float32 == image.dtype
+    assert np.allclose(1, image)
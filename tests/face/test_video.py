@@ -0,0 +1,107 @@
+"""
+Tests for face.video module
+"""
+
+import mock
+
+import numpy as np
+
+import face.config
+import face.detection
+import face.prefilter
+import face.video
+
+
+def test_get_changes_mask():
+
+    reference_image = np.zeros((2, 3, 3))
+
+    image = reference_image.copy()
+    image[0, 1, 2] = 0.5
+    image[1, 2, 0] = 0.01
+
+    expected = [[False, True, False], [False, False, False]]
+    assert np.all(expected == face.video.get_changes_mask(image, reference_image, change_threshold=0.02))
+
+
+def test_get_dirty_windows_mask_marks_windows_near_changes():
+
+    changes_mask = np.zeros((40, 40), dtype=bool)
+    changes_mask[30, 30] = True
+
+    dirty_mask = face.video.get_dirty_windows_mask(
+        face.prefilter.get_integral_image(changes_mask), grid_shape=(9, 9), scale=1, crop_size=8, stride=4)
+
+    rows, columns = np.nonzero(dirty_mask)
+
+    # Windows starting at 24 and 28 cover pixel 30, window starting at 32 is within margin of it
+    assert [6, 7, 8] == sorted(set(rows))
+    assert [6, 7, 8] == sorted(set(columns))
+
+
+class TestIncrementalFaceDetector:
+
+    def setup_method(self, method):
+
+        random_state = np.random.RandomState(0)
+
+        self.frame = 0.3 * random_state.uniform(size=(64, 80, 3))
+        self.frame[8:24, 16:32] = 1
+
+        self.model = mock.Mock()
+        self.model.predict.side_effect = lambda crops, batch_size: np.mean(crops.reshape(len(crops), -1), axis=1)
+
+        self.configuration = face.config.FaceSearchConfiguration(
+            crop_size=8, stride=4, batch_size=16, min_face_size=8, min_face_to_image_ratio=0.1,
+            image_rescaling_ratio=0.5)
+
+    def test_first_frame_is_searched_fully(self):
+
+        detector = face.video.IncrementalFaceDetector(self.model, self.configuration)
+        results = detector.get_faces_detections(self.frame)
+
+        expected = face.detection.FaceDetector(self.frame, self.model, self.configuration).get_faces_detections()
+
+        assert 1 == results.get_rescored_fraction()
+        assert expected == results.detections
+
+    def test_unchanged_frame_is_not_rescored(self):
+
+        detector = face.video.IncrementalFaceDetector(self.model, self.configuration)
+        expected = detector.get_faces_detections(self.frame).detections
+
+        self.model.reset_mock()
+        results = detector.get_faces_detections(self.frame + 0.01)
+
+        assert 0 == results.get_rescored_fraction()
+        assert 0 == self.model.predict.call_count
+        assert expected == results.detections
+
+    def test_changed_frame_gives_same_results_as_full_search(self):
+
+        detector = face.video.IncrementalFaceDetector(self.model, self.configuration, change_threshold=0)
+        detector.get_faces_detections(self.frame)
+
+        # Face moves to a new position
+        frame = self.frame.copy()
+        frame[8:24, 16:32] = self.frame[40:56, 56:72]
+        frame[40:56, 56:72] = 1
+
+        results = detector.get_faces_detections(frame)
+
+        expected_detector = face.detection.FaceDetector(frame, self.model, self.configuration)
+
+        assert 0 < results.get_rescored_fraction() < 1
+        assert expected_detector.get_faces_detections() == results.detections
+
+        for expected, actual in zip(expected_detector.get_scores_grids(), detector.scores_grids):
+            assert np.array_equal(expected.scores, actual.scores)
+
+    def test_frame_of_different_shape_is_searched_fully(self):
+
+        detector = face.video.IncrementalFaceDetector(self.model, self.configuration)
+        detector.get_faces_detections(self.frame)
+
+        results = detector.get_faces_detections(self.frame[:48])
+
+        assert 1 == results.get_rescored_fraction()